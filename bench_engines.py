@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+from engine import *
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the engines of a folder (and some of their levels) '
+                                                 'and write the results to its bench.ini')
+    parser.add_argument('-p', '--path', type=str, default=None,
+                        help='engine folder (default: engines/<your platform>)')
+    parser.add_argument('-m', '--movetime', type=int, default=BENCH_MOVETIME,
+                        help='msecs the engine searches each benchmark position')
+    parser.add_argument('-l', '--levels', type=int, default=5,
+                        help='how many levels per engine are measured besides the full strength')
+    args = parser.parse_args()
+
+    write_bench_ini(args.path, args.movetime, args.levels)
+
+
+if __name__ == '__main__':
+    main()
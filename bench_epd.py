@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import json
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from engine import *
+
+# futures in flight per worker - more positions than that arent read from the epd file yet
+EPD_WINDOW = 2
+
+engines = {}  # engine file => UciEngine of this worker process
+
+
+class SolutionHandler(chess.uci.InfoHandler):
+    """Notes when the best line starts with a solving move for good (the time-to-solution)."""
+
+    def __init__(self):
+        super(SolutionHandler, self).__init__()
+        self.is_solution = None
+        self.solved = None  # (secs, depth, nodes) of the info line from which on the best move solved it
+        self.go_time = None
+
+    def on_go(self):
+        self.solved = None
+        self.go_time = time.monotonic()
+        super().on_go()
+
+    def post_info(self):
+        pv = self.info['pv'].get(1)
+        if pv and self.info.get('multipv', 1) == 1:  # still under the lock of pre_info()
+            if not self.is_solution(pv[0]):
+                self.solved = None
+            elif self.solved is None:
+                self.solved = (round(time.monotonic() - self.go_time, 3), self.info.get('depth'),
+                               self.info.get('nodes'))
+        super().post_info()
+
+
+def solution_test(operations):
+    """Check for the bm/am operations of an epd line - None if it has neither."""
+    best, avoid = operations.get('bm'), operations.get('am')
+    if best:
+        return lambda move: move in best
+    if avoid:
+        return lambda move: move not in avoid
+    return None
+
+
+def worker_engine(engine_file, level_name, level_dict, sharing):
+    """
+    The engine of this worker - started once, then kept for all its positions and levels. A level change only
+    sets the options again: the ones of the level, or the engine defaults of all level options for full strength.
+    sharing is the number of engines of all workers together, they split the memory for the Hash.
+    """
+    engine = engines.get(engine_file)
+    if engine is None:
+        host_profile.configure(threads=1, engines=sharing)  # the workers share the cores, one each
+        # the info events would pile up in the evt_queue nobody reads here
+        engine = UciEngine(engine_file, timeout=PROBE_TIMEOUT, handler=silent_informer())
+        if not EnginePool.is_alive(engine):
+            raise RuntimeError('engine [{}] didnt start'.format(engine_file))
+        engine.get().info_handlers.append(SolutionHandler())
+        engines[engine_file] = engine
+    elif engine.level_name == level_name:
+        return engine
+    options = level_dict[level_name] if level_name else default_options(engine.get(), level_dict)
+    engine.startup(options, False, level_name=level_name)
+    return engine
+
+
+def solve(engine_file, level_name, level_dict, key, epd, movetime, sharing):
+    """Search one epd position - runs in a worker process. Returns the result line as dict."""
+    engine = worker_engine(engine_file, level_name, level_dict, sharing)
+    handler = engine.get().info_handlers[-1]
+    board = chess.Board()
+    operations = board.set_epd(epd)
+    handler.is_solution = solution_test(operations)
+    engine.new_game()
+    engine.position(board)
+    start = time.monotonic()
+    command = engine.get().go(movetime=movetime)
+    secs = time.monotonic() - start
+    with handler:
+        info = dict(handler.info)
+        solved = handler.solved
+    move_solves = handler.is_solution(command.bestmove) if command.bestmove else False
+    return {'key': key, 'engine': engine_file.rsplit(os.sep, 1)[-1], 'level': level_name,
+            'id': operations.get('id'), 'bestmove': command.bestmove.uci() if command.bestmove else None,
+            'solved': move_solves, 'time': round(secs, 3), 'depth': info.get('depth'), 'nodes': info.get('nodes'),
+            'solution_time': solved[0] if solved and move_solves else None,
+            'solution_depth': solved[1] if solved and move_solves else None,
+            'solution_nodes': solved[2] if solved and move_solves else None}
+
+
+def read_positions(epd_file):
+    """(line number, epd) of the positions with a bm or am operation - read lazily."""
+    with open(epd_file) as file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                operations = chess.Board().set_epd(line)
+            except ValueError as e:
+                logging.warning('line %i of %s isnt valid epd: %s', number, epd_file, e)
+                continue
+            if solution_test(operations) is None:
+                logging.warning('line %i of %s has no bm or am operation', number, epd_file)
+                continue
+            yield number, line
+
+
+def read_results(result_file):
+    """The result lines of an earlier run - one at a time."""
+    try:
+        with open(result_file) as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    pass  # the last line of an interrupted run
+    except FileNotFoundError:
+        pass
+
+
+def tasks(epd_file, catalog, level_names, done):
+    for number, epd in read_positions(epd_file):
+        for eng in catalog:
+            for level_name in level_names:
+                if level_name and level_name not in eng['level_dict']:
+                    continue
+                key = '{}:{}:{}'.format(eng['file'].rsplit(os.sep, 1)[-1], level_name, number)
+                if key not in done:
+                    yield eng['file'], level_name, eng['level_dict'], key, epd
+
+
+def run(epd_file, catalog, level_names, movetime, workers, result_file):
+    """Solve the positions in worker processes and append each result to the result file as soon as its in."""
+    done = {result['key'] for result in read_results(result_file)}
+    if done:
+        print('resuming - {} results already in {}'.format(len(done), result_file))
+    todo = tasks(epd_file, catalog, level_names, done)
+    sharing = workers * len(catalog)  # each worker keeps an engine per engine file, the levels take turns
+    with ProcessPoolExecutor(max_workers=workers) as executor, open(result_file, 'a') as output:
+        running = set()
+        while True:
+            for task in todo:
+                running.add(executor.submit(solve, *task, movetime=movetime, sharing=sharing))
+                if len(running) >= workers * EPD_WINDOW:
+                    break
+            if not running:
+                break
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                try:
+                    result = future.result()
+                except Exception as e:  # dont let a single crashing engine stop the others
+                    logging.error('epd search failed: %s', e)
+                    continue
+                output.write(json.dumps(result) + '\n')
+                output.flush()
+                print('{engine} {level} {id}: {bestmove} {0}'.format('ok' if result['solved'] else '-', **result))
+
+
+def summary(result_file):
+    """Solve rate, average time-to-solution and nodes per engine and level - from the result file."""
+    totals = OrderedDict()
+    for result in read_results(result_file):
+        total = totals.setdefault((result['engine'], result['level']),
+                                  {'positions': 0, 'solved': 0, 'solution_time': 0.0, 'nodes': 0})
+        total['positions'] += 1
+        total['nodes'] += result['nodes'] or 0
+        if result['solved']:
+            total['solved'] += 1
+            total['solution_time'] += result['solution_time'] or result['time']
+    for (engine_name, level_name), total in totals.items():
+        print('{:20s} {:10s} solved {:4d}/{:<4d} ({:5.1f}%)  avg time-to-solution {:6.2f}s  avg nodes {:10d}'.format(
+            engine_name, level_name or 'max', total['solved'], total['positions'],
+            100 * total['solved'] / total['positions'],
+            total['solution_time'] / total['solved'] if total['solved'] else 0,
+            total['nodes'] // total['positions']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run an epd test suite with the engines of a folder '
+                                                 '(and some of their levels) in parallel worker processes')
+    parser.add_argument('epd', type=str, help='epd file - each position needs a bm or am operation')
+    parser.add_argument('-p', '--path', type=str, default=None,
+                        help='engine folder (default: engines/<your platform>)')
+    parser.add_argument('-e', '--engines', type=str, nargs='*', default=None,
+                        help='engine files of the folder to test (default: all of engines.ini)')
+    parser.add_argument('-l', '--levels', type=str, nargs='*', default=[''],
+                        help='levels (sections of the .uci files) to test, "" is the full strength')
+    parser.add_argument('-m', '--movetime', type=int, default=BENCH_MOVETIME,
+                        help='msecs the engine searches each position')
+    parser.add_argument('-w', '--workers', type=int, default=max(1, (os.cpu_count() or 1) - 1),
+                        help='worker processes, each with its own single threaded engine')
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='result file (json lines), an existing one is resumed (default: <epd>.results)')
+    args = parser.parse_args()
+
+    catalog = read_engine_ini(engine_path=args.path)
+    if args.engines:
+        catalog = [eng for eng in catalog if eng['file'].rsplit(os.sep, 1)[-1] in args.engines]
+    result_file = args.output or args.epd + '.results'
+    run(args.epd, catalog, args.levels, args.movetime, args.workers, result_file)
+    summary(result_file)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import copy
+import random
+import time
+from engine import *
+
+
+def position_line(board):
+    """The uci position command for a board - like python-chess builds it."""
+    root = board.copy()
+    moves = []
+    while root.move_stack:
+        moves.insert(0, root.pop().uci())
+    line = 'position startpos' if root.fen() == chess.STARTING_FEN else 'position fen ' + root.fen()
+    return line + (' moves ' + ' '.join(moves) if moves else '')
+
+
+def random_game(plies, seed):
+    rnd = random.Random(seed)
+    game = chess.Board()
+    while len(game.move_stack) < plies:
+        moves = list(game.legal_moves)
+        if not moves or game.is_insufficient_material():
+            game = chess.Board()  # start over, we want a long game
+            continue
+        game.push(rnd.choice(moves))
+    return game
+
+
+def bench(game, full, engine=None):
+    """Replay the game and time the position update for every ply. Returns the secs per ply."""
+    mirror = PositionMirror()
+    replay = chess.Board()
+    times = []
+    for move in game.move_stack:
+        replay.push(move)
+        start = time.perf_counter()
+        if full:
+            board = copy.deepcopy(replay)
+            if engine:
+                engine.get().position(board)
+            else:
+                position_line(board)
+        else:
+            if engine:
+                engine.position(replay)
+            else:
+                board = mirror.update(replay)
+                if board is not None:
+                    position_line(board)
+        times.append(time.perf_counter() - start)
+    if engine:
+        engine.get().isready()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the cost of sending the game position per move')
+    parser.add_argument('-p', '--plies', type=int, default=400, help='length of the (random) game')
+    parser.add_argument('-s', '--seed', type=int, default=1, help='seed for the random game')
+    parser.add_argument('-e', '--engine', type=str, default=None,
+                        help='engine to send the positions to (default: only build the uci commands)')
+    args = parser.parse_args()
+
+    game = random_game(args.plies, args.seed)
+    uci_engine = None
+    if args.engine:
+        uci_engine = UciEngine(args.engine)
+
+    for name, full in (('deepcopy + full move list', True), ('incremental', False)):
+        times = bench(game, full, uci_engine)
+        last = times[-50:]
+        print('{:26s} avg {:8.1f}us  last 50 plies avg {:8.1f}us'.format(
+            name, 1e6 * sum(times) / len(times), 1e6 * sum(last) / len(last)))
+
+    if uci_engine:
+        EnginePool.shutdown(uci_engine)
+
+
+if __name__ == '__main__':
+    main()
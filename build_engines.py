@@ -17,6 +17,16 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
+import argparse
 from engine import *
 
-write_engine_ini()
+parser = argparse.ArgumentParser(description='Probe the engines of a folder and write its engines.ini and level files')
+parser.add_argument('-p', '--path', type=str, default=None,
+                    help='engine folder (default: engines/<your platform>)')
+parser.add_argument('-w', '--workers', type=int, default=None,
+                    help='how many engines are probed in parallel (default: number of cpus)')
+parser.add_argument('-t', '--timeout', type=int, default=PROBE_TIMEOUT,
+                    help='secs an engine may need to start before its skipped')
+args = parser.parse_args()
+
+write_engine_ini(args.path, args.workers, args.timeout)
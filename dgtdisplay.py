@@ -86,10 +86,14 @@ drawresign_map = {'8/8/8/3k4/4K3/8/8/8': GameResult.WIN_WHITE,
 
 
 class DgtDisplay(Observable, DisplayMsg, threading.Thread):
-    def __init__(self, disable_ok_message, dgttranslate):
+    def __init__(self, disable_ok_message, dgttranslate, rate=0.5):
         super(DgtDisplay, self).__init__()
         self.show_ok_message = not disable_ok_message
         self.dgttranslate = dgttranslate
+        # the clock is slow, so only show the latest score & pv every "rate" secs
+        self.score_limiter = RateLimiter(rate)
+        self.pv_limiter = RateLimiter(rate)
+        self.multipv_limiter = RateLimiter(rate)
 
         self.flip_board = False
         self.dgt_fen = None
@@ -200,6 +204,10 @@ class DgtDisplay(Observable, DisplayMsg, threading.Thread):
         self.last_turn = None
         self.score = None
         self.mate = None
+        self.multipv_lines = []
+        self.score_limiter.reset()
+        self.pv_limiter.reset()
+        self.multipv_limiter.reset()
 
     def process_button0(self):
         if self.top_result is None:
@@ -379,6 +387,18 @@ class DgtDisplay(Observable, DisplayMsg, threading.Thread):
                     DisplayDgt.show(text)
                 else:
                     self.fire(Event.PAUSE_RESUME())
+        elif self.top_result == Menu.ENGINE_MENU and self.mode_result != Mode.REMOTE:
+            # show the benchmarked speed of the engine (level) in the menu
+            eng = self.installed_engines[self.engine_index]
+            level_name = ''
+            if self.engine_result is not None and eng['level_dict'] and self.engine_level_index is not None:
+                level_name = sorted(eng['level_dict'])[self.engine_level_index]
+            bench = eng['bench'].get(level_name)
+            if bench:
+                text = self.dgttranslate.text('B00_speed', str(bench['nps'] // 1000))
+            else:
+                text = self.dgttranslate.text('B00_nofunction')
+            DisplayDgt.show(text)
 
     def process_button3(self):
         if self.top_result is None:
@@ -612,7 +632,7 @@ class DgtDisplay(Observable, DisplayMsg, threading.Thread):
                         config['engine-level'] = None
                         config.write()
                         text = self.dgttranslate.text('B10_okengine')
-                        self.fire(Event.NEW_ENGINE(eng=eng, eng_text=text, options={}, ok_text=True))
+                        self.fire(Event.NEW_ENGINE(eng=eng, eng_text=text, options={}, ok_text=True, level_name=''))
                         self.engine_restart = True
                         self.reset_menu_results()
                 else:
@@ -622,11 +642,14 @@ class DgtDisplay(Observable, DisplayMsg, threading.Thread):
                         config = ConfigObj('picochess.ini')
                         config['engine-level'] = msg
                         config.write()
-                        self.fire(Event.LEVEL(options={}, level_text=self.dgttranslate.text('B10_level', msg)))
+                        self.fire(Event.LEVEL(options={}, level_text=self.dgttranslate.text('B10_level', msg),
+                                              level_name=msg))
                     else:
+                        msg = ''
                         options = {}
                     eng_text = self.dgttranslate.text('B10_okengine')
-                    self.fire(Event.NEW_ENGINE(eng=eng, eng_text=eng_text, options=options, ok_text=True))
+                    self.fire(Event.NEW_ENGINE(eng=eng, eng_text=eng_text, options=options, ok_text=True,
+                                               level_name=msg))
                     self.engine_restart = True
                     self.reset_menu_results()
 
@@ -692,6 +715,24 @@ class DgtDisplay(Observable, DisplayMsg, threading.Thread):
             text = Dgt.DISPLAY_TIME(force=force, wait=True)
         DisplayDgt.show(text)
 
+    def display_score(self, message):
+        if message and message.mode == Mode.KIBITZ and self.top_result is None:
+            DisplayDgt.show(self.dgttranslate.text('N10_default', str(message.score).rjust(6)))
+
+    def display_pv(self, message):
+        if len(self.multipv_lines) > 1:
+            return  # the clock shows the top moves of all lines instead (see display_multipv)
+        if message and message.mode == Mode.ANALYSIS and self.top_result is None:
+            side = ClockSide.LEFT if (message.turn == chess.WHITE) != self.flip_board else ClockSide.RIGHT
+            DisplayDgt.show(Dgt.DISPLAY_MOVE(move=message.pv[0], fen=message.fen, side=side, wait=False,
+                                             beep=self.dgttranslate.bl(BeepLevel.NO), maxtime=0))
+
+    def display_multipv(self, message):
+        if message and message.mode == Mode.ANALYSIS and self.top_result is None:
+            board = chess.Board(message.fen)
+            moves = ' '.join(board.san(line[3][0]) for line in message.lines)
+            DisplayDgt.show(self.dgttranslate.text('N10_default', moves))
+
     def process_message(self, message):
         for case in switch(message):
             if case(MessageApi.ENGINE_READY):
@@ -820,8 +861,7 @@ class DgtDisplay(Observable, DisplayMsg, threading.Thread):
             if case(MessageApi.NEW_SCORE):
                 self.score = message.score
                 self.mate = message.mate
-                if message.mode == Mode.KIBITZ and self.top_result is None:
-                    DisplayDgt.show(self.dgttranslate.text('N10_default', str(self.score).rjust(6)))
+                self.display_score(self.score_limiter.offer(message))
                 break
             if case(MessageApi.BOOK_MOVE):
                 self.score = None
@@ -832,10 +872,11 @@ class DgtDisplay(Observable, DisplayMsg, threading.Thread):
                 self.hint_move = message.pv[0]
                 self.hint_fen = message.fen
                 self.hint_turn = message.turn
-                if message.mode == Mode.ANALYSIS and self.top_result is None:
-                    side = ClockSide.LEFT if (self.hint_turn == chess.WHITE) != self.flip_board else ClockSide.RIGHT
-                    DisplayDgt.show(Dgt.DISPLAY_MOVE(move=self.hint_move, fen=self.hint_fen, side=side, wait=False,
-                                                     beep=self.dgttranslate.bl(BeepLevel.NO), maxtime=0))
+                self.display_pv(self.pv_limiter.offer(message))
+                break
+            if case(MessageApi.NEW_MULTIPV):
+                self.multipv_lines = message.lines
+                self.display_multipv(self.multipv_limiter.offer(message))
                 break
             if case(MessageApi.SYSTEM_INFO):
                 self.ip = message.info['ip']
@@ -942,7 +983,7 @@ class DgtDisplay(Observable, DisplayMsg, threading.Thread):
                         config = ConfigObj('picochess.ini')
                         config['engine-level'] = msg
                         config.write()
-                        self.fire(Event.LEVEL(options=level_dict[msg], level_text=text))
+                        self.fire(Event.LEVEL(options=level_dict[msg], level_text=text, level_name=msg))
                     else:
                         logging.debug('engine doesnt support levels')
                 elif fen in book_map:
@@ -974,14 +1015,16 @@ class DgtDisplay(Observable, DisplayMsg, threading.Thread):
                                     self.engine_level_index = len(level_dict)-1
                                 msg = sorted(level_dict)[self.engine_level_index]
                                 options = level_dict[msg]  # cause of "new-engine", send options lateron - now only {}
-                                self.fire(Event.LEVEL(options={}, level_text=self.dgttranslate.text('M10_level', msg)))
+                                self.fire(Event.LEVEL(options={}, level_text=self.dgttranslate.text('M10_level', msg),
+                                                      level_name=msg))
                             else:
                                 msg = None
                                 options = {}
                             config = ConfigObj('picochess.ini')
                             config['engine-level'] = msg
                             config.write()
-                            self.fire(Event.NEW_ENGINE(eng=eng, eng_text=eng_text, options=options, ok_text=False))
+                            self.fire(Event.NEW_ENGINE(eng=eng, eng_text=eng_text, options=options, ok_text=False,
+                                                       level_name=msg or ''))
                             self.engine_restart = True
                             self.reset_menu_results()
                         except IndexError:
@@ -1083,8 +1126,14 @@ class DgtDisplay(Observable, DisplayMsg, threading.Thread):
         while True:
             # Check if we have something to display
             try:
-                message = self.msg_queue.get()
+                message = self.msg_queue.get(timeout=min_timeout(self.score_limiter, self.pv_limiter,
+                                                                 self.multipv_limiter))
                 logging.debug("received message from msg_queue: %s", message)
                 self.process_message(message)
             except queue.Empty:
                 pass
+            # show the coalesced score & pv, which were held back by the rate limiters - other messages
+            # may come in steadily, so dont wait for an empty queue
+            self.display_score(self.score_limiter.poll())
+            self.display_pv(self.pv_limiter.poll())
+            self.display_multipv(self.multipv_limiter.poll())
@@ -283,6 +283,17 @@ class DgtTranslate(object):
             nltxt = Dgt.DISPLAY_TEXT(l='fout Kabel ', m='errKabel', s='errkab')
             frtxt = Dgt.DISPLAY_TEXT(l='jack error ', m='jack err', s='jack  ')
             estxt = Dgt.DISPLAY_TEXT(l='jack error ', m='jack err', s='jack  ')
+        if text_id == 'speed':
+            def speed(digits, unit):  # Mnps if the knps dont fit the display
+                if len(msg) <= digits:
+                    return msg.rjust(digits) + unit
+                return str(int(msg) // 1000).rjust(digits)[:digits] + unit.replace('k', 'M')
+
+            entxt = Dgt.DISPLAY_TEXT(l=speed(5, ' knps'), m=speed(4, 'knps'), s=speed(4, 'kn'))
+            detxt = entxt
+            nltxt = entxt
+            frtxt = entxt
+            estxt = entxt
         if text_id == 'level':
             if msg.startswith('Elo@'):
                 msg = str(int(msg[4:])).rjust(4)
@@ -16,30 +16,117 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 from utilities import *
+from movestore import context_hash
+from sshpool import ssh_pool
+from hostprofile import host_profile
 import logging
+import time
+import socket
 import spur
-import paramiko
 import chess.uci
-from threading import Timer
+import chess.polyglot
+from threading import Thread, Lock, RLock
+import threading
+from collections import OrderedDict, deque, namedtuple
 import configparser
+import hashlib
+import functools
+import signal
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FutureTimeout
+
+# secs an engine may need for the uci/isready handshake while probing it
+PROBE_TIMEOUT = 10
+# secs each probe gets on top of its timeouts, e.g. for the process start
+PROBE_SLACK = 5
+# secs a search may overrun its time budget before the watchdog calls the engine hanging
+SEARCH_GRACE = 5
+# moves the remaining clock time is planned for if the search has no movestogo
+MOVES_TO_GO = 30
+# times its share of the clock (remaining / movestogo + increment) a search may take - hard moves take longer
+MOVE_BUDGET_FACTOR = 3
+# secs a timed search may go without any info output
+INFO_SILENCE = 60
+# secs between two watchdog checks
+WATCHDOG_INTERVAL = 1
+# secs to wait for the bestmove after a stop command
+STOP_TIMEOUT = 5
+# the states of an engine and the ones which may follow
+STATE_TRANSITIONS = {
+    EngineStatus.WAIT: (EngineStatus.THINK, EngineStatus.PONDER, EngineStatus.WAIT),
+    EngineStatus.THINK: (EngineStatus.STOP, EngineStatus.WAIT),
+    EngineStatus.PONDER: (EngineStatus.THINK, EngineStatus.STOP, EngineStatus.WAIT),
+    EngineStatus.STOP: (EngineStatus.WAIT,)
+}
+# secs a remote search may overrun its time budget before the local engine takes over
+FAILOVER_GRACE = 1
+# secs between two failover checks
+FAILOVER_INTERVAL = 0.5
+# good checks in a row till a failed remote engine is trusted again
+FAILBACK_CHECKS = 6
+# msecs a remote engine gets at least, whatever the network latency is
+MIN_SEARCH_TIME = 10
+# positions of the engine benchmark (see write_bench_ini): opening, middlegame, endgame
+BENCH_POSITIONS = [
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+    'r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP1QBPPP/R3KB1R w KQ - 0 9',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1'
+]
+# msecs per benchmark position
+BENCH_MOVETIME = 1000
+# secs between two score or pv events of a search, the displays throttle them further at their own rate
+INFO_INTERVAL = 0.1
+# events which dont mean somebody uses picochess - they dont keep the engine from being suspended
+IDLE_IGNORED_EVENTS = (EventApi.BEST_MOVE, EventApi.NEW_PV, EventApi.NEW_MULTIPV, EventApi.NEW_SCORE,
+                       EventApi.FAILOVER, EventApi.THROTTLE, EventApi.ENGINE_SPAWNED, EventApi.SPECULATION_READY)
+# complete searches per context whose depths tell how deep a stored search has to be
+DEPTH_SAMPLES = 20
+# how many search records are kept, and after how many searches the histograms go to the log
+TELEMETRY_RECORDS = 100
+TELEMETRY_LOG_EVERY = 50
+# upper bounds of the telemetry histogram buckets (the last bucket takes the rest)
+HISTOGRAM_BOUNDS = {
+    'depth': [4, 8, 12, 16, 20, 24, 28],
+    'knps': [10, 30, 100, 300, 1000, 3000, 10000],
+    'first_pv': [0.01, 0.03, 0.1, 0.3, 1, 3],  # secs
+    'bestmove': [0.1, 0.3, 1, 3, 10, 30]  # secs
+}
 
 
 def get_installed_engines(engine_shell, engine_file):
     return read_engine_ini(engine_shell, (engine_file.rsplit(os.sep, 1))[0])
 
 
+def default_engine_path():
+    program_path = os.path.dirname(os.path.realpath(__file__)) + os.sep
+    return program_path + 'engines' + os.sep + platform.machine()
+
+
 def read_engine_ini(engine_shell=None, engine_path=None):
+    if not engine_path:
+        engine_path = default_engine_path()
+    return engine_catalog.get(engine_shell, engine_path)
+
+
+def parse_engine_ini(engine_shell, engine_path):
+    def read_config(parser, file_name):
+        if engine_shell is None:
+            return parser.read(file_name)
+        with engine_shell.open(file_name, 'r') as file:
+            parser.read_file(file)
+        return [file_name]
+
     config = configparser.ConfigParser()
     config.optionxform = str
     try:
-        if engine_shell is None:
-            if not engine_path:
-                program_path = os.path.dirname(os.path.realpath(__file__)) + os.sep
-                engine_path = program_path + 'engines' + os.sep + platform.machine()
-            config.read(engine_path + os.sep + 'engines.ini')
-        else:
-            with engine_shell.open(engine_path + os.sep + 'engines.ini', 'r') as file:
-                config.read_file(file)
+        read_config(config, engine_path + os.sep + 'engines.ini')
+    except FileNotFoundError:
+        pass
+
+    bench = configparser.ConfigParser()
+    bench.optionxform = str
+    try:
+        read_config(bench, engine_path + os.sep + 'bench.ini')
     except FileNotFoundError:
         pass
 
@@ -48,11 +135,14 @@ def read_engine_ini(engine_shell=None, engine_path=None):
         parser = configparser.ConfigParser()
         parser.optionxform = str
         level_dict = {}
-        if parser.read(engine_path + os.sep + section + '.uci'):
-            for ps in parser.sections():
-                level_dict[ps] = {}
-                for option in parser.options(ps):
-                    level_dict[ps][option] = parser[ps][option]
+        try:
+            if read_config(parser, engine_path + os.sep + section + '.uci'):
+                for ps in parser.sections():
+                    level_dict[ps] = {}
+                    for option in parser.options(ps):
+                        level_dict[ps][option] = parser[ps][option]
+        except FileNotFoundError:
+            pass
 
         text = Dgt.DISPLAY_TEXT(l=config[section]['large'], m=config[section]['medium'], s=config[section]['small'],
                                 wait=True, beep=False, maxtime=0)
@@ -61,20 +151,108 @@ def read_engine_ini(engine_shell=None, engine_path=None):
                 'file': engine_path + os.sep + section,
                 'level_dict': level_dict,
                 'text': text,
-                'name': config[section]['name']
+                'name': config[section]['name'],
+                'bench': read_bench(bench, section)
             }
         )
     return library
 
 
-def write_engine_ini(engine_path=None):
-    def write_level_ini(engine_filename):
+def read_bench(bench, engine_file_name):
+    """Benchmark results of an engine as {level_name: {'nps', 'depth', 'time', 'rss'}}, '' is full strength."""
+    results = {}
+    for section in bench.sections():
+        file_name, _, level_name = section.partition(':')
+        if file_name == engine_file_name:
+            results[level_name] = {'nps': bench.getint(section, 'nps'), 'depth': bench.getfloat(section, 'depth'),
+                                   'time': bench.getint(section, 'time'), 'rss': bench.getint(section, 'rss')}
+    return results
+
+
+class EngineCatalog(object):
+    """Process wide cache of the installed engines and their levels.
+
+    An engine path is only parsed again if engines.ini or one of the level files changed (by mtime),
+    or for a remote engine path, if the directory listing of the server changed.
+    """
+
+    def __init__(self):
+        super(EngineCatalog, self).__init__()
+        self.lock = Lock()
+        self.paths = {}  # engine_path => (signature, library)
+        self.levels = {}  # (engine_file, level_name) => options
+
+    @staticmethod
+    def signature(engine_shell, engine_path):
+        if engine_shell is None:
+            try:
+                names = sorted(n for n in os.listdir(engine_path) if n.endswith(('.ini', '.uci')))
+                return tuple((n, os.stat(engine_path + os.sep + n).st_mtime_ns) for n in names)
+            except OSError:
+                return None
+        try:
+            listing = engine_shell.run(['ls', '-l', '--full-time', engine_path]).output
+            return hashlib.md5(listing).hexdigest()
+        except (spur.RunProcessError, spur.NoSuchCommandError, OSError):
+            logging.warning('cant list remote engine path [%s]', engine_path)
+            return None
+
+    def get(self, engine_shell, engine_path):
+        """Return the engine library of this path. The list is shared between all callers - dont change it."""
+        sig = self.signature(engine_shell, engine_path)
+        with self.lock:
+            if sig is not None and engine_path in self.paths and self.paths[engine_path][0] == sig:
+                return self.paths[engine_path][1]
+        logging.debug('reading engine catalog [%s]', engine_path)
+        library = parse_engine_ini(engine_shell, engine_path)
+        with self.lock:
+            self.paths[engine_path] = (sig, library)
+            for key in [k for k in self.levels if k[0].rsplit(os.sep, 1)[0] == engine_path]:
+                del self.levels[key]
+            for eng in library:
+                for level_name, options in eng['level_dict'].items():
+                    self.levels[(eng['file'], level_name)] = options
+        return library
+
+    def level(self, engine_shell, engine_file, level_name):
+        """Return the options of the engine level or an empty dict if the engine doesnt have it."""
+        self.get(engine_shell, engine_file.rsplit(os.sep, 1)[0])
+        with self.lock:
+            return self.levels.get((engine_file, level_name), {})
+
+
+engine_catalog = EngineCatalog()
+
+
+def probe_engine(engine_file, timeout=None):
+    """Start the engine and return what write_engine_ini() needs to know about it (None if it doesnt start).
+
+    Runs inside a worker process, so only plain (pickable) values are returned.
+    """
+    engine = UciEngine(engine_file, timeout=timeout)
+    if not EnginePool.is_alive(engine):
+        return None
+    options = engine.get().options
+    probe = {
+        'name': engine.get().name,
+        'elo': [int(options['UCI_Elo'][2]), int(options['UCI_Elo'][3])] if engine.has_limit_strength() else None,
+        'skill': [int(options['Skill Level'][3]), int(options['Skill Level'][4])] if engine.has_skill_level() else None
+    }
+    try:
+        engine.get().quit(async_callback=True).result(timeout)
+    except FutureTimeout:
+        logging.warning('engine [%s] didnt quit in %s secs - killing it', engine_file, timeout)
+        engine.kill()
+    return probe
+
+
+def write_engine_ini(engine_path=None, workers=None, timeout=PROBE_TIMEOUT):
+    def write_level_ini(engine_filename, probe):
         parser = configparser.ConfigParser()
         parser.optionxform = str
         if not parser.read(engine_path + os.sep + engine_filename + '.uci'):
-            if engine.has_limit_strength():
-                uelevel = engine.get().options['UCI_Elo']
-                elo_1, elo_2 = int(uelevel[2]), int(uelevel[3])
+            if probe['elo']:
+                elo_1, elo_2 = probe['elo']
                 minlevel, maxlevel = min(elo_1, elo_2), max(elo_1, elo_2)
                 if maxlevel - minlevel > 1000:
                     inc = int((maxlevel - minlevel) / 100)
@@ -87,9 +265,8 @@ def write_engine_ini(engine_path=None):
                     parser['Elo@{:04d}'.format(set_elo)] = {'UCI_LimitStrength' : 'true', 'UCI_Elo' : str(set_elo)}
                     set_elo += inc
                 parser['Elo@{:04d}'.format(maxlevel)] = {'UCI_LimitStrength': 'false', 'UCI_Elo': str(maxlevel)}
-            if engine.has_skill_level():
-                sklevel = engine.get().options['Skill Level']
-                minlevel, maxlevel = int(sklevel[3]), int(sklevel[4])
+            if probe['skill']:
+                minlevel, maxlevel = probe['skill']
                 for level in range(minlevel, maxlevel+1):
                     parser['Level@{:02d}'.format(level)] = {'Skill Level': str(level)}
             with open(engine_path + os.sep + engine_filename + '.uci', 'w') as configfile:
@@ -98,6 +275,13 @@ def write_engine_ini(engine_path=None):
     def is_exe(fpath):
         return os.path.isfile(fpath) and os.access(fpath, os.X_OK)
 
+    def file_hash(fpath):
+        sha = hashlib.sha1()
+        with open(fpath, 'rb') as file:
+            for chunk in iter(lambda: file.read(65536), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
     def name_build(parts, maxlength, default_name):
         eng_name = ''
         for token in parts:
@@ -107,127 +291,714 @@ def write_engine_ini(engine_path=None):
         return eng_name if eng_name else default_name
 
     if not engine_path:
-        program_path = os.path.dirname(os.path.realpath(__file__)) + os.sep
-        engine_path = program_path + 'engines' + os.sep + platform.machine()
-    engine_list = sorted(os.listdir(engine_path))
+        engine_path = default_engine_path()
+    engine_list = [f for f in sorted(os.listdir(engine_path)) if is_exe(engine_path + os.sep + f)]
+    hashes = {f: file_hash(engine_path + os.sep + f) for f in engine_list}
+
+    # Only probe the engines whose binary changed since the last run
+    cache_file = engine_path + os.sep + 'probe_cache.json'
+    try:
+        with open(cache_file) as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        cache = {}
+    todo = [f for f in engine_list if hashes[f] not in cache]
+    if todo:
+        workers = workers or os.cpu_count() or 1
+        deadline = None
+        if timeout:  # each probe has its uci and isready handshake and the quit, all limited by timeout
+            deadline = -(-len(todo) // workers) * (3 * timeout + PROBE_SLACK)
+        executor = ProcessPoolExecutor(max_workers=workers)
+        futures = {executor.submit(probe_engine, engine_path + os.sep + f, timeout): f for f in todo}
+        try:
+            for future in as_completed(futures, timeout=deadline):
+                engine_file_name = futures[future]
+                try:
+                    probe = future.result()
+                except Exception as e:  # dont let a single crashing engine stop the others
+                    logging.error('probing engine [%s] failed: %s', engine_file_name, e)
+                    probe = None
+                if probe:
+                    cache[hashes[engine_file_name]] = probe
+                    print(engine_file_name)
+                else:
+                    print(engine_file_name + ' failed')
+        except FutureTimeout:
+            for future, engine_file_name in futures.items():
+                if not future.done():
+                    future.cancel()
+                    logging.error('probing engine [%s] didnt finish in time', engine_file_name)
+                    print(engine_file_name + ' failed')
+        finally:
+            executor.shutdown(wait=False)  # dont wait for a hanging probe
+
     config = configparser.ConfigParser()
     config.optionxform = str
     for engine_file_name in engine_list:
-        if is_exe(engine_path + os.sep + engine_file_name):
-            engine = UciEngine(engine_path + os.sep + engine_file_name)
-            if engine:
-                print(engine_file_name)
-                try:
-                    if engine.has_levels():
-                        write_level_ini(engine_file_name)
-                    engine_name = engine.get().name
-
-                    name_parts = engine_name.replace('.', '').split(' ')
-                    name_small = name_build(name_parts, 6, engine_file_name[2:])
-                    name_medium = name_build(name_parts, 8, name_small)
-                    name_large = name_build(name_parts, 11, name_medium)
-
-                    config[engine_file_name] = {
-                        'name': engine_name,
-                        'small': name_small,
-                        'medium': name_medium,
-                        'large': name_large
-                    }
-                except AttributeError:
-                    pass
-                engine.quit()
+        probe = cache.get(hashes[engine_file_name])
+        if probe is None:
+            continue
+        if probe['elo'] or probe['skill']:
+            write_level_ini(engine_file_name, probe)
+        engine_name = probe['name']
+
+        name_parts = engine_name.replace('.', '').split(' ')
+        name_small = name_build(name_parts, 6, engine_file_name[2:])
+        name_medium = name_build(name_parts, 8, name_small)
+        name_large = name_build(name_parts, 11, name_medium)
+
+        config[engine_file_name] = {
+            'name': engine_name,
+            'small': name_small,
+            'medium': name_medium,
+            'large': name_large
+        }
     with open(engine_path + os.sep + 'engines.ini', 'w') as configfile:
         config.write(configfile)
+    with open(cache_file, 'w') as file:
+        json.dump({h: cache[h] for h in hashes.values() if h in cache}, file, indent=1)
+
+
+def engine_rss(pid):
+    """Resident memory of the process in kB (0 if unknown)."""
+    try:
+        with open('/proc/{}/status'.format(pid)) as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError, TypeError):
+        pass
+    return 0
+
+
+def default_options(engine, level_dict):
+    """The engine defaults of all options the levels set (the ones the engine knows and has a default for)."""
+    names = {name for options in level_dict.values() for name in options}
+    return {name: str(engine.options[name].default) for name in names
+            if name in engine.options and engine.options[name].default is not None}
+
+
+def benchmark_engine(engine_file, level_dict, movetime=BENCH_MOVETIME, max_levels=5):
+    """
+    Search the BENCH_POSITIONS with the engine at its full strength ('') and up to max_levels of its levels.
+    Returns {level_name: {'nps', 'depth', 'time', 'rss'}} - averages over the positions, rss is the maximum.
+    """
+    engine = UciEngine(engine_file, timeout=PROBE_TIMEOUT)
+    if not EnginePool.is_alive(engine):
+        return {}
+    levels = sorted(level_dict)
+    if len(levels) > max_levels:  # spread the sample over the whole range, the strongest included
+        levels = [levels[round(i * (len(levels) - 1) / (max_levels - 1))] for i in range(max_levels)]
+    results = {}
+    info_handler = chess.uci.InfoHandler()
+    engine.get().info_handlers.append(info_handler)
+    for level_name in [''] + levels:
+        # startup({}) would load the last .uci section - full strength means the engine defaults
+        options = level_dict[level_name] if level_name else default_options(engine.get(), level_dict)
+        engine.startup(options, False, level_name=level_name)
+        samples = []
+        rss = 0
+        for fen in BENCH_POSITIONS:
+            engine.new_game()
+            engine.position(chess.Board(fen))
+            start = time.monotonic()
+            engine.get().go(movetime=movetime)
+            secs = time.monotonic() - start
+            with info_handler:
+                info = dict(info_handler.info)
+            nps = info.get('nps') or int(info.get('nodes', 0) / secs)
+            samples.append((nps, info.get('depth', 0), secs))
+            rss = max(rss, engine_rss(engine.get_pid()))
+        results[level_name] = {
+            'nps': int(sum(sample[0] for sample in samples) / len(samples)),
+            'depth': round(sum(sample[1] for sample in samples) / len(samples), 1),
+            'time': int(1000 * sum(sample[2] for sample in samples) / len(samples)),
+            'rss': rss
+        }
+        logging.debug('bench [%s] %s: %s', engine_file, level_name or 'max', results[level_name])
+    EnginePool.shutdown(engine)
+    return results
+
+
+def write_bench_ini(engine_path=None, movetime=BENCH_MOVETIME, max_levels=5):
+    """Benchmark all engines of engines.ini and write the results to bench.ini next to it."""
+    if not engine_path:
+        engine_path = default_engine_path()
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    # only results with the same suite and movetime are comparable - across machines too
+    suite = hashlib.sha1('\n'.join(BENCH_POSITIONS).encode('utf-8')).hexdigest()[:8]
+    config['benchmark'] = {'machine': platform.machine(), 'suite': suite, 'movetime': str(movetime)}
+    for eng in parse_engine_ini(None, engine_path):
+        engine_file_name = eng['file'].rsplit(os.sep, 1)[1]
+        print(engine_file_name)
+        for level_name, result in benchmark_engine(eng['file'], eng['level_dict'], movetime, max_levels).items():
+            section = engine_file_name + (':' + level_name if level_name else '')
+            config[section] = {key: str(value) for key, value in result.items()}
+    with open(engine_path + os.sep + 'bench.ini', 'w') as configfile:
+        config.write(configfile)
+
+
+class MultiPvTable(object):
+    """
+    The latest lines of a (MultiPV) search per depth. Slot i of a depth holds (depth, score, mate, pv) of the
+    i+1 best line. Lines are only shown together with lines of the same depth - the deepest complete one.
+    """
+
+    def __init__(self, size=1):
+        super(MultiPvTable, self).__init__()
+        self.size = size
+        self.depths = {}  # depth => slots
+        self.shown = []
+        self.changed = False
+
+    def resize(self, size):
+        self.size = size
+        self.depths = {}
+        self.shown = []
+        self.changed = False
+
+    def clear(self):
+        self.resize(self.size)
+
+    def update(self, index, depth, score, moves):
+        if 0 < index <= self.size:
+            cp, mate = score if score else (None, None)
+            self.depths.setdefault(depth, [None] * self.size)[index - 1] = (depth, cp, mate, moves)
+            complete = self.complete_depth()
+            for old in [d for d in self.depths if d < complete]:
+                del self.depths[old]
+            self.changed = self.current() != self.shown
+
+    def complete_depth(self):
+        """The deepest depth with all lines, or which the engine left for a deeper one (less legal moves)."""
+        if not self.depths:
+            return None
+        deepest = max(self.depths)
+        if all(self.depths[deepest]) or len(self.depths) == 1:
+            return deepest
+        return max(depth for depth in self.depths if depth != deepest)
+
+    def current(self):
+        """The filled lines of the deepest complete depth."""
+        depth = self.complete_depth()
+        return [slot for slot in self.depths[depth] if slot] if depth is not None else []
+
+    def best(self):
+        """The deepest best line (even of a depth not complete yet) - None if there is none."""
+        for depth in sorted(self.depths, reverse=True):
+            if self.depths[depth][0]:
+                return self.depths[depth][0]
+        return None
+
+    def lines(self):
+        """Return the lines to show and mark the table as delivered."""
+        self.shown = self.current()
+        self.changed = False
+        return self.shown
 
 
 class Informer(chess.uci.InfoHandler):
-    def __init__(self):
+    def __init__(self, interval=INFO_INTERVAL, sink=None):
         super(Informer, self).__init__()
+        self.sink = sink  # if set, the best line goes as sink(depth, score, pv) there instead of firing events
+        self.quiet = False  # no events while the engine searches a position the displays dont show (go ponder)
         self.dep = 0
-        self.allow_score = True
-        self.allow_pv = True
+        self.pv_index = 1
+        self.line_score = None
+        self.last_output = time.monotonic()
+        self.multipv_table = MultiPvTable()
+        self.go_time = None
+        self.first_info = None  # secs from go till the first info line
+        self.first_pv = None
+        self.bestmove_time = None
+        self.node_count = None
+        self.node_rate = None
+        self.score_limiter = RateLimiter(interval)
+        self.pv_limiter = RateLimiter(interval)
+        self.multipv_limiter = RateLimiter(interval)
 
     def on_go(self):
         self.dep = 0
-        self.allow_score = True
-        self.allow_pv = True
+        self.go_time = time.monotonic()
+        self.first_info = self.first_pv = self.bestmove_time = None
+        self.node_count = self.node_rate = None
+        self.multipv_table.clear()
+        self.score_limiter.reset()
+        self.pv_limiter.reset()
+        self.multipv_limiter.reset()
         super().on_go()
 
+    def pre_info(self, line):
+        self.last_output = time.monotonic()
+        if self.first_info is None and self.go_time:
+            self.first_info = self.last_output - self.go_time
+        self.pv_index = 1  # info lines without a multipv token belong to the best line
+        self.line_score = None
+        super().pre_info(line)
+
     def depth(self, dep):
         self.dep = dep
         super().depth(dep)
 
-    def _reset_allow_score(self):
-        self.allow_score = True
+    def multipv(self, num):
+        self.pv_index = num
+        super().multipv(num)
 
-    def _reset_allow_pv(self):
-        self.allow_pv = True
+    def nodes(self, x):
+        self.node_count = x
+        super().nodes(x)
 
-    def _allow_fire_score(self):
-        if self.allow_score:
-            self.allow_score = False
-            Timer(0.5, self._reset_allow_score).start()
-            return True
-        else:
-            return False
+    def nps(self, x):
+        self.node_rate = x
+        super().nps(x)
 
-    def _allow_fire_pv(self):
-        if self.allow_pv:
-            self.allow_pv = False
-            Timer(0.5, self._reset_allow_pv).start()
-            return True
-        else:
-            return False
+    @staticmethod
+    def _fire_score(score):
+        if score is not None:
+            Observable.fire(Event.NEW_SCORE(score=score[0], mate=score[1]))
+
+    @staticmethod
+    def _fire_pv(moves):
+        if moves is not None:
+            Observable.fire(Event.NEW_PV(pv=moves))
+
+    @staticmethod
+    def _fire_multipv(lines):
+        if lines is not None:
+            Observable.fire(Event.NEW_MULTIPV(lines=lines))
 
     def score(self, cp, mate, lowerbound, upperbound):
-        if self._allow_fire_score():
-            Observable.fire(Event.NEW_SCORE(score=cp, mate=mate))
+        self.line_score = (cp, mate)
+        if self.pv_index == 1 and self.sink is None and not self.quiet:
+            self._fire_score(self.score_limiter.offer((cp, mate)))
         super().score(cp, mate, lowerbound, upperbound)
 
     def pv(self, moves):
-        if self._allow_fire_pv() and moves:
-            Observable.fire(Event.NEW_PV(pv=moves))
+        if moves:
+            if self.first_pv is None and self.go_time:
+                self.first_pv = time.monotonic() - self.go_time
+            self.multipv_table.update(self.pv_index, self.dep, self.line_score, moves)
+            if self.pv_index == 1 and self.sink:
+                self.sink(self.dep, self.line_score, moves)
+            elif self.pv_index == 1 and not self.quiet:
+                self._fire_pv(self.pv_limiter.offer(moves))
         super().pv(moves)
 
+    def post_info(self):
+        if self.quiet:
+            super().post_info()
+            return
+        # deliver the coalesced values whose interval ended meanwhile
+        self._fire_score(self.score_limiter.poll())
+        self._fire_pv(self.pv_limiter.poll())
+        if self.multipv_table.size > 1 and self.multipv_table.changed:
+            self._fire_multipv(self.multipv_limiter.offer(self.multipv_table.lines()))
+        else:
+            self._fire_multipv(self.multipv_limiter.poll())
+        super().post_info()
+
+    def on_bestmove(self, bestmove, ponder):
+        if self.go_time:
+            self.bestmove_time = time.monotonic() - self.go_time
+        # the search is over, so dont hold back the latest values any longer
+        self._fire_score(self.score_limiter.flush())
+        self._fire_pv(self.pv_limiter.flush())
+        self._fire_multipv(self.multipv_limiter.flush())
+        super().on_bestmove(bestmove, ponder)
+
+
+def silent_informer():
+    """An Informer whose lines go nowhere - for engines no display shows (engine server, epd benchmark)."""
+    return Informer(sink=lambda depth, score, pv: None)
+
+
+# what a search did: times are secs after the go command, stopped is True if it didnt end on its own
+SearchRecord = namedtuple('SearchRecord', ['engine', 'level', 'mode', 'start', 'first_info', 'first_pv', 'depth',
+                                           'nodes', 'nps', 'bestmove', 'stopped'])
+
+
+class Histogram(object):
+    """Counts of values per bucket - bounds are the upper limits, the last bucket takes everything above."""
+
+    def __init__(self, bounds):
+        super(Histogram, self).__init__()
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+
+    def add(self, value):
+        if value is None:
+            return
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+
+    def get(self):
+        labels = ['<={}'.format(bound) for bound in self.bounds] + ['>{}'.format(self.bounds[-1])]
+        return dict(zip(labels, self.counts))
+
+
+class SearchTelemetry(object):
+    """
+    The records of the recent searches (a ring buffer) and histograms of all searches per engine and level.
+    add() only counts - the web server takes a snapshot() when a client asks, the log gets one now and then.
+    """
+
+    def __init__(self, size=TELEMETRY_RECORDS, log_every=TELEMETRY_LOG_EVERY):
+        super(SearchTelemetry, self).__init__()
+        self.lock = Lock()
+        self.records = deque(maxlen=size)
+        self.histograms = {}  # (engine, level) => {name: Histogram}
+        self.counts = {}  # (engine, level) => [searches, stopped]
+        self.log_every = log_every
+        self.total = 0
+
+    def add(self, record):
+        key = (record.engine, record.level)
+        with self.lock:
+            self.records.append(record)
+            histograms = self.histograms.setdefault(key, {n: Histogram(b) for n, b in HISTOGRAM_BOUNDS.items()})
+            histograms['depth'].add(record.depth)
+            histograms['knps'].add(record.nps / 1000 if record.nps else None)
+            histograms['first_pv'].add(record.first_pv)
+            if not record.stopped:  # a stopped search says nothing about its time management
+                histograms['bestmove'].add(record.bestmove)
+            counts = self.counts.setdefault(key, [0, 0])
+            counts[0] += 1
+            counts[1] += record.stopped
+            self.total += 1
+            log = self.log_every and self.total % self.log_every == 0
+        logging.debug('search %s', record)
+        if log:
+            for key, summary in self.snapshot()['histograms'].items():
+                logging.info('search telemetry [%s]: %s', key, summary)
+
+    def snapshot(self):
+        """Records and histograms as plain (json ready) values."""
+        with self.lock:
+            histograms = {}
+            for (engine, level), named in self.histograms.items():
+                searches, stopped = self.counts[(engine, level)]
+                summary = {name: histogram.get() for name, histogram in named.items()}
+                summary.update({'searches': searches, 'stopped': stopped})
+                histograms['{} {}'.format(engine, level).strip()] = summary
+            return {'records': [record._asdict() for record in self.records], 'histograms': histograms}
+
+
+search_telemetry = SearchTelemetry()
+
+
+class PositionMirror(object):
+    """
+    Mirrors the position last sent to the engine in a compact form.
+    Everything before the last irreversible move (capture or pawn move) cant matter for the engine anymore,
+    so the root is the fen of that position and only the moves after it are kept. Thats at most 100 plies,
+    whatever the length of the game is.
+    """
+
+    def __init__(self):
+        super(PositionMirror, self).__init__()
+        self.root_fen = None
+        self.board = None
+
+    def reset(self):
+        self.root_fen = None
+        self.board = None
+
+    def update(self, game):
+        """Sync the mirror with the game. Returns the compact board if the position changed, else None."""
+        plies = min(game.halfmove_clock, len(game.move_stack))
+        moves = list(game.move_stack)[len(game.move_stack) - plies:]  # python-chess keeps the stack in a deque
+        for _ in moves:
+            game.pop()
+        root_fen = game.fen()
+        for move in moves:
+            game.push(move)
+
+        board = self.board
+        if board is not None and root_fen == self.root_fen and moves[:len(board.move_stack)] == list(board.move_stack):
+            if len(moves) == len(board.move_stack):
+                return None  # unchanged
+            for move in moves[len(board.move_stack):]:
+                board.push(move)
+        else:
+            board = chess.Board(root_fen, chess960=game.chess960)
+            for move in moves:
+                board.push(move)
+            self.root_fen = root_fen
+            self.board = board
+        return board
+
+
+# a finished search - complete is False if the search was stopped before the engine decided on its own
+SearchResult = namedtuple('SearchResult', ['bestmove', 'ponder', 'score', 'mate', 'depth', 'pv', 'complete'])
+
+
+class SearchCache(object):
+    """
+    LRU cache of finished searches. After a takeback, an alternative move or back in analysis
+    the result for a position seen before can be shown (or played) right away.
+    Complete searches of a time control are also kept in the (optional) persistent store for later games.
+    """
+
+    def __init__(self, size=256, store=None):
+        super(SearchCache, self).__init__()
+        self.size = size
+        self.store = store
+        self.entries = OrderedDict()
+        self.depths = {}  # store context => depths of the recent complete searches
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(game, engine_file, options, limits, excludemoves=None):
+        """A result only counts for the same position, engine, level, time control and excluded moves."""
+        excluded = frozenset(move.uci() for move in excludemoves) if excludemoves else None
+        return (game.zobrist_hash(), engine_file, tuple(sorted(options.items())), limits, excluded)
+
+    @staticmethod
+    def persistent(key):
+        """Only plain searches with a time control go to the store - no analysis, no alternative moves."""
+        zobrist, engine_file, option_items, limits, excluded = key
+        if limits is None or excluded is not None:
+            return None
+        return zobrist, context_hash(engine_file, option_items, limits)
+
+    def get(self, key):
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                result = self._get_stored(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            return result
+
+    def _get_stored(self, key):
+        store_key = self.persistent(key)
+        if self.store is None or store_key is None:
+            return None
+        stored = self.store.get(*store_key)
+        if stored is None:
+            return None
+        bestmove, ponder, score, mate, depth = stored
+        if depth < self.min_depth(store_key[1]):
+            logging.debug('stored search of depth %i is too shallow for now', depth)
+            return None
+        pv = [bestmove, ponder] if ponder else [bestmove]
+        return SearchResult(bestmove, ponder, score, mate, depth, pv, True)
+
+    def min_depth(self, context):
+        """The typical depth of the recent complete searches of this context - shallower stored ones dont count."""
+        depths = sorted(self.depths.get(context, ()))
+        return depths[len(depths) // 2] if depths else 0
+
+    def put(self, key, result):
+        store_key = self.persistent(key)
+        if store_key is not None and result.complete and result.depth:
+            self.depths.setdefault(store_key[1], deque(maxlen=DEPTH_SAMPLES)).append(result.depth)
+        if self.store is not None and store_key is not None and result.complete:
+            self.store.put(*store_key, bestmove=result.bestmove, ponder=result.ponder, score=result.score,
+                           mate=result.mate, depth=result.depth)
+        with self.lock:
+            old = self.entries.get(key)
+            if old and (old.complete and not result.complete or old.depth > result.depth):
+                self.entries.move_to_end(key)  # keep the better one
+                return
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def close(self):
+        """Flush and close the store - at shutdown."""
+        if self.store is not None:
+            self.store.close()
+
+
+search_cache = SearchCache()
+
+
+class SocketProcess(object):
+    """
+    Process for a chess.uci.Engine which is served by an engine server (see engineserver.py) over tcp.
+    Works like the popen and spur processes of python-chess: lines go out with send_line, lines coming in
+    are handed to the engine by a receiving thread.
+    """
+
+    def __init__(self, address, engine_name, client_id, priority=0):
+        super(SocketProcess, self).__init__()
+        self.engine = None
+        self.lock = Lock()
+        self.greeting = 'picochess {} {} {}'.format(engine_name, client_id, priority)
+        host, port = address.rsplit(':', 1)
+        self.sock = socket.create_connection((host, int(port)), timeout=PROBE_TIMEOUT)
+        self.sock.settimeout(None)
+        self.reader = self.sock.makefile('r', encoding='utf-8')
+        self.alive = True
+
+    def spawn(self, engine):
+        """Called by the chess.uci.Engine constructor - from now on its lines go to the server."""
+        self.engine = engine
+        self.send_line(self.greeting)
+        Thread(target=self._receiving_thread_target, daemon=True).start()
+
+    def _receiving_thread_target(self):
+        try:
+            for line in self.reader:
+                self.engine.on_line_received(line.rstrip())
+        except OSError:
+            logging.warning('connection to the engine server lost')
+        self.alive = False
+        self.engine.on_terminated()
+
+    def is_alive(self):
+        return self.alive
+
+    def terminate(self):
+        self.alive = False
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def kill(self):
+        self.terminate()
+
+    def send_line(self, string):
+        with self.lock:
+            self.sock.sendall((string + '\n').encode('utf-8'))
+
+    def wait_for_return_code(self):
+        return 0 if not self.alive else None
+
+    def pid(self):
+        return None
+
+    def __repr__(self):
+        return '<SocketProcess at {}>'.format(hex(id(self)))
+
+
+def socket_spawn_engine(address, engine_file, client_id, priority=0, engine_cls=chess.uci.Engine):
+    """Connect to an engine of the engine server - the tcp counterpart to chess.uci.spur_spawn_engine."""
+    process = SocketProcess(address, os.path.basename(engine_file), client_id, priority)
+    return engine_cls(process)
+
 
 class UciEngine(object):
-    def __init__(self, file, hostname=None, username=None, key_file=None, password=None):
+    def __init__(self, file, hostname=None, username=None, key_file=None, password=None, timeout=None,
+                 handler=None, server=None, priority=0):
         super(UciEngine, self).__init__()
         try:
             self.shell = None
-            if hostname:
-                logging.info("connecting to [%s]", hostname)
-                if key_file:
-                    shell = spur.SshShell(hostname=hostname, username=username, private_key_file=key_file,
-                                          missing_host_key=paramiko.AutoAddPolicy())
-                else:
-                    shell = spur.SshShell(hostname=hostname, username=username, password=password,
-                                          missing_host_key=paramiko.AutoAddPolicy())
-                self.shell = shell
-                self.engine = chess.uci.spur_spawn_engine(shell, [file])
-            else:
-                self.engine = chess.uci.popen_engine(file)
-
+            self.hostname = hostname
+            self.username = username
+            self.key_file = key_file
+            self.password = password
+            self.server = server
+            self.priority = priority
             self.file = file
-            if self.engine:
-                handler = Informer()
-                self.engine.info_handlers.append(handler)
-                self.engine.uci()
-            else:
-                logging.error("engine executable [%s] not found", file)
+            self.handler = handler or Informer()
+            self.multipv_lines = 1
+            self.mirror = PositionMirror()
             self.options = {}
-            self.future = None
+            self.search_id = 0  # a bestmove only counts if its search is still the current one
+            self.pending = []  # (action, args) to run once a stopping search is over
             self.show_best = True
+            self.search_key = None
+            self.stopped = False
+            self.time_dict = None
+            self.search_start = None
+            self.ponder_fen = None  # position of a "go ponder" on the expected user move
+            self.stop_start = None
+            self.stop_future = None
+            self.lock = RLock()
+            self.restarts = 0
+            self.downtime = 0.0
+            self.throttled = 0  # threads while the system is too hot or busy, 0 if it isnt
+            self.full_threads = None  # Threads of the level (None: host profile or engine default)
+            self.suspended = None  # 'stop' (SIGSTOP) or 'quit' while nobody uses picochess - actions are deferred
+            self.restarting = False  # the engine process is replaced right now, see restart()
 
             self.res = None
             self.status = EngineStatus.WAIT
+            self.search_status = EngineStatus.WAIT  # what the engine did before stopping/waiting
+            self.ready = threading.Event()  # set while the engine waits, so callers can block on it instead of polling
+            self.ready.set()
+            self.start_latencies = deque(maxlen=50)
+            self.stop_latencies = deque(maxlen=50)
+            self.level_name = ''
+            self.search_started = None
             self.level_support = False
+            self.spawn(timeout)
 
         except OSError:
             logging.exception('OS error in starting engine')
         except TypeError:
             logging.exception('engine executable not found')
 
+    def spawn(self, timeout=None):
+        self.engine = self.new_process(timeout)
+
+    def new_process(self, timeout=None):
+        """Start the engine process and do the handshake. Returns the python-chess engine (None if it failed)."""
+        if self.hostname:  # ask the pool each time - a broken session was replaced meanwhile
+            self.shell = ssh_pool.shell(self.hostname, self.username, self.key_file, self.password)
+        if self.shell:
+            engine = chess.uci.spur_spawn_engine(self.shell, [self.file])
+        elif self.server:
+            engine = socket_spawn_engine(self.server, self.file, socket.gethostname(), self.priority)
+        else:
+            engine = chess.uci.popen_engine(self.file)
+        if not engine:
+            logging.error("engine executable [%s] not found", self.file)
+            return None
+        engine.info_handlers.append(self.handler)
+        rtt = self.handshake(engine, timeout)
+        if rtt is None:
+            return None
+        if self.is_local():
+            host_profile.pin(self.process_pid(engine))
+        elif self.shell:
+            ssh_pool.watch(self.hostname, self.username, self.ping, rtt)
+        return engine
+
+    def handshake(self, engine, timeout=None):
+        """Returns the secs of the isready/readyok round trip (None if the engine failed)."""
+        try:
+            engine.uci(async_callback=True).result(timeout)
+            start = time.monotonic()
+            engine.isready(async_callback=True).result(timeout)
+            return time.monotonic() - start
+        except FutureTimeout:
+            logging.error('engine [%s] didnt finish the handshake in %s secs', self.file, timeout)
+            engine.kill()
+            return None
+
+    def ping(self):
+        """Secs of an isready/readyok round trip - None while the engine is busy (python-chess would queue it)."""
+        with self.lock:
+            if not self.engine or self.suspended or self.restarting or not self.is_waiting() \
+                    or not self.engine.is_alive():
+                return None
+            start = time.monotonic()
+            future = self.engine.isready(async_callback=True)
+        try:
+            future.result(PROBE_TIMEOUT)
+        except (FutureTimeout, chess.uci.EngineTerminatedException):
+            return None
+        return time.monotonic() - start
+
     def get(self):
         return self.engine
 
@@ -235,10 +1006,22 @@ class UciEngine(object):
         self.options[name] = value
 
     def send(self):
+        if self.deferred(self.send):
+            return
         self.engine.setoption(self.options)
 
-    def level(self, options):
+    def setoption(self, options):
+        if self.deferred(self.setoption, options):
+            return
+        self.engine.setoption(options)
+
+    def level(self, options, level_name=''):
+        """Set the options of the level (the name as in the menu, '' for none) - send() passes them to the engine."""
         self.options = options
+        self.level_name = level_name
+        self.full_threads = options.get('Threads')
+        if self.throttled:  # a new level doesnt end the throttle
+            self.options = dict(options, Threads=str(self.throttled))
 
     def has_levels(self):
         return self.level_support or self.has_skill_level() or self.has_limit_strength()
@@ -252,14 +1035,58 @@ class UciEngine(object):
     def has_chess960(self):
         return 'UCI_Chess960' in self.engine.options
 
+    def has_multipv(self):
+        return 'MultiPV' in self.engine.options
+
+    def multipv(self, lines):
+        """Set the number of lines for the next search - as far as the engine supports it."""
+        if self.deferred(self.multipv, lines):
+            return lines
+        if self.has_multipv():
+            lines = max(1, min(lines, int(self.engine.options['MultiPV'][4])))
+            if lines != self.multipv_lines:
+                self.engine.setoption({'MultiPV': lines})
+        else:
+            lines = 1
+        if lines != self.multipv_lines:
+            self.multipv_lines = lines
+            self.handler.multipv_table.resize(lines)
+        return lines
+
     def get_file(self):
         return self.file
 
+    def get_pid(self):
+        return self.process_pid(self.engine)
+
+    @staticmethod
+    def process_pid(engine):
+        try:
+            return engine.process.pid()
+        except AttributeError:
+            return None  # not started or a remote engine
+
+    def is_local(self):
+        return not self.hostname and not self.server
+
     def get_shell(self):
         return self.shell  # shell is only "not none" if its a local engine - see __init__
 
     def position(self, game):
-        self.engine.position(game)
+        if self.deferred(self.position, game.copy()):
+            return
+        with self.lock:
+            board = self.mirror.update(game)
+            if board is None:
+                logging.debug('engine already has this position')
+                return
+            self.engine.position(board)
+
+    def new_game(self):
+        self.mirror.reset()
+        if self.deferred(self.new_game):
+            return
+        self.engine.ucinewgame()
 
     def quit(self):
         return self.engine.quit()
@@ -274,42 +1101,415 @@ class UciEngine(object):
         self.engine.uci()
 
     def stop(self, show_best=False):
-        if self.is_waiting():
-            logging.info('engine already stopped')
+        """
+        Tell the engine to stop and return at once. The bestmove comes in by callback() (BEST_MOVE if show_best).
+        If it doesnt come within STOP_TIMEOUT secs the watchdog restarts the engine.
+        """
+        with self.lock:
+            if self.restarting:  # restart() doesnt resume an old search then
+                self.search_id += 1
+                self.pending = [(action, args) for action, args in self.pending if not self.is_search(action)]
+                return self.res
+            if self.is_waiting():
+                logging.info('engine already stopped')
+                return self.res
+            self.show_best = show_best
+            if self.is_stopping():  # searches queued meanwhile are dropped too
+                self.pending = [(action, args) for action, args in self.pending if not self.is_search(action)]
+                return self.res
+            self.stopped = True
+            self.stop_start = time.monotonic()
+            self.set_status(EngineStatus.STOP)
+            self.stop_future = self.engine.stop(async_callback=True)
             return self.res
-        self.show_best = show_best
-        self.engine.stop()
-        return self.future.result()
-
-    def go(self, time_dict):
-        if not self.is_waiting():
-            logging.warning('engine (still) not waiting - strange!')
-        self.status = EngineStatus.THINK
-        self.show_best = True
-        time_dict['async_callback'] = self.callback
-
-        DisplayMsg.show(Message.SEARCH_STARTED(engine_status=self.status))
-        self.future = self.engine.go(**time_dict)
-        return self.future
-
-    def ponder(self):
-        if not self.is_waiting():
-            logging.warning('engine (still) not waiting - strange!')
-        self.status = EngineStatus.PONDER
-        self.show_best = False
-
-        DisplayMsg.show(Message.SEARCH_STARTED(engine_status=self.status))
-        self.future = self.engine.go(ponder=True, infinite=True, async_callback=self.callback)
-        return self.future
-
-    def callback(self, command):
-        self.res = command.result()
-        DisplayMsg.show(Message.SEARCH_STOPPED(engine_status=self.status))
-        if self.show_best:
-            Observable.fire(Event.BEST_MOVE(result=self.res, inbook=False))
+
+    def is_search(self, action):
+        return action in (self.go, self.ponder, self.ponder_on)
+
+    def deferred(self, action, *args):
+        """
+        Returns True if the action has to wait till the running search is over - python-chess takes no new search
+        (and blocks on most other commands) before the bestmove is in. A new search stops the running one first.
+        The action is run by callback() then.
+        """
+        with self.lock:
+            if self.restarting or self.suspended:  # run on the new (or woken) process
+                self.pending.append((action, args))
+                return True
+            if self.is_waiting() or not (self.is_stopping() or self.is_search(action)):
+                return False
+            if not self.is_stopping():
+                logging.warning('engine (still) not waiting - stopping it first')
+                self.stop()
+            self.pending.append((action, args))
+            return True
+
+    def run_pending(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+            for action, args in pending:
+                action(*args)
+
+    def set_status(self, status):
+        if status not in STATE_TRANSITIONS[self.status]:
+            logging.warning('engine state %s => %s isnt expected', self.status, status)
+        if status in (EngineStatus.THINK, EngineStatus.PONDER):
+            self.search_status = status
+        self.status = status
+        if status == EngineStatus.WAIT:
+            self.ready.set()
+        else:
+            self.ready.clear()
+
+    def new_search(self):
+        """Start a new search (id) - results of all older ones are ignored from now on."""
+        self.search_id += 1
+        self.search_started = time.time()
+        return functools.partial(self.callback, self.search_id)
+
+    def wait_ready(self, timeout=None):
+        """
+        Block till the engine waits for a new search (or timeout secs passed). Returns True if it does.
+        Only for EnginePool threads - the event loop never blocks on it, its commands are deferred instead.
+        """
+        return self.ready.wait(timeout)
+
+    def record_start_latency(self, secs):
+        """Time from the request of a search (e.g. the user move) till the engine got its go command."""
+        self.start_latencies.append(secs)
+        logging.debug('search started after %.1fms', secs * 1000)
+
+    def go(self, time_dict, search_key=None):
+        if self.deferred(self.go, time_dict, search_key):
+            return None
+        with self.lock:
+            self.set_status(EngineStatus.THINK)
+            self.show_best = True
+            self.search_key = search_key
+            self.stopped = False
+            self.time_dict = dict(time_dict)
+            self.search_start = time.monotonic()
+            if self.shell:
+                self.reduce_time(time_dict, ssh_pool.latency(self.hostname, self.username))
+            time_dict['async_callback'] = self.new_search()
+
+            DisplayMsg.show(Message.SEARCH_STARTED(engine_status=self.status))
+            return self.engine.go(**time_dict)
+
+    @staticmethod
+    def reduce_time(time_dict, secs):
+        """
+        Take secs from the time the engine may use, e.g. the network round trip (go out, bestmove back)
+        of a remote engine or the time already gone before a restart.
+        """
+        msecs = int(secs * 1000)
+        if msecs:
+            for key in ('movetime', 'wtime', 'btime'):
+                if key in time_dict:
+                    time_dict[key] = str(max(MIN_SEARCH_TIME, int(time_dict[key]) - msecs))
+            logging.debug('engine time reduced by %ims', msecs)
+
+    def ponder(self, search_key=None):
+        if self.deferred(self.ponder, search_key):
+            return None
+        with self.lock:
+            self.set_status(EngineStatus.PONDER)
+            self.show_best = False
+            self.search_key = search_key
+            self.stopped = False
+            self.time_dict = None
+            self.search_start = time.monotonic()
+
+            DisplayMsg.show(Message.SEARCH_STARTED(engine_status=self.status))
+            return self.engine.go(ponder=True, infinite=True, async_callback=self.new_search())
+
+    def ponder_on(self, game, move, time_dict):
+        """Search the position after the expected user move on the users time ("go ponder")."""
+        if self.deferred(self.ponder_on, game.copy(), move, time_dict):
+            return None
+        with self.lock:
+            game.push(move)
+            try:
+                self.position(game)
+                self.ponder_fen = game.fen()
+            finally:
+                game.pop()
+            self.handler.quiet = True  # its pv starts with the engine move after the expected one, its score too
+            self.set_status(EngineStatus.PONDER)
+            self.show_best = False
+            self.search_key = None
+            self.stopped = False
+            self.time_dict = dict(time_dict)
+            self.search_start = time.monotonic()
+            if self.shell:
+                self.reduce_time(time_dict, ssh_pool.latency(self.hostname, self.username))
+            time_dict['ponder'] = True
+            time_dict['async_callback'] = self.new_search()
+
+            DisplayMsg.show(Message.SEARCH_STARTED(engine_status=self.status))
+            return self.engine.go(**time_dict)
+
+    def is_ponder_search(self):
+        return self.is_pondering() and self.ponder_fen is not None
+
+    def ponderhit(self, game, search_key=None):
+        """If the user played the expected move, turn the ponder search into the real one. Returns True if so."""
+        with self.lock:
+            if not self.is_ponder_search() or game.fen() != self.ponder_fen:
+                return False
+            self.engine.ponderhit()
+            self.handler.quiet = False  # now its the position of the game
+            self.set_status(EngineStatus.THINK)
+            self.show_best = True
+            self.search_key = search_key
+            self.search_start = time.monotonic()
+            self.ponder_fen = None
+
+            DisplayMsg.show(Message.SEARCH_STARTED(engine_status=self.status))
+            return True
+
+    def callback(self, search_id, command):
+        with self.lock:
+            if search_id != self.search_id:
+                logging.debug('ignoring the late bestmove of search %i', search_id)
+                return
+            self.res = command.result()
+            self.ponder_fen = None
+            self.handler.quiet = False
+            self.cache_result()
+            self.record_search()
+            if self.is_stopping():
+                self.stop_latencies.append(time.monotonic() - self.stop_start)
+                logging.debug('engine stopped after %.1fms', self.stop_latencies[-1] * 1000)
+                if not self.stop_future.done():  # python-chess takes the next search only once its stop is done too
+                    self.stop_future.add_done_callback(lambda future: self.finish(search_id))
+                    return
+            self.finish(search_id)
+
+    def finish(self, search_id):
+        """The search is over and python-chess takes new commands - tell the displays and run what waited for it."""
+        with self.lock:
+            if search_id != self.search_id:
+                return
+            # the snapshot is built when somebody asks for it, not for every search
+            DisplayMsg.show(Message.SEARCH_STOPPED(engine_status=self.search_status, telemetry=search_telemetry))
+            if self.show_best and self.res.bestmove:  # a search dropped by the engine server has no move
+                Observable.fire(Event.BEST_MOVE(result=self.res, inbook=False))
+            else:
+                logging.debug('event best_move not fired')
+            self.set_status(EngineStatus.WAIT)
+            self.run_pending()
+
+    def record_search(self):
+        handler = self.handler
+        nps = handler.node_rate
+        if not nps and handler.node_count and handler.bestmove_time:
+            nps = int(handler.node_count / handler.bestmove_time)
+
+        def rounded(secs):
+            return None if secs is None else round(secs, 3)
+
+        mode = 'ponder' if self.search_status == EngineStatus.PONDER else 'think'
+        search_telemetry.add(SearchRecord(self.engine.name, self.level_name, mode, round(self.search_started, 3),
+                                          rounded(handler.first_info), rounded(handler.first_pv), handler.dep or None,
+                                          handler.node_count, nps, rounded(handler.bestmove_time), self.stopped))
+
+    def cache_result(self):
+        best_line = self.handler.multipv_table.best()
+        if self.search_key is None or self.res is None or self.res.bestmove is None or not best_line:
+            return
+        depth, score, mate, pv = best_line
+        complete = self.is_thinking() and not self.stopped
+        search_cache.put(self.search_key, SearchResult(self.res.bestmove, self.res.ponder, score, mate, depth, pv,
+                                                       complete))
+
+    def deadline(self, grace=SEARCH_GRACE):
+        """Latest time the running search should be over - None if it has no time limit."""
+        if not self.is_thinking() or not self.time_dict:
+            return None
+        if 'movetime' in self.time_dict:
+            budget = int(self.time_dict['movetime'])
+        else:
+            board = self.mirror.board
+            key = 'wtime' if board is None or board.turn == chess.WHITE else 'btime'
+            if key not in self.time_dict:
+                return None
+            remaining = int(self.time_dict[key])
+            increment = int(self.time_dict.get('winc' if key == 'wtime' else 'binc', 0))
+            share = remaining / int(self.time_dict.get('movestogo', MOVES_TO_GO)) + increment
+            budget = min(remaining, MOVE_BUDGET_FACTOR * share)
+        return self.search_start + budget / 1000 + grace
+
+    def hang_reason(self, grace=SEARCH_GRACE):
+        """Why the engine is considered hanging - None if its fine."""
+        if not self.engine or self.suspended or self.restarting:
+            return None
+        if not self.engine.is_alive():
+            return 'process died'
+        now = time.monotonic()
+        if self.is_stopping() and now - self.stop_start > STOP_TIMEOUT:
+            return 'no bestmove {} secs after stop'.format(STOP_TIMEOUT)
+        deadline = self.deadline(grace)
+        if deadline and now > deadline:
+            return 'no bestmove in time'
+        if deadline and now - max(self.search_start, self.handler.last_output) > INFO_SILENCE:
+            return 'no info output for {} secs'.format(INFO_SILENCE)
+        return None
+
+    def abandon(self):
+        """Give up the running search without waiting for it - its result (if it ever comes) is ignored."""
+        with self.lock:
+            self.search_id += 1
+            self.pending = []
+            self.mirror.reset()  # nobody knows what the engine got
+            self.set_status(EngineStatus.WAIT)
+            engine = self.engine
+        try:
+            engine.stop(async_callback=True)  # a failed engine may never answer
+        except (OSError, EOFError, AttributeError, chess.uci.EngineTerminatedException):
+            pass
+
+    def check(self):
+        """Restart the engine if it hangs. Called by the watchdog."""
+        with self.lock:
+            reason = self.hang_reason()
+        if reason:
+            logging.error('engine [%s] hangs (%s) - restarting it', self.file, reason)
+            self.restart()
+
+    def restart(self, resume=True):
+        """
+        Replace the engine process by a fresh one with the same options and position, then resume the search.
+        The new process is spawned outside the lock - actions meanwhile are deferred till it is in.
+        """
+        with self.lock:
+            if self.restarting:
+                return True
+            start = time.monotonic()
+            status, time_dict, search_key, show_best = self.status, self.time_dict, self.search_key, self.show_best
+            self.search_id += 1
+            search_id = self.search_id
+            self.restarting = True
+            self.set_status(EngineStatus.WAIT)
+            old_engine = self.engine
+        try:
+            old_engine.kill()
+        except (OSError, AttributeError, chess.uci.EngineTerminatedException):
+            logging.debug('engine [%s] was already gone', self.file)
+        try:
+            engine = self.new_process(PROBE_TIMEOUT)
+        except OSError:
+            engine = None
+        with self.lock:
+            self.engine = engine
+            self.restarting = False
+            self.suspended = None  # a fresh process
+            if not engine:
+                logging.error('engine [%s] could not be restarted', self.file)
+                self.pending = []
+                return False
+            if self.options:
+                self.send()
+            if self.multipv_lines > 1:
+                self.engine.setoption({'MultiPV': self.multipv_lines})
+            if self.mirror.board:
+                self.engine.position(self.mirror.board)
+            # anything asked for meanwhile (a new position, search, level...) beats the old search
+            resume = resume and self.search_id == search_id and not self.pending
+            if resume and status == EngineStatus.THINK:
+                time_dict = dict(time_dict)
+                self.reduce_time(time_dict, start - self.search_start)
+                self.go(time_dict, search_key)
+                self.show_best = show_best
+            elif resume and status == EngineStatus.PONDER and time_dict is None:
+                self.ponder(search_key)
+            else:
+                self.run_pending()  # e.g. the search started after a stop which never came back
+            self.restarts += 1
+            self.downtime += time.monotonic() - start
+            logging.info('engine [%s] restarted - %s', self.file, self.get_metrics())
+            return True
+
+    def throttle(self, threads=1):
+        """
+        Run with less threads (and no pondering, see is_throttled) while the system is too hot or busy.
+        The throttle is part of the options, so restart() keeps it.
+        """
+        if not self.is_local():  # a remote engine doesnt heat up this system
+            return
+        self.throttled = threads
+        if 'Threads' in self.engine.options:
+            self.options = dict(self.options, Threads=str(threads))
+            self.setoption({'Threads': threads})
+
+    def unthrottle(self):
+        if not self.throttled:
+            return
+        self.throttled = 0
+        if 'Threads' in self.engine.options:
+            options = dict(self.options)
+            options.pop('Threads', None)
+            if self.full_threads:
+                options['Threads'] = self.full_threads
+            self.options = options
+            self.setoption({'Threads': self.full_threads or self.engine.options['Threads'][2]})  # back to the default
+
+    def is_throttled(self):
+        return bool(self.throttled)
+
+    def suspend(self):
+        """
+        Freeze the engine while nobody uses picochess. A local process gets SIGSTOP (even while pondering),
+        others quit if they wait - wake() restarts them with the same options and position.
+        """
+        with self.lock:
+            if self.suspended or self.restarting or not self.engine or self.is_thinking() or self.is_stopping():
+                return False
+            pid = self.get_pid() if self.is_local() else None
+            if pid:
+                try:
+                    os.kill(pid, signal.SIGSTOP)
+                except OSError:
+                    logging.warning('cant suspend engine [%s]', self.file)
+                    return False
+                self.suspended = 'stop'
+            elif self.is_waiting():
+                EnginePool.shutdown(self)  # the python-chess engine stays, its name and options are still asked for
+                self.suspended = 'quit'
+            else:
+                return False
+            logging.info('engine [%s] suspended (%s)', self.file, self.suspended)
+            return True
+
+    def wake(self):
+        """
+        Resume the suspended engine - it blocks till the engine answers, so its for the IdleManager thread.
+        Actions meanwhile are deferred and run once its up. Returns the secs till then (None if it wasnt suspended).
+        """
+        with self.lock:
+            suspended = self.suspended
+            if not suspended:
+                return None
+            start = time.monotonic()
+        if suspended == 'stop':
+            try:
+                os.kill(self.get_pid(), signal.SIGCONT)
+                self.engine.isready(async_callback=True).result(PROBE_TIMEOUT)
+                with self.lock:
+                    self.suspended = None
+                    self.run_pending()
+            except (OSError, FutureTimeout, TypeError, chess.uci.EngineTerminatedException):
+                logging.error('engine [%s] didnt wake up - restarting it', self.file)
+                self.restart()
         else:
-            logging.debug('event best_move not fired')
-        self.status = EngineStatus.WAIT
+            self.restart(resume=False)
+        return time.monotonic() - start
+
+    def get_metrics(self):
+        def average(latencies):
+            return round(sum(latencies) / len(latencies), 4) if latencies else None
+        return {'restarts': self.restarts, 'downtime': round(self.downtime, 3), 'throttled': self.throttled,
+                'start_latency': average(self.start_latencies), 'stop_latency': average(self.stop_latencies)}
 
     def is_thinking(self):
         return self.status == EngineStatus.THINK
@@ -320,20 +1520,303 @@ class UciEngine(object):
     def is_waiting(self):
         return self.status == EngineStatus.WAIT
 
-    def startup(self, options, show=True):
+    def is_stopping(self):
+        return self.status == EngineStatus.STOP
+
+    def startup(self, options, show=True, threads=0, engines=0, level_name=''):
         parser = configparser.ConfigParser()
         parser.optionxform = str
         if not options and parser.read(self.get_file() + '.uci'):
-            options = dict(parser[parser.sections().pop()])
+            level_name = parser.sections().pop()
+            options = dict(parser[level_name])
         self.level_support = bool(options)
         if parser.read(os.path.dirname(self.get_file()) + os.sep + 'engines.uci'):
             pc_opts = dict(parser[parser.sections().pop()])
             pc_opts.update(options)
             options = pc_opts
+        if self.is_local():  # the ini files have the last word, the host profile only fills the gaps
+            host_opts = host_profile.options(self.get().options, threads, engines)
+            host_opts.update(options)
+            options = host_opts
 
         logging.debug("setting engine with options {}".format(options))
-        self.level(options)
+        self.level(options, level_name)
         self.send()
         if show:
             logging.debug('Loaded engine [%s]', self.get().name)
-            logging.debug('Supported options [%s]', self.get().options)
\ No newline at end of file
+            logging.debug('Supported options [%s]', self.get().options)
+
+
+class EngineWatchdog(Thread):
+    """Watches the current engine and restarts it if its process died or a search doesnt come back in time."""
+
+    def __init__(self, get_engine, interval=WATCHDOG_INTERVAL):
+        super(EngineWatchdog, self).__init__()
+        self.daemon = True
+        self.get_engine = get_engine
+        self.interval = interval
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            engine = self.get_engine()
+            if engine:
+                engine.check()
+
+
+class IdleManager(Thread):
+    """
+    Suspends the current engine if nobody used the board, clock or web server (no events in evt_queue besides
+    the ones of the engine itself) for idle_time secs. The next event wakes it up - in this thread, the event
+    loop goes on meanwhile and the engine defers what it gets till its up. The wake latencies tell if the idle
+    time is worth it.
+    """
+
+    def __init__(self, get_engine, idle_time, interval=WATCHDOG_INTERVAL):
+        super(IdleManager, self).__init__()
+        self.daemon = True
+        self.get_engine = get_engine
+        self.idle_time = idle_time
+        self.interval = interval
+        self.last_activity = time.monotonic()
+        self.suspended = None  # the engine this one suspended
+        self.lock = Lock()
+        self.wake_latencies = deque(maxlen=20)
+        self.woken = threading.Event()  # set by activity(), the engine is woken in run()
+
+    def activity(self, event):
+        """Called for each event of the main loop - only notes it, run() wakes a suspended engine."""
+        if event._type not in IDLE_IGNORED_EVENTS:
+            self.last_activity = time.monotonic()
+        self.woken.set()  # any event - it could have come while the engine was being suspended
+
+    def wake(self):
+        with self.lock:
+            engine, self.suspended = self.suspended, None
+        if engine:
+            latency = engine.wake()
+            if latency is not None:
+                self.wake_latencies.append(latency)
+                logging.info('engine woke up after %.1fms', latency * 1000)
+
+    def is_idle(self):
+        return time.monotonic() - self.last_activity > self.idle_time
+
+    def get_metrics(self):
+        latencies = self.wake_latencies
+        return {'suspended': self.suspended is not None,
+                'wake_latency': round(sum(latencies) / len(latencies), 4) if latencies else None}
+
+    def run(self):
+        while True:
+            if self.woken.wait(self.interval):
+                self.woken.clear()
+                self.wake()
+            engine = self.get_engine()
+            if engine and self.suspended is None and self.is_idle():
+                with self.lock:  # check again - an event could have come meanwhile
+                    if self.suspended is None and self.is_idle() and engine is self.get_engine() and engine.suspend():
+                        self.suspended = engine
+
+
+class RemoteFailover(Thread):
+    """
+    Keeps a local engine ready for a remote one. If the remote engine misses its search deadline or its
+    connection drops, a FAILOVER event lets the main loop continue the search locally. The remote engine is
+    restarted in the background and reported healthy after some good checks in a row, so the main loop can switch back.
+    """
+
+    def __init__(self, remote, local, get_engine, grace=FAILOVER_GRACE, interval=FAILOVER_INTERVAL):
+        super(RemoteFailover, self).__init__()
+        self.daemon = True
+        self.remote = remote
+        self.local = local
+        self.get_engine = get_engine
+        self.grace = grace
+        self.interval = interval
+        self.failed = False
+        self.good_checks = 0
+        self.served = {'remote': 0, 'local': 0}
+        self.failovers = 0
+        self.ready_future = None  # the isready of recover() the remote engine didnt answer yet
+        self.ready_sent = None
+        self.closed = threading.Event()
+
+    def is_healthy(self):
+        return not self.failed and self.good_checks >= FAILBACK_CHECKS
+
+    def record(self, engine):
+        """Count which path served a move."""
+        self.served['remote' if engine is self.remote else 'local'] += 1
+        logging.debug('moves served %s after %i failovers', self.served, self.failovers)
+
+    def get_metrics(self):
+        return {'served': dict(self.served), 'failovers': self.failovers, 'remote_healthy': self.is_healthy()}
+
+    def failover_reason(self):
+        try:
+            return self.remote.hang_reason(self.grace)
+        except (OSError, EOFError, spur.ssh.ConnectionError) as e:
+            return 'connection lost ({})'.format(e)
+
+    def level(self, options, level_name=''):
+        """Both engines get the new level - the one in use and the one waiting for its turn."""
+        self.local.startup(options, False, level_name=level_name)
+        try:
+            self.remote.startup(options, False, level_name=level_name)
+        except (OSError, EOFError, AttributeError, spur.ssh.ConnectionError):
+            self.remote.level(options, level_name)  # its down - restart() sends them
+
+    def recover(self):
+        """
+        Bring the (idle) remote engine back. Returns True if it answers again.
+        A dead remote engine is restarted, so is one which doesnt answer its isready within PROBE_TIMEOUT secs.
+        """
+        try:
+            if self.ready_future is None:
+                if not self.remote.get() or not self.remote.get().is_alive():
+                    if not self.remote.restart(resume=False):
+                        return False
+                self.ready_future = self.remote.get().isready(async_callback=True)
+                self.ready_sent = time.monotonic()
+            self.ready_future.result(self.interval)
+            self.ready_future = None
+            return True
+        except FutureTimeout:
+            if time.monotonic() - self.ready_sent > PROBE_TIMEOUT:
+                logging.warning('remote engine stalled - restarting it')
+                self.ready_future = None
+                self.remote.restart(resume=False)
+            return False
+        except (OSError, EOFError, spur.ssh.ConnectionError, chess.uci.EngineTerminatedException):
+            self.ready_future = None
+            return False
+
+    def close(self):
+        """The user switched to another engine - stop watching (and recovering) these two."""
+        self.closed.set()
+
+    def run(self):
+        while not self.closed.wait(self.interval):
+            if self.get_engine() is self.remote:
+                if not self.failed:
+                    reason = self.failover_reason()
+                    if reason:
+                        logging.error('remote engine failed (%s) - switching to the local engine', reason)
+                        self.failed = True
+                        self.good_checks = 0
+                        self.failovers += 1
+                        Observable.fire(Event.FAILOVER(reason=reason))
+            elif self.recover():
+                self.failed = False
+                self.good_checks += 1
+            else:
+                self.good_checks = 0
+
+
+class EnginePool(object):
+    """Keeps the recently used (local) engines spawned and ready, so an engine switch is just a handover."""
+
+    def __init__(self, size=1):
+        super(EnginePool, self).__init__()
+        self.size = size
+        self.idle = OrderedDict()  # file => UciEngine, least recently used first
+        self.lock = Lock()
+        self.switch_times = deque(maxlen=20)
+        self.spawn_times = deque(maxlen=20)
+        self.warm = 0
+        self.cold = 0
+
+    @staticmethod
+    def is_alive(engine):
+        """True if the engine process still runs and did its handshake."""
+        try:
+            return engine.get().is_alive() and bool(engine.get().name)
+        except AttributeError:
+            return False
+
+    @staticmethod
+    def shutdown(engine):
+        """Closeout the engine process and threads. They all return non-zero error codes, 0=success."""
+        try:
+            if engine.quit():  # Ask nicely
+                if engine.terminate():  # If you won't go nicely....
+                    if engine.kill():  # Right that does it!
+                        logging.error('engine shutdown failure [%s]', engine.get_file())
+        except AttributeError:
+            logging.warning('engine [%s] already gone', engine.get_file())
+
+    def teardown(self, engine):
+        """Shutdown the engine in the background - dont let the caller wait for it."""
+        Thread(target=self.shutdown, args=(engine,), daemon=True).start()
+
+    def acquire(self, event):
+        """
+        Get an engine for the NEW_ENGINE event - it comes with an ENGINE_SPAWNED event. A warm one from the pool
+        comes at once, a new one is spawned in the background, so the event loop isnt blocked meanwhile.
+        """
+        start = time.monotonic()
+        file = event.eng['file']
+        with self.lock:
+            engine = self.idle.pop(file, None)
+        if engine is not None and self.is_alive(engine):
+            self.warm += 1
+            Observable.fire(Event.ENGINE_SPAWNED(engine=engine, request=event, start=start))
+            return
+        if engine is not None:
+            self.teardown(engine)
+        Thread(target=self.spawn, args=(event, start), daemon=True).start()
+
+    def spawn(self, event, start):
+        file = event.eng['file']
+        engine = UciEngine(file)
+        if self.is_alive(engine):
+            self.cold += 1
+            self.spawn_times.append(time.monotonic() - start)
+        else:
+            logging.error('engine [%s] failed to start', file)
+            engine = None
+        Observable.fire(Event.ENGINE_SPAWNED(engine=engine, request=event, start=start))
+
+    def switched(self, start):
+        """The new engine is set up - note the time since acquire()."""
+        self.switch_times.append(time.monotonic() - start)
+        logging.info('engine switch took %.3f secs - %s', self.switch_times[-1], self.get_metrics())
+
+    def release(self, engine):
+        """Take back an engine and keep it warm once its stopped. Engines above the pool size are shutdown."""
+        if self.size <= 0 or not self.is_alive(engine):
+            self.teardown(engine)
+        elif engine.is_waiting():
+            self.keep(engine)
+        else:  # still stopping - its bestmove has to come in before somebody else may use it
+            Thread(target=self.keep_when_ready, args=(engine,), daemon=True).start()
+
+    def keep_when_ready(self, engine):
+        if engine.wait_ready(STOP_TIMEOUT):
+            self.keep(engine)
+        else:
+            logging.warning('engine [%s] didnt stop - not kept in the pool', engine.get_file())
+            self.shutdown(engine)
+
+    def keep(self, engine):
+        evicted = []
+        with self.lock:
+            old = self.idle.pop(engine.get_file(), None)
+            if old is not None and old is not engine:
+                evicted.append(old)
+            self.idle[engine.get_file()] = engine
+            while len(self.idle) > self.size:
+                evicted.append(self.idle.popitem(last=False)[1])
+        for old in evicted:
+            logging.debug('engine [%s] dropped from pool', old.get_file())
+            self.teardown(old)
+
+    def get_metrics(self):
+        """Warm and cold switches, the last and average switch and spawn times in secs."""
+        def average(times):
+            return round(sum(times) / len(times), 3) if times else None
+
+        return {'warm': self.warm, 'cold': self.cold,
+                'switch_last': round(self.switch_times[-1], 3) if self.switch_times else None,
+                'switch_avg': average(self.switch_times), 'spawn_avg': average(self.spawn_times)}
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import itertools
+import socketserver
+from engine import *
+
+ENGINE_SERVER_PORT = 9777
+# there is no authentication - only boards on this host may connect, unless --bind says otherwise
+ENGINE_SERVER_HOST = '127.0.0.1'
+# secs an infinite search may run before its engine is handed to a waiting client
+PREEMPT_AFTER = 5
+# secs until the engine time a client used only counts half
+USAGE_HALFLIFE = 60
+GO_INTS = ('wtime', 'btime', 'winc', 'binc', 'movestogo', 'depth', 'nodes', 'mate', 'movetime')
+GO_FLAGS = ('infinite', 'ponder')
+
+
+def parse_position(line, chess960=False):
+    """The board of an uci "position" command."""
+    tokens = line.split()
+    index = 2
+    board = chess.Board(chess960=chess960)
+    if tokens[1] == 'fen':
+        index = tokens.index('moves') if 'moves' in tokens else len(tokens)
+        board = chess.Board(' '.join(tokens[2:index]), chess960=chess960)
+    for move in tokens[index + 1:]:
+        board.push_uci(move)
+    return board
+
+
+def parse_go(line):
+    """The keyword arguments of chess.uci.Engine.go() for an uci "go" command."""
+    limits = {}
+    tokens = line.split()[1:]
+    while tokens:
+        token = tokens.pop(0)
+        if token in GO_INTS and tokens:
+            limits[token] = int(tokens.pop(0))
+        elif token in GO_FLAGS:
+            limits[token] = True
+        elif token == 'searchmoves':
+            moves = []
+            while tokens and tokens[0] not in GO_INTS + GO_FLAGS:
+                moves.append(chess.Move.from_uci(tokens.pop(0)))
+            limits['searchmoves'] = moves
+    return limits
+
+
+def describe(engine):
+    """The answer of the engine to "uci" - rebuilt from what python-chess parsed."""
+    uci = engine.get()
+    lines = ['id name ' + uci.name, 'id author ' + (uci.author or '')]
+    for option in uci.options.values():
+        line = 'option name {} type {}'.format(option.name, option.type)
+        if option.default is not None:
+            default = str(option.default).lower() if isinstance(option.default, bool) else option.default
+            line += ' default {}'.format(default)
+        if option.min is not None:
+            line += ' min {}'.format(option.min)
+        if option.max is not None:
+            line += ' max {}'.format(option.max)
+        for var in option.var or []:
+            line += ' var {}'.format(var)
+        lines.append(line)
+    lines.append('uciok')
+    return lines
+
+
+class Client(object):
+    """A board using the server. Its engine time decays, so the recent past counts most."""
+
+    def __init__(self, client_id, priority=0):
+        super(Client, self).__init__()
+        self.client_id = client_id
+        self.priority = priority
+        self.usage = 0.0
+        self.updated = time.time()
+
+    def get_usage(self):
+        now = time.time()
+        self.usage *= 0.5 ** ((now - self.updated) / USAGE_HALFLIFE)
+        self.updated = now
+        return self.usage
+
+    def charge(self, secs):
+        self.usage = self.get_usage() + secs
+
+
+class Job(object):
+    """A search of a client - waiting in the queue or running on a slot."""
+
+    def __init__(self, session, board, limits, newgame, seq):
+        super(Job, self).__init__()
+        self.session = session
+        self.client = session.client
+        self.file = session.file
+        self.options = dict(session.options)
+        self.board = board
+        self.limits = limits
+        self.newgame = newgame
+        self.seq = seq
+        self.slot = None
+        self.start = None
+        self.preempted = False  # stopped to free the engine, goes back to the queue
+        self.stopped = False  # stopped by the client
+
+    def running_time(self):
+        return time.time() - self.start if self.slot else 0
+
+    def is_preemptible(self):
+        """Only analysis can be interrupted - a game search (or ponder) must deliver its move in time."""
+        infinite = self.limits.get('infinite') and not self.limits.get('ponder')
+        return infinite and not self.stopped and not self.preempted and self.running_time() > PREEMPT_AFTER
+
+
+class Slot(object):
+    """One engine process of the pool together with the job it searches."""
+
+    def __init__(self, engine, scheduler):
+        super(Slot, self).__init__()
+        self.engine = engine
+        self.file = engine.get_file()
+        self.scheduler = scheduler
+        self.base = dict(engine.options)  # what startup() gave the engine
+        self.applied = dict(self.base)
+        self.job = None
+        self.bestmove = None  # the bestmove line of the job, sent once python-chess is idle again
+        uci = engine.get()
+        received = uci.on_line_received
+
+        def on_line_received(line):
+            received(line)
+            self.forward(line)
+        uci.on_line_received = on_line_received
+
+    def forward(self, line):
+        """Pass the info lines to the client of the job, the bestmove is kept for done()."""
+        job = self.job
+        if job is None:
+            return
+        if line.startswith('bestmove'):
+            self.bestmove = line
+        elif line.startswith('info') and not job.preempted:
+            job.session.send(line)
+
+    def done(self, future):
+        """The go command is over (python-chess takes new commands again) - free the slot."""
+        self.scheduler.finished(self, self.bestmove or 'bestmove 0000')
+
+    def start(self, job):
+        uci = self.engine.get()
+        wanted = dict(self.base)
+        wanted.update(job.options)
+        changes = {name: value for name, value in wanted.items() if self.applied.get(name) != value}
+        for name in self.applied:  # options of the last client this one didnt set
+            if name not in wanted and name in uci.options:
+                changes[name] = uci.options[name].default
+        self.applied = wanted
+        self.job = job
+        self.bestmove = None
+        job.slot = self
+        job.start = time.time()
+        if changes:
+            uci.setoption(changes, async_callback=True)
+        if job.newgame:
+            uci.ucinewgame(async_callback=True)
+            job.newgame = False
+        uci.position(job.board, async_callback=True)
+        uci.go(async_callback=self.done, **job.limits)
+
+    def stop(self):
+        self.engine.get().stop(async_callback=True)
+
+
+class Scheduler(Thread):
+    """
+    Hands the searches of all clients to a pool of engine processes.
+    Waiting searches are ordered by client priority and then by recently used engine time. A client over its
+    quota waits behind all others. An analysis running longer than PREEMPT_AFTER is interrupted (and queued again)
+    if a better ranked search waits for an engine.
+    """
+
+    def __init__(self, engine_path, pool_size=2, quota=30):
+        super(Scheduler, self).__init__()
+        self.daemon = True
+        self.engine_path = engine_path
+        self.pool_size = max(1, pool_size)
+        self.quota = quota
+        self.condition = threading.Condition()
+        self.clients = {}
+        self.descriptions = {}
+        self.queue = []
+        self.slots = []
+        self.spawning = 0
+        self.seq = itertools.count()
+
+    def client(self, client_id, priority):
+        with self.condition:
+            client = self.clients.setdefault(client_id, Client(client_id))
+            client.priority = priority
+            return client
+
+    def spawn(self, file):
+        engine = UciEngine(file, timeout=PROBE_TIMEOUT, handler=silent_informer())
+        if not EnginePool.is_alive(engine):
+            logging.error('engine [%s] failed to start', file)
+            return None
+        engine.startup({}, False)
+        return Slot(engine, self)
+
+    def describe(self, file):
+        """The uci answer of the engine - starts it once, the process is kept as a slot if theres room."""
+        with self.condition:
+            if file in self.descriptions:
+                return self.descriptions[file]
+        slot = self.spawn(file)
+        if slot is None:
+            return None
+        with self.condition:
+            self.descriptions[file] = describe(slot.engine)
+            if len(self.slots) + self.spawning < self.pool_size:
+                self.slots.append(slot)
+                self.condition.notify()
+            else:
+                Thread(target=EnginePool.shutdown, args=(slot.engine,), daemon=True).start()
+            return self.descriptions[file]
+
+    def rank(self, job):
+        usage = job.client.get_usage() + job.running_time()
+        return usage > self.quota, -job.client.priority, usage, job.seq
+
+    def submit(self, session, board, limits, newgame):
+        with self.condition:
+            session.job = Job(session, board, limits, newgame, next(self.seq))
+            self.queue.append(session.job)
+            self.condition.notify()
+
+    def stop(self, session):
+        reply = False
+        with self.condition:
+            job = session.job
+            if job is None:
+                return
+            job.stopped = True
+            if job in self.queue:
+                self.queue.remove(job)
+                session.job = None
+                reply = True
+            elif job.slot:
+                job.slot.stop()
+            # else its engine is just spawned - run() answers
+        if reply:
+            session.send('bestmove 0000')
+
+    def ponderhit(self, session):
+        with self.condition:
+            job = session.job
+            if job is None:
+                return
+            job.limits.pop('ponder', None)  # a waiting job starts as a normal search
+            if job.slot:
+                job.slot.engine.get().ponderhit(async_callback=True)
+
+    def finished(self, slot, line):
+        with self.condition:
+            job = slot.job
+            if job is None:
+                return
+            slot.job = None
+            job.slot = None
+            job.client.charge(time.time() - job.start)
+            requeue = job.preempted and not job.stopped
+            if requeue:
+                job.preempted = False
+                self.queue.append(job)  # keeps its seq - and its usage moves it back
+            elif job.session.job is job:
+                job.session.job = None
+            self.condition.notify()
+        if not requeue:
+            job.session.send(line)
+
+    def preempt(self, waiting):
+        rank = self.rank(waiting)
+        for slot in self.slots:
+            job = slot.job
+            if job and job.is_preemptible() and self.rank(job) > rank:
+                logging.info('preempting the analysis of [%s] for [%s]', job.client.client_id,
+                             waiting.client.client_id)
+                job.preempted = True
+                slot.stop()
+                return
+
+    def dispatch(self):
+        """Give the best ranked waiting jobs an engine. Returns a job needing a new process (and one to retire)."""
+        self.queue.sort(key=self.rank)
+        for job in list(self.queue):
+            idle = [slot for slot in self.slots if slot.job is None]
+            same = [slot for slot in idle if slot.file == job.file]
+            if same:
+                self.queue.remove(job)
+                same[0].start(job)
+            elif len(self.slots) + self.spawning < self.pool_size:
+                self.queue.remove(job)
+                return job, None
+            elif idle:  # replace an idle engine of another kind
+                self.queue.remove(job)
+                self.slots.remove(idle[0])
+                return job, idle[0]
+            else:
+                self.preempt(job)
+                break
+        return None, None
+
+    def run(self):
+        while True:
+            try:
+                self.schedule()
+            except Exception:  # a failing engine mustnt stop the server
+                logging.exception('scheduler error')
+
+    def schedule(self):
+        with self.condition:
+            job, retired = self.dispatch()
+            if job is None:
+                self.condition.wait(1)  # wake up now and then to check for searches to preempt
+                return
+            self.spawning += 1
+        try:
+            if retired:
+                EnginePool.shutdown(retired.engine)
+            slot = self.spawn(job.file)
+        except Exception:  # the job gets its bestmove 0000 below
+            logging.exception('engine [%s] failed to start', job.file)
+            slot = None
+        with self.condition:
+            self.spawning -= 1
+            if slot:
+                self.slots.append(slot)
+            failed = slot is None or job.stopped
+            if failed:
+                if job.session.job is job:
+                    job.session.job = None
+            else:
+                slot.start(job)
+        if failed:
+            job.session.send('bestmove 0000')
+
+
+class Session(socketserver.StreamRequestHandler):
+    """A client connection. Keeps the options and position of the client and hands its searches to the scheduler."""
+
+    def setup(self):
+        super(Session, self).setup()
+        self.lock = Lock()
+        self.client = None
+        self.file = None
+        self.options = {}
+        self.board = chess.Board()
+        self.newgame = False
+        self.job = None
+
+    def send(self, line):
+        with self.lock:
+            try:
+                self.wfile.write((line + '\n').encode('utf-8'))
+            except OSError:
+                pass  # client gone, handle() cleans up
+
+    def command(self, scheduler, line):
+        if line == 'uci':
+            description = scheduler.describe(self.file)
+            if description is None:
+                return False
+            for answer in description:
+                self.send(answer)
+        elif line == 'isready':
+            self.send('readyok')
+        elif line.startswith('setoption name '):
+            name, _, value = line[len('setoption name '):].partition(' value ')
+            if value:  # buttons arent kept
+                self.options[name] = value
+        elif line == 'ucinewgame':
+            self.newgame = True
+        elif line.startswith('position '):
+            chess960 = self.options.get('UCI_Chess960', 'false') == 'true'
+            self.board = parse_position(line, chess960)
+        elif line.startswith('go'):
+            scheduler.submit(self, self.board.copy(), parse_go(line), self.newgame)
+            self.newgame = False
+        elif line == 'stop':
+            scheduler.stop(self)
+        elif line == 'ponderhit':
+            scheduler.ponderhit(self)
+        elif line == 'quit':
+            return False
+        return True
+
+    def handle(self):
+        scheduler = self.server.scheduler
+        hello = self.rfile.readline().decode('utf-8').split()
+        if len(hello) != 4 or hello[0] != 'picochess':
+            logging.warning('unknown client %s: %s', self.client_address, hello)
+            self.send('error expected: picochess <engine> <client id> <priority>')
+            return
+        _, name, client_id, priority = hello
+        try:
+            priority = int(priority)
+        except ValueError:
+            logging.warning('client [%s] sent an invalid priority: %s', client_id, priority)
+            self.send('error invalid priority: {}'.format(priority))
+            return
+        self.file = scheduler.engine_path + os.sep + os.path.basename(name)
+        self.client = scheduler.client(client_id, priority)
+        logging.info('client [%s] connected for engine [%s]', client_id, name)
+        try:
+            for raw in self.rfile:
+                line = raw.decode('utf-8').strip()
+                try:
+                    if not self.command(scheduler, line):
+                        break
+                except ValueError:
+                    logging.warning('client [%s] sent an invalid command: %s', client_id, line)
+        except OSError:
+            pass
+        scheduler.stop(self)
+        logging.info('client [%s] disconnected', client_id)
+
+
+class EngineServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, scheduler):
+        super(EngineServer, self).__init__(address, Session)
+        self.scheduler = scheduler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the engines of a folder to several picochess boards')
+    parser.add_argument('-p', '--port', type=int, default=ENGINE_SERVER_PORT, help='tcp port to listen on')
+    parser.add_argument('-b', '--bind', type=str, default=ENGINE_SERVER_HOST,
+                        help='address to listen on - the server has no authentication, so only bind to a trusted '
+                             'network (0.0.0.0 for all)')
+    parser.add_argument('-e', '--path', type=str, default=None,
+                        help='engine folder (default: engines/<your platform>)')
+    parser.add_argument('-n', '--pool', type=int, default=2, help='how many engine processes run at most')
+    parser.add_argument('-q', '--quota', type=float, default=30,
+                        help='secs of recent engine time after which a client waits behind the others')
+    parser.add_argument('-l', '--log-level', choices=['debug', 'info', 'warning', 'error'], default='info',
+                        help='logging level')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper()),
+                        format='%(asctime)s.%(msecs)03d %(levelname)5s %(module)10s - %(funcName)s: %(message)s',
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    logging.getLogger('chess.uci').setLevel(logging.INFO)
+    host_profile.configure(threads=max(1, host_profile.cores // args.pool), reserved_cores=0, engines=args.pool)
+    engine_scheduler = Scheduler(args.path or default_engine_path(), args.pool, args.quota)
+    engine_scheduler.start()
+    EngineServer((args.bind, args.port), engine_scheduler).serve_forever()
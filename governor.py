@@ -0,0 +1,112 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import glob
+import logging
+import os
+import time
+from collections import deque
+from threading import Thread
+from utilities import *
+
+# secs between two samples
+GOVERNOR_INTERVAL = 5
+# how many of the latest samples get_metrics() shows
+GOVERNOR_SAMPLES = 12
+# degrees below the limit the system must cool down before the engine gets its full power back
+HYSTERESIS = 5
+
+
+def read_temperature(thermal_path):
+    """Highest temperature of all thermal zones in degree celsius (None if there are none)."""
+    temps = []
+    for file_name in glob.glob(os.path.join(thermal_path, 'thermal_zone*', 'temp')):
+        try:
+            with open(file_name) as file:
+                temps.append(int(file.read().strip()) / 1000)
+        except (OSError, ValueError):
+            pass
+    return max(temps) if temps else None
+
+
+class ThermalGovernor(Thread):
+    """
+    Samples the SoC temperature and the system load. If one is over its limit, a THROTTLE event
+    lets the main loop slow down the engine, until both are fine again.
+    """
+
+    def __init__(self, thermal_path='/sys/class/thermal', temp_limit=75, load_limit=1.5, interval=GOVERNOR_INTERVAL):
+        super(ThermalGovernor, self).__init__()
+        self.daemon = True
+        self.thermal_path = thermal_path
+        self.temp_limit = temp_limit
+        self.load_limit = load_limit * (os.cpu_count() or 1)  # limit is per core
+        self.interval = interval
+        self.throttled = False
+        self.throttled_since = None
+        self.throttle_count = 0
+        self.throttled_secs = 0.0
+        self.temperature = None
+        self.load = None
+        self.samples = deque(maxlen=GOVERNOR_SAMPLES)  # (time, temperature, load)
+
+    def sample(self):
+        self.temperature = read_temperature(self.thermal_path)
+        try:
+            self.load = os.getloadavg()[0]
+        except OSError:
+            self.load = None
+        self.samples.append((round(time.time(), 1), self.temperature, self.load))
+
+    def decide(self):
+        """Return (throttle, reason) - with a hysteresis, so the engine doesnt toggle on every sample."""
+        hot = self.temperature is not None and self.temperature >= self.temp_limit
+        busy = self.load is not None and self.load >= self.load_limit
+        if not self.throttled:
+            if hot or busy:
+                return True, 'temperature {}C'.format(self.temperature) if hot else 'load {:.2f}'.format(self.load)
+            return False, None
+        cool = self.temperature is None or self.temperature < self.temp_limit - HYSTERESIS
+        idle = self.load is None or self.load < self.load_limit * 0.8
+        if cool and idle:
+            return False, 'temperature {}C load {:.2f}'.format(self.temperature, self.load or 0)
+        return True, None
+
+    def get_metrics(self):
+        throttled_secs = self.throttled_secs
+        if self.throttled:
+            throttled_secs += time.monotonic() - self.throttled_since
+        return {'throttled': self.throttled, 'throttle_count': self.throttle_count,
+                'throttled_secs': round(throttled_secs, 1), 'temperature': self.temperature, 'load': self.load,
+                'samples': list(self.samples)}
+
+    def run(self):
+        while True:
+            self.sample()
+            throttle, reason = self.decide()
+            if throttle != self.throttled:
+                self.throttled = throttle
+                if throttle:
+                    self.throttle_count += 1
+                    self.throttled_since = time.monotonic()
+                    logging.warning('throttling engine: %s', reason)
+                else:
+                    self.throttled_secs += time.monotonic() - self.throttled_since
+                    logging.info('engine back to full power: %s', reason)
+                logging.debug('governor metrics %s', self.get_metrics())
+                Observable.fire(Event.THROTTLE(active=throttle, reason=reason))
+            time.sleep(self.interval)
@@ -0,0 +1,128 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import platform
+
+# part of the available memory all engine hash tables may use together
+HASH_SHARE = 0.25
+# most MB an engine gets for its hash by default - small boards run the web server and the speech too
+HASH_MAX_MB = 64
+
+
+def available_memory(meminfo='/proc/meminfo'):
+    """Available memory in MB (0 if unknown)."""
+    try:
+        with open(meminfo) as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+class HostProfile(object):
+    """
+    What the hardware allows the engines: Threads and Hash values and the cores they run on.
+    Picochess keeps the first reserved cores for its own threads (board, clock, web). Each value can be fixed
+    by configure() (picochess.ini) - and the engines.uci/level files still override the engine options.
+    """
+
+    def __init__(self):
+        super(HostProfile, self).__init__()
+        self.machine = platform.machine()
+        self.cores = os.cpu_count() or 1
+        self.memory = available_memory()
+        self.threads = 0  # 0 = automatic
+        self.hash_mb = 0
+        self.reserved_cores = 1
+        self.engines = 1  # how many engines share the memory
+
+    def configure(self, threads=0, hash_mb=0, reserved_cores=1, engines=1):
+        self.threads = threads
+        self.hash_mb = hash_mb
+        self.reserved_cores = reserved_cores
+        self.engines = max(1, engines)
+        logging.debug('host profile: %s, %i cores, %i MB available - %s', self.machine, self.cores, self.memory,
+                      self.engine_cores())
+
+    def picochess_cores(self):
+        """The cores kept for picochess itself - all, if there arent enough to keep some."""
+        if self.cores <= self.reserved_cores:
+            return set(range(self.cores))
+        return set(range(self.reserved_cores))
+
+    def engine_cores(self):
+        """The cores for the engines - all, if there arent enough to keep some for picochess."""
+        if self.cores <= self.reserved_cores:
+            return set(range(self.cores))
+        return set(range(self.reserved_cores, self.cores))
+
+    @staticmethod
+    def _clamp(option, value):
+        try:
+            low, high = int(option[3]), int(option[4])
+        except (TypeError, ValueError, IndexError):
+            return value
+        return max(low, min(value, high))
+
+    def options(self, engine_options, threads=0, engines=0):
+        """
+        Threads and Hash for an engine with these (uci) options - only the ones it supports.
+        threads and engines (sharing the memory) override the profile for engines beside the usual ones (kibitz).
+        """
+        result = {}
+        if 'Threads' in engine_options:
+            threads = threads or self.threads or len(self.engine_cores())
+            result['Threads'] = str(self._clamp(engine_options['Threads'], threads))
+        if 'Hash' in engine_options:
+            hash_mb = self.hash_mb
+            if not hash_mb and self.memory:
+                share = min(HASH_MAX_MB, int(self.memory * HASH_SHARE / (engines or self.engines)))
+                hash_mb = 1 << max(0, share.bit_length() - 1)  # engines like powers of two
+            if hash_mb:  # within the min/max of the engine
+                result['Hash'] = str(self._clamp(engine_options['Hash'], hash_mb))
+        return result
+
+    def pin(self, pid):
+        """Keep the engine process away from the picochess cores."""
+        if pid is None:
+            return
+        try:
+            os.sched_setaffinity(pid, self.engine_cores())
+        except (AttributeError, OSError) as e:
+            logging.debug('cant set the cpu affinity of engine pid %s: %s', pid, e)
+
+    def pin_picochess(self):
+        """
+        Keep picochess (all its threads so far, the ones started later inherit it) on its own cores.
+        Engines spawned afterwards are moved to the engine cores by pin().
+        """
+        try:
+            tasks = [int(task) for task in os.listdir('/proc/self/task')]
+        except (OSError, ValueError):
+            tasks = [0]
+        for task in tasks:
+            try:
+                os.sched_setaffinity(task, self.picochess_cores())
+            except (AttributeError, OSError) as e:
+                logging.debug('cant set the cpu affinity of picochess thread %s: %s', task, e)
+
+
+host_profile = HostProfile()
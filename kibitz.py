@@ -0,0 +1,223 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import functools
+from collections import Counter
+from threading import Thread, Lock
+from engine import *
+
+# secs between two consensus score/pv events
+CONSENSUS_INTERVAL = 0.5
+
+
+def when_done(futures, action):
+    """Run the action once all futures are done - at once if they are, else in the thread finishing the last."""
+    pending = [future for future in futures if not future.done()]
+    if pending:
+        pending[0].add_done_callback(lambda future: when_done(pending[1:], action))
+    else:
+        action()
+
+
+class Consensus(object):
+    """Merges the best lines of several engines: the move most (deep) engines vote for, the median score."""
+
+    def __init__(self, interval=CONSENSUS_INTERVAL):
+        super(Consensus, self).__init__()
+        self.lock = Lock()
+        self.results = {}  # engine name => (depth, cp, mate, pv)
+        self.limiter = RateLimiter(interval)
+        self.lines_limiter = RateLimiter(interval)
+
+    def clear(self):
+        with self.lock:
+            self.results = {}
+            self.limiter.reset()
+            self.lines_limiter.reset()
+
+    def update(self, name, depth, score, pv):
+        cp, mate = score if score else (None, None)
+        with self.lock:
+            self.results[name] = (depth, cp, mate, pv)
+            merged = self.limiter.offer(self.merge())
+            lines = self.lines_limiter.offer(self.lines())
+        self._fire(merged)
+        self._fire_lines(lines)
+
+    def flush(self):
+        """The search is over, so dont hold back the latest values any longer."""
+        with self.lock:
+            merged = self.limiter.flush()
+            lines = self.lines_limiter.flush()
+        self._fire(merged)
+        self._fire_lines(lines)
+
+    def get_results(self):
+        """The latest line of each engine."""
+        with self.lock:
+            return dict(self.results)
+
+    def lines(self):
+        """The line of each engine (in the order of their names) - shown like the multipv lines of one engine."""
+        return [self.results[name] for name in sorted(self.results)]
+
+    def merge(self):
+        votes = Counter()
+        for depth, cp, mate, pv in self.results.values():
+            votes[pv[0]] += depth or 1  # a deeper search has more to say
+        best_move = votes.most_common(1)[0][0]
+        depth, _, _, pv = max((r for r in self.results.values() if r[3][0] == best_move), key=lambda r: r[0] or 0)
+
+        mates = [r[2] for r in self.results.values() if r[2]]
+        if len(mates) * 2 > len(self.results):
+            return None, min(mates, key=abs), pv
+        cps = sorted(r[1] for r in self.results.values() if r[1] is not None)
+        return (cps[len(cps) // 2] if cps else None), None, pv
+
+    @staticmethod
+    def _fire(merged):
+        if merged is not None:
+            cp, mate, pv = merged
+            if cp is not None or mate is not None:
+                Observable.fire(Event.NEW_SCORE(score=cp, mate=mate))
+            Observable.fire(Event.NEW_PV(pv=pv))
+
+    @staticmethod
+    def _fire_lines(lines):
+        if lines is not None:
+            Observable.fire(Event.NEW_MULTIPV(lines=lines))
+
+
+class ConsensusKibitz(object):
+    """
+    Several engines of the catalog analyse the same position, each single threaded on its own engine core.
+    Their best lines are merged by Consensus into one score and pv - rate limited, so the event queue isnt flooded.
+    The line of each engine goes to the displays as multipv lines.
+    """
+
+    def __init__(self, engine_files, interval=CONSENSUS_INTERVAL):
+        super(ConsensusKibitz, self).__init__()
+        self.engine_files = engine_files
+        self.consensus = Consensus(interval)
+        self.engines = []
+        self.lock = Lock()
+        self.searches = {}  # engine => futures of its last search (go and maybe stop)
+        self.generation = 0  # position counter - lines and starts of an older one are dropped
+        self.running = {}  # engine name => generation its search belongs to
+        self.board = None  # position of the last analyse() - an engine coming up later starts on it
+        self.opener = None
+        self.closed = False
+
+    def open(self):
+        """Spawn the engines in the background - each joins the analysis as soon as its ready."""
+        if self.opener is None:
+            self.opener = Thread(target=self.spawn, daemon=True)
+            self.opener.start()
+
+    def spawn(self):
+        cores = sorted(host_profile.engine_cores())  # one each, the cores kept for picochess stay free
+        files = self.engine_files[:len(cores)]
+        if len(files) < len(self.engine_files):
+            logging.warning('only %i engine cores - kibitz with %i of %i engines', len(cores), len(files),
+                            len(self.engine_files))
+        for core, engine_file in zip(cores, files):
+            if self.closed:
+                return
+            name = engine_file.rsplit(os.sep, 1)[-1]
+            handler = Informer(sink=lambda depth, score, pv, name=name: self.update(name, depth, score, pv))
+            engine = UciEngine(engine_file, timeout=PROBE_TIMEOUT, handler=handler)
+            if not EnginePool.is_alive(engine):
+                logging.warning('kibitz engine [%s] didnt start', engine_file)
+                continue
+            # the hash tables share the memory with the game engine
+            engine.startup({}, False, threads=1, engines=host_profile.engines + len(files))
+            try:
+                os.sched_setaffinity(engine.get_pid(), {core})
+            except (AttributeError, OSError, TypeError):
+                logging.debug('cant pin kibitz engine [%s] to core %i', engine_file, core)
+            with self.lock:
+                closed = self.closed
+                if not closed:
+                    self.engines.append(engine)
+                    board, generation = self.board, self.generation
+            if closed:
+                EnginePool.shutdown(engine)
+                return
+            if board is not None:
+                self.start(engine, board, generation)
+        logging.debug('consensus kibitz with %i engines', len(self.engines))
+
+    def update(self, name, depth, score, pv):
+        if self.running.get(name) == self.generation:  # not a late line of a stopped search
+            self.consensus.update(name, depth, score, pv)
+
+    def analyse(self, game):
+        """
+        Start (or restart) all engines on the game position. Python-chess takes no new search before the last
+        one is over, so each engine starts once its stopped search returned - the event loop doesnt wait for it.
+        """
+        self.open()
+        self.stop(flush=False)
+        self.consensus.clear()
+        board = game.copy()
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+            self.board = board
+            searches = dict(self.searches)
+            engines = list(self.engines)
+        for engine in engines:
+            when_done(searches.get(engine, []), functools.partial(self.start, engine, board, generation))
+
+    def start(self, engine, game, generation):
+        name = engine.get_file().rsplit(os.sep, 1)[-1]
+        with self.lock:
+            if generation != self.generation:
+                return  # another position (or a stop) came meanwhile
+            self.running[name] = generation  # the lines of its last search are all in
+            try:
+                engine.position(game)
+                self.searches[engine] = [engine.get().go(infinite=True, async_callback=True)]
+            except chess.uci.EngineTerminatedException:
+                logging.warning('kibitz engine [%s] died', engine.get_file())
+
+    def stop(self, flush=True):
+        """Stop the searches without waiting for their bestmoves."""
+        with self.lock:
+            self.generation += 1  # starts still waiting for an engine are off as well
+            for engine, futures in self.searches.items():
+                if len(futures) == 1 and not futures[0].done():
+                    try:
+                        futures.append(engine.get().stop(async_callback=True))
+                    except chess.uci.EngineTerminatedException:
+                        logging.warning('kibitz engine [%s] died', engine.get_file())
+        if flush:
+            self.consensus.flush()
+
+    def get_results(self):
+        return self.consensus.get_results()
+
+    def close(self):
+        self.stop()
+        with self.lock:
+            self.closed = True  # engines still coming up are shutdown by spawn()
+            engines, self.engines = self.engines, []
+            self.searches = {}
+        for engine in engines:
+            Thread(target=EnginePool.shutdown, args=(engine,), daemon=True).start()
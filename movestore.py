@@ -0,0 +1,141 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import chess
+import logging
+import mmap
+import os
+import struct
+import zlib
+from threading import Lock
+
+# file header: magic, version, number of buckets, ways per bucket, generation counter
+HEADER = struct.Struct('<4sIIII')
+MAGIC = b'PMST'
+VERSION = 1
+# record: zobrist, context, bestmove, ponder, score, mate, depth, generation
+RECORD = struct.Struct('<QIHHhbBI')
+WAYS = 4
+NO_SCORE = -32768
+
+
+def encode_move(move):
+    """A move in 16 bits: from, to and promotion piece. 0 is no move (a1a1 is never legal)."""
+    if not move:
+        return 0
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def decode_move(code):
+    if not code:
+        return None
+    return chess.Move(code & 63, code >> 6 & 63, code >> 12 or None)
+
+
+def context_hash(engine_file, option_items, limits):
+    """Everything besides the position that makes two searches comparable, squeezed into 32 bits."""
+    context = repr((os.path.basename(engine_file), option_items, limits))
+    return zlib.crc32(context.encode('utf-8')) & 0xffffffff
+
+
+class MoveStore(object):
+    """
+    Memory mapped, fixed size store of finished searches which survives restarts.
+    The file is a set associative table: each position hash maps to a bucket of WAYS records.
+    A full bucket drops its least recently used record, so the file never grows.
+    """
+
+    def __init__(self, path, size_kb=1024):
+        super(MoveStore, self).__init__()
+        self.path = path
+        self.lock = Lock()
+        self.buckets = max(1, (size_kb * 1024 - HEADER.size) // (RECORD.size * WAYS))
+        self.file = None
+        self.map = None
+        self.generation = 0
+        self.open()
+
+    def open(self):
+        size = HEADER.size + self.buckets * WAYS * RECORD.size
+        try:
+            new = not os.path.exists(self.path) or os.path.getsize(self.path) != size
+            self.file = open(self.path, 'r+b' if not new else 'w+b')
+            if new:
+                self.file.truncate(size)
+            self.map = mmap.mmap(self.file.fileno(), size)
+            magic, version, buckets, ways, self.generation = HEADER.unpack_from(self.map, 0)
+            if new or magic != MAGIC or version != VERSION or buckets != self.buckets or ways != WAYS:
+                logging.debug('creating new move store [%s] with %i buckets', self.path, self.buckets)
+                self.map[:] = bytes(size)
+                self.generation = 0
+                HEADER.pack_into(self.map, 0, MAGIC, VERSION, self.buckets, WAYS, self.generation)
+        except OSError:
+            logging.exception('cant open the move store [%s]', self.path)
+            self.close()
+
+    def close(self):
+        if self.map:
+            HEADER.pack_into(self.map, 0, MAGIC, VERSION, self.buckets, WAYS, self.generation)
+            self.map.flush()
+            self.map.close()
+            self.map = None
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def _offset(self, zobrist):
+        return HEADER.size + (zobrist % self.buckets) * WAYS * RECORD.size
+
+    def get(self, zobrist, context):
+        """Return (bestmove, ponder, score, mate, depth) of the position or None."""
+        if not self.map:
+            return None
+        with self.lock:
+            offset = self._offset(zobrist)
+            for way in range(WAYS):
+                pos = offset + way * RECORD.size
+                key, ctx, bestmove, ponder, score, mate, depth, _ = RECORD.unpack_from(self.map, pos)
+                if key == zobrist and ctx == context and bestmove:
+                    self.generation += 1
+                    HEADER.pack_into(self.map, 0, MAGIC, VERSION, self.buckets, WAYS, self.generation)
+                    struct.pack_into('<I', self.map, pos + RECORD.size - 4, self.generation)
+                    return (decode_move(bestmove), decode_move(ponder), None if score == NO_SCORE else score,
+                            mate or None, depth)
+        return None
+
+    def put(self, zobrist, context, bestmove, ponder, score, mate, depth):
+        if not self.map or not bestmove:
+            return
+        with self.lock:
+            offset = self._offset(zobrist)
+            victim, victim_generation = offset, None
+            for way in range(WAYS):
+                pos = offset + way * RECORD.size
+                key, ctx, _, _, _, _, old_depth, generation = RECORD.unpack_from(self.map, pos)
+                if key == zobrist and ctx == context:
+                    if old_depth > (depth or 0):
+                        return  # keep the deeper search
+                    victim = pos
+                    break
+                if victim_generation is None or generation < victim_generation:
+                    victim, victim_generation = pos, generation
+            self.generation += 1
+            HEADER.pack_into(self.map, 0, MAGIC, VERSION, self.buckets, WAYS, self.generation)
+            score = NO_SCORE if score is None else max(-32767, min(32767, score))
+            mate = max(-128, min(127, mate)) if mate else 0
+            RECORD.pack_into(self.map, victim, zobrist, context, encode_move(bestmove), encode_move(ponder),
+                             score, mate, min(depth or 0, 255), self.generation)
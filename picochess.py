@@ -28,11 +28,21 @@ import chess.uci
 import threading
 import copy
 import gc
+import atexit
 
-from engine import UciEngine, read_engine_ini
+from engine import UciEngine, EnginePool, EngineWatchdog, RemoteFailover, IdleManager, read_engine_ini, \
+    engine_catalog, search_cache, silent_informer
 import chesstalker.chesstalker
 
 from timecontrol import TimeControl
+from movestore import MoveStore
+from kibitz import ConsensusKibitz
+from speculation import Speculation, SPECULATION_HASH, SPECULATION_TIME
+from simul import open_simul, SIMUL_LOCAL
+from engineserver import ENGINE_SERVER_HOST
+from resourcemonitor import ResourceMonitor
+from hostprofile import host_profile
+from governor import ThermalGovernor
 from utilities import *
 from keyboard import KeyboardInput, TerminalDisplay
 from pgn import PgnDisplay
@@ -47,7 +57,6 @@ from dgttranslate import DgtTranslate
 
 from logging.handlers import RotatingFileHandler
 from configobj import ConfigObj
-# from engine import get_installed_engines
 
 
 class AlternativeMover:
@@ -69,13 +78,14 @@ class AlternativeMover:
 
         book_move = bm.move()
         self.add(book_move)
-        g = copy.deepcopy(game)
-        g.push(book_move)
+        game.push(book_move)
         try:
-            bp = bookreader.weighted_choice(g)
+            bp = bookreader.weighted_choice(game)
             book_ponder = bp.move()
         except IndexError:
             book_ponder = None
+        finally:
+            game.pop()
         return chess.uci.BestMove(book_move, book_ponder)
 
     def add(self, move):
@@ -119,26 +129,88 @@ def main():
             Observable.fire(Event.NEW_SCORE(score='tb', mate=score))
         return score
 
+    def show_cached_result(search_key):
+        """Show score and pv of an earlier search of this position at once - the engine refines them later."""
+        cached = search_cache.get(search_key)
+        if cached:
+            if cached.score is not None or cached.mate is not None:
+                Observable.fire(Event.NEW_SCORE(score=cached.score, mate=cached.mate))
+            Observable.fire(Event.NEW_PV(pv=cached.pv))
+        return cached
+
+    def start_failover_engine():
+        """Start the local engine for a failing remote one: the one given, or the same (or first) of the catalog."""
+        local_file = args.failover_engine
+        if not local_file:
+            library = read_engine_ini()
+            same = [eng['file'] for eng in library if eng['file'].endswith(os.sep + os.path.basename(args.engine))]
+            local_file = same[0] if same else library[0]['file']
+        local_engine = UciEngine(local_file)
+        local_engine.startup(engine_catalog.level(None, local_file, args.engine_level), False,
+                             level_name=args.engine_level or '')
+        logging.debug('local failover engine [%s] ready', local_file)
+        return local_engine
+
+    def failback():
+        """Go back to the remote engine once its healthy again - only between searches."""
+        nonlocal engine
+        if failover and engine is failover.local and engine.is_waiting() and failover.is_healthy():
+            logging.info('remote engine is healthy again - switching back')
+            engine = failover.remote
+
     def think(game, tc):
         """
         Starts a new search on the current game.
         If a move is found in the opening book, fire an event in a few seconds.
         :return:
         """
+        start = time.monotonic()
+        failback()
         start_clock()
         book_move = searchmoves.book(bookreader, game)
         if book_move:
+            if engine.is_ponder_search():
+                engine.stop()
+            if speculation:
+                speculation.stop()
             Observable.fire(Event.NEW_SCORE(score='book', mate=None))
             Observable.fire(Event.BEST_MOVE(result=book_move, inbook=True))
         else:
             probe_tablebase(game)
-            while not engine.is_waiting():
-                time.sleep(0.1)
-                logging.warning('engine is still not waiting')
-            engine.position(copy.deepcopy(game))
+            if simul:  # the simul engines search it in turns with the other boards
+                simul.think(SIMUL_LOCAL, game, tc)
+                return
+            search_key = search_cache.key(game, engine.get_file(), engine.options, tc.limits(),
+                                          searchmoves.excludemoves)
+            speculated = speculation.take(game, engine.options, tc.uci()) if speculation else None
+            if speculated and speculated.bestmove not in searchmoves.excludemoves:
+                search_cache.put(search_key, speculated)  # an incomplete one is only shown till the engine knows more
+                if speculated.complete:  # same options and time as the engine would take - its move
+                    if engine.is_ponder_search():
+                        engine.stop()
+                    logging.debug('playing the speculated move %s', speculated.bestmove)
+                    result = chess.uci.BestMove(speculated.bestmove, speculated.ponder)
+                    Observable.fire(Event.BEST_MOVE(result=result, inbook=False))
+                    engine.record_start_latency(time.monotonic() - start)
+                    return
+            if engine.ponderhit(game, search_key):
+                logging.debug('ponderhit - engine keeps on searching')
+                engine.record_start_latency(time.monotonic() - start)
+                return
+            if engine.is_ponder_search():
+                engine.stop()  # the user played another move - the engine starts the new search once its stopped
+            cached = show_cached_result(search_key)
+            if cached and cached.complete:
+                logging.debug('playing the cached move %s', cached.bestmove)
+                result = chess.uci.BestMove(cached.bestmove, cached.ponder)
+                Observable.fire(Event.BEST_MOVE(result=result, inbook=False))
+                return
+            engine.position(game)
+            engine.multipv(1)
             uci_dict = tc.uci()
             uci_dict['searchmoves'] = searchmoves.all(game)
-            engine.go(uci_dict)
+            engine.go(uci_dict, search_key)
+            engine.record_start_latency(time.monotonic() - start)
 
     def analyse(game):
         """
@@ -146,8 +218,53 @@ def main():
         :return:
         """
         probe_tablebase(game)
-        engine.position(copy.deepcopy(game))
-        engine.ponder()
+        failback()
+        if interaction_mode == Mode.KIBITZ and args.kibitz_engines > 1:
+            consensus_kibitz().analyse(game)
+            return
+        search_key = search_cache.key(game, engine.get_file(), engine.options, None)
+        show_cached_result(search_key)
+        engine.position(game)
+        engine.multipv(args.multipv if interaction_mode in (Mode.ANALYSIS, Mode.KIBITZ) else 1)
+        engine.ponder(search_key)
+
+    def can_ponder(game, move):
+        return not args.disable_ponder and not simul and not engine.is_throttled() and move and move in game.legal_moves
+
+    def ponder_reply(game, move):
+        """
+        Starts a ponder search on the expected user move - think() turns it into the real search (ponderhit).
+        :return:
+        """
+        if not can_ponder(game, move):
+            return
+        engine.multipv(1)
+        engine.ponder_on(game, move, time_control.uci())
+
+    def speculate(game, move):
+        """
+        Search the answers to the other likely user replies on the cores the engine leaves free (see Speculation).
+        Must run before ponder_reply(), which clears the lines of the last search.
+        :return:
+        """
+        nonlocal speculation
+        if not args.speculate or simul or engine.is_throttled():
+            return
+        cores = sorted(host_profile.engine_cores())
+        covered = move if can_ponder(game, move) else None  # the ponder search has it - and its threads
+        if covered:
+            cores = cores[int(engine.options.get('Threads', 1)):]
+        if not cores:
+            return
+        if speculation is None or speculation.engine_file != engine.get_file():
+            if speculation:
+                speculation.close()
+            speculation = Speculation(engine.get_file(), args.speculate_hash, args.speculate_time)
+        lines = [line[3][1] for line in engine.handler.multipv_table.current()
+                 if len(line[3]) > 1 and line[3][0] == game.peek()]
+        replies = [reply for reply in speculation.candidates(game, [move] + lines, bookreader, args.speculate + 1)
+                   if reply != covered]
+        speculation.start(game, replies[:args.speculate], cores, engine.options, time_control.uci(), covered)
 
     def observe(game):
         """
@@ -159,10 +276,63 @@ def main():
 
     def stop_search():
         """
-        Stop current search.
+        Stop current search - returns at once, a following search starts as soon as the engine is ready again.
         :return:
         """
         engine.stop()
+        if kibitz:
+            kibitz.stop()
+        if speculation:
+            speculation.stop()
+        if simul:
+            simul.cancel(SIMUL_LOCAL)
+
+    def engine_pids():
+        """The engine processes for the resource monitor."""
+        engines = [('engine', engine)]
+        if failover and failover.local is not engine:
+            engines.append(('failover', failover.local))
+        engines += [('kibitz', eng) for eng in (kibitz.engines if kibitz else [])]
+        engines += [('speculation', eng) for eng in (speculation.engines if speculation else [])]
+        engines += [('simul', worker.engine) for worker in (simul.workers if simul else [])]
+        pids = {}
+        for role, eng in engines:
+            pid = eng.get_pid() if eng.is_local() else None  # a remote pid means nothing on this system
+            if pid:
+                pids['{} {} {}'.format(role, os.path.basename(eng.get_file()), pid)] = pid
+        return pids
+
+    def consensus_kibitz():
+        """The kibitz engines: the current engine and the fastest (benchmarked) others of its folder."""
+        nonlocal kibitz
+        if kibitz is None:
+            library = read_engine_ini(None, engine.get_file().rsplit(os.sep, 1)[0])
+            others = sorted((eng for eng in library if eng['file'] != engine.get_file()),
+                            key=lambda eng: -eng['bench'].get('', {}).get('nps', 0))
+            files = [engine.get_file()] + [eng['file'] for eng in others]
+            kibitz = ConsensusKibitz(files[:args.kibitz_engines])
+        return kibitz
+
+    def start_simul():
+        """The simul engines - the startup engine and level, sharing the engine cores - with the local board."""
+        if not engine.is_local():
+            logging.error('the simul needs a local engine - simul off')
+            return None
+        threads = max(1, len(host_profile.engine_cores()) // args.simul_engines)
+        engines = []
+        for _ in range(args.simul_engines):
+            eng = UciEngine(engine.get_file(), handler=silent_informer())
+            eng.startup(get_engine_level_dict(args.engine_level), False, threads=threads,
+                        level_name=args.engine_level or '')
+            engines.append(eng)
+        return open_simul(engines, simul_move, args.simul_port, args.simul_bind)
+
+    def simul_move(board_id, result):
+        """The move of the simul for the local board - from a simul worker thread."""
+        if result:
+            Observable.fire(Event.BEST_MOVE(result=result, inbook=False))
+        else:
+            logging.error('the simul engines found no move')
 
     def stop_clock():
         if interaction_mode in (Mode.NORMAL, Mode.OBSERVE, Mode.REMOTE):
@@ -354,6 +524,9 @@ def main():
             text = Message.COMPUTER_MOVE(move=move, ponder=ponder, fen=fen, turn=turn, game=game.copy(),
                                          time_control=time_control, wait=inbook)
             DisplayMsg.show(text)
+            if interaction_mode == Mode.NORMAL and not game.is_game_over():
+                speculate(game, ponder)
+                ponder_reply(game, ponder)
         else:
             last_computer_fen = None
             game.push(move)
@@ -404,19 +577,7 @@ def main():
         return time_control, text
 
     def get_engine_level_dict(engine_level):
-        from engine import get_installed_engines
-
-        installed_engines = get_installed_engines(engine.get_shell(), engine.get_file())
-        for index in range(0, len(installed_engines)):
-            eng = installed_engines[index]
-            if eng['file'] == engine.get_file():
-                level_list = sorted(eng['level_dict'])
-                try:
-                    level_index = level_list.index(engine_level)
-                    return eng['level_dict'][level_list[level_index]]
-                except ValueError:
-                    break
-        return {}
+        return engine_catalog.level(engine.get_shell(), engine.get_file(), engine_level)
 
     # Enable garbage collection - needed for engine swapping as objects orphaned
     gc.enable()
@@ -440,6 +601,56 @@ def main():
     parser.add_argument("-ru", "--remote-user", type=str, help="remote user on server running the engine")
     parser.add_argument("-rp", "--remote-pass", type=str, help="password for the remote user")
     parser.add_argument("-rk", "--remote-key", type=str, help="key file used to connect to the remote server")
+    parser.add_argument("-es", "--engine-server", type=str, default=None,
+                        help="host:port of an engine server (see engineserver.py) running the engine")
+    parser.add_argument("-esp", "--engine-server-priority", type=int, default=0,
+                        help="priority of this board on the engine server (higher goes first)")
+    parser.add_argument("-eth", "--engine-threads", type=int, default=0,
+                        help="threads for the engine (0=all cores not reserved for picochess)")
+    parser.add_argument("-eha", "--engine-hash", type=int, default=0,
+                        help="hash size in MB for the engine (0=from the available memory)")
+    parser.add_argument("-rco", "--reserved-cores", type=int, default=1,
+                        help="cpu cores kept free from the engines for picochess itself")
+    parser.add_argument("-thp", "--thermal-path", type=str, default='/sys/class/thermal',
+                        help="folder with the thermal zones of the system")
+    parser.add_argument("-thl", "--thermal-limit", type=int, default=75,
+                        help="degree celsius from which on the engine is slowed down (0=never)")
+    parser.add_argument("-lol", "--load-limit", type=float, default=1.5,
+                        help="system load per cpu core from which on the engine is slowed down (0=never)")
+    parser.add_argument("-tht", "--throttle-threads", type=int, default=1,
+                        help="threads of the engine while slowed down")
+    parser.add_argument("-mon", "--monitor-interval", type=int, default=10,
+                        help="secs between two cpu & memory samples of the engines and picochess threads (0=off)")
+    parser.add_argument("-idl", "--idle-time", type=int, default=0,
+                        help="secs without any board, clock or web activity till the engine is suspended (0=never)")
+    parser.add_argument("-rf", "--remote-failover", action='store_true',
+                        help="let a local engine take over if the remote engine fails")
+    parser.add_argument("-fe", "--failover-engine", type=str, default=None,
+                        help="local engine for the failover (default: same or first engine of the local catalog)")
+    parser.add_argument("-kib", "--kibitz-engines", type=int, default=1,
+                        help="how many engines analyse together (single threaded, one core each) in kibitz mode")
+    parser.add_argument("-spc", "--speculate", type=int, default=0,
+                        help="how many likely user replies are searched on the spare cores while the user thinks")
+    parser.add_argument("-sph", "--speculate-hash", type=int, default=SPECULATION_HASH,
+                        help="hash size in MB of each engine searching a user reply")
+    parser.add_argument("-spt", "--speculate-time", type=int, default=SPECULATION_TIME,
+                        help="msecs a search of a user reply takes at most")
+    parser.add_argument("-sip", "--simul-port", type=int, default=0,
+                        help="play a simul: other boards connect to this port as to an engine server (0=no simul)")
+    parser.add_argument("-sie", "--simul-engines", type=int, default=1,
+                        help="how many engines play the simul boards (the local one included) in turns")
+    parser.add_argument("-sib", "--simul-bind", type=str, default=ENGINE_SERVER_HOST,
+                        help="address the simul listens on (0.0.0.0 for all, only on a trusted network)")
+    parser.add_argument("-mpv", "--multipv", type=int, default=1,
+                        help="how many lines the engine shows in analysis & kibitz mode (if supported)")
+    parser.add_argument("-eps", "--engine-pool-size", type=int, default=1,
+                        help="how many recently used engines are kept ready for a fast engine switch (0=none)")
+    parser.add_argument("-scs", "--search-cache-size", type=int, default=256,
+                        help="how many finished searches are remembered for takebacks and analysis (0=none)")
+    parser.add_argument("-msf", "--move-store-file", type=str, default='moves.store',
+                        help="file which keeps the engine moves of earlier games for the same positions")
+    parser.add_argument("-mss", "--move-store-size", type=int, default=1024,
+                        help="size of the move store file in kB (0=no move store)")
     parser.add_argument("-pf", "--pgn-file", type=str, help="pgn file used to store the games", default='games.pgn')
     parser.add_argument("-pu", "--pgn-user", type=str, help="user name for the pgn file", default=None)
     parser.add_argument("-ar", "--auto-reboot", action='store_true', help="reboot system after update")
@@ -461,6 +672,8 @@ def main():
     parser.add_argument("-uvoice", "--user-voice", type=str, help="voice for user", default=None)
     parser.add_argument("-cvoice", "--computer-voice", type=str, help="voice for computer", default=None)
     parser.add_argument("-inet", "--enable-internet", action='store_true', help="enable internet lookups")
+    parser.add_argument("-npon", "--disable-ponder", action='store_true',
+                        help="dont let the engine think on the users time in normal mode")
     parser.add_argument("-nook", "--disable-ok-message", action='store_true', help="disable ok confirmation messages")
     parser.add_argument("-v", "--version", action='version', version='%(prog)s version {}'.format(version),
                         help="show current version", default=None)
@@ -468,6 +681,12 @@ def main():
     parser.add_argument("-lang", "--language", choices=['en', 'de', 'nl', 'fr', 'es'], default='en',
                         help="picochess language")
     parser.add_argument("-c", "--console", action='store_true', help="use console interface")
+    parser.add_argument("-rc", "--rate-clock", type=float, default=0.5,
+                        help="secs between two engine score/pv updates on the clock")
+    parser.add_argument("-rw", "--rate-web", type=float, default=0.25,
+                        help="secs between two engine score/pv updates for the web clients")
+    parser.add_argument("-rl", "--rate-log", type=float, default=1.0,
+                        help="secs between two engine score/pv log entries")
 
     args = parser.parse_args()
     if args.engine is None:
@@ -503,11 +722,11 @@ def main():
 
     # The class dgtDisplay talks to DgtHw/DgtPi or DgtVr
     dgttranslate = DgtTranslate(args.beep_config, args.beep_level, args.language)
-    DgtDisplay(args.disable_ok_message, dgttranslate).start()
+    DgtDisplay(args.disable_ok_message, dgttranslate, args.rate_clock).start()
 
     # Launch web server
     if args.web_server_port:
-        WebServer(args.web_server_port).start()
+        WebServer(args.web_server_port, args.rate_web).start()
 
     dgtserial = DgtSerial(args.dgt_port, args.enable_revelation_leds, args.dgtpi)
 
@@ -546,13 +765,35 @@ def main():
         logging.debug('ChessTalker disabled')
 
     # Gentlemen, start your engines...
+    simul_engines = args.simul_engines if args.simul_port else 0
+    host_profile.configure(args.engine_threads, args.engine_hash, args.reserved_cores,
+                           args.engine_pool_size + 1 + simul_engines)
+    host_profile.pin_picochess()
     engine = UciEngine(args.engine, hostname=args.remote_server, username=args.remote_user,
-                       key_file=args.remote_key, password=args.remote_pass)
+                       key_file=args.remote_key, password=args.remote_pass, server=args.engine_server,
+                       priority=args.engine_server_priority)
     try:
         engine_name = engine.get().name
     except AttributeError:
         logging.error('no engines started')
         sys.exit(-1)
+    engine_pool = EnginePool(args.engine_pool_size)
+    kibitz = None  # the consensus kibitz engines, started on demand
+    speculation = None  # the engines searching the likely user replies, started on demand
+    EngineWatchdog(lambda: engine).start()
+    idle_manager = None
+    if args.idle_time:
+        idle_manager = IdleManager(lambda: engine, args.idle_time)
+        idle_manager.start()
+    governor = None
+    if args.thermal_limit or args.load_limit:
+        governor = ThermalGovernor(args.thermal_path, args.thermal_limit or float('inf'),
+                                   args.load_limit or float('inf'))
+        governor.start()
+    search_cache.size = args.search_cache_size
+    if args.move_store_size:
+        search_cache.store = MoveStore(args.move_store_file, args.move_store_size)
+        atexit.register(search_cache.close)
 
     # Startup - internal
     game = chess.Board()  # Create the current game
@@ -572,7 +813,14 @@ def main():
     last_legal_fens = []
     game_declared = False  # User declared resignation or draw
 
-    engine.startup(get_engine_level_dict(args.engine_level))
+    engine.startup(get_engine_level_dict(args.engine_level), level_name=args.engine_level or '')
+    simul = start_simul() if args.simul_port else None
+    failover = None
+    if (args.remote_server or args.engine_server) and args.remote_failover:
+        failover = RemoteFailover(engine, start_failover_engine(), lambda: engine)
+        failover.start()
+    if args.monitor_interval:
+        ResourceMonitor(engine_pids, args.monitor_interval).start()
 
     # Startup - external
     time_control, time_text = transfer_time(args.time.split())
@@ -592,6 +840,7 @@ def main():
     system_info_thread.start()
 
     # Event loop
+    log_limiter = RateLimiter(args.rate_log)  # the engine info events would flood the log otherwise
     logging.info('evt_queue ready')
     while True:
         try:
@@ -599,7 +848,11 @@ def main():
         except queue.Empty:
             pass
         else:
-            logging.debug('received event from evt_queue: %s', event)
+            if idle_manager:
+                idle_manager.activity(event)  # wakes a suspended engine in the background
+            if event._type not in (EventApi.NEW_PV, EventApi.NEW_SCORE, EventApi.NEW_MULTIPV) or \
+                    log_limiter.offer(event):
+                logging.debug('received event from evt_queue: %s', event)
             for case in switch(event):
                 if case(EventApi.FEN):
                     process_fen(event.fen)
@@ -621,62 +874,69 @@ def main():
 
                 if case(EventApi.LEVEL):
                     if event.options:
-                        engine.startup(event.options, False)
+                        if failover and engine in (failover.remote, failover.local):
+                            failover.level(event.options, event.level_name)
+                        else:
+                            engine.startup(event.options, False, level_name=event.level_name)
                     DisplayMsg.show(Message.LEVEL(level_text=event.level_text))
                     break
 
                 if case(EventApi.NEW_ENGINE):
+                    engine_pool.acquire(event)  # ENGINE_SPAWNED does the switch once the new engine is ready
+                    break
+
+                if case(EventApi.ENGINE_SPAWNED):
+                    request = event.request
                     config = ConfigObj('picochess.ini')
-                    config['engine'] = event.eng['file']
+                    config['engine'] = request.eng['file']
                     config.write()
                     old_file = engine.get_file()
-                    engine_shutdown = True
+                    if kibitz:
+                        kibitz.close()  # its engine set belongs to the old engine
+                        kibitz = None
+                    if speculation:
+                        speculation.close()
+                        speculation = None
                     # Stop the old engine cleanly
                     engine.stop()
-                    # Closeout the engine process and threads
-                    # The all return non-zero error codes, 0=success
-                    if engine.quit():  # Ask nicely
-                        if engine.terminate():  # If you won't go nicely.... 
-                            if engine.kill():  # Right that does it!
-                                logging.error('engine shutdown failure')
-                                DisplayMsg.show(Message.ENGINE_FAIL())
-                                engine_shutdown = False
-                    if engine_shutdown:
-                        # Load the new one and send args.
-                        # Local engines only
-                        engine_fallback = False
-                        engine = UciEngine(event.eng['file'])
-                        try:
-                            engine_name = engine.get().name
-                        except AttributeError:
-                            # New engine failed to start, restart old engine
-                            logging.error("new engine failed to start, reverting to %s", old_file)
-                            engine_fallback = True
-                            event.options = {}  # Reset options. This will load the last(=strongest?) level
-                            engine = UciEngine(old_file)
-                            try:
-                                engine_name = engine.get().name
-                            except AttributeError:
-                                # Help - old engine failed to restart. There is no engine
-                                logging.error('no engines started')
-                                sys.exit(-1)
-                        # Schedule cleanup of old objects
-                        gc.collect()
-                        engine.startup(event.options)
-                        # All done - rock'n'roll
-                        if not engine_fallback:
-                            DisplayMsg.show(Message.ENGINE_READY(eng=event.eng, engine_name=engine_name,
-                                                                 eng_text=event.eng_text,
-                                                                 has_levels=engine.has_levels(),
-                                                                 has_960=engine.has_chess960(), ok_text=event.ok_text))
-                        else:
-                            DisplayMsg.show(Message.ENGINE_FAIL())
-                        set_wait_state()
-                        # Go back to analysing or observing
-                        if interaction_mode == Mode.ANALYSIS or interaction_mode == Mode.KIBITZ:
-                            analyse(game)
-                        if interaction_mode == Mode.OBSERVE or interaction_mode == Mode.REMOTE:
-                            observe(game)
+                    # The new one is a warm one from the pool or a fresh one - send args.
+                    # Local engines only
+                    engine_fallback = False
+                    if event.engine:
+                        if failover:  # the new engine isnt the remote one (or its local stand-in) any longer
+                            failover.close()
+                            engine_pool.teardown(failover.local if engine is failover.remote else failover.remote)
+                            failover = None
+                        # The pool keeps the old engine ready for later, or shuts it down in the background
+                        engine_pool.release(engine)
+                        engine = event.engine
+                        engine_name = engine.get().name
+                    else:
+                        # New engine failed to start, keep the old engine
+                        logging.error("new engine failed to start, reverting to %s", old_file)
+                        engine_fallback = True
+                        request.options = {}  # Reset options. This will load the last(=strongest?) level
+                        request.level_name = ''
+                    # Schedule cleanup of old objects
+                    gc.collect()
+                    engine.startup(request.options, level_name=request.level_name)
+                    if governor and governor.throttled:
+                        engine.throttle(args.throttle_threads)
+                    engine_pool.switched(event.start)
+                    # All done - rock'n'roll
+                    if not engine_fallback:
+                        DisplayMsg.show(Message.ENGINE_READY(eng=request.eng, engine_name=engine_name,
+                                                             eng_text=request.eng_text,
+                                                             has_levels=engine.has_levels(),
+                                                             has_960=engine.has_chess960(), ok_text=request.ok_text))
+                    else:
+                        DisplayMsg.show(Message.ENGINE_FAIL())
+                    set_wait_state()
+                    # Go back to analysing or observing
+                    if interaction_mode == Mode.ANALYSIS or interaction_mode == Mode.KIBITZ:
+                        analyse(game)
+                    if interaction_mode == Mode.OBSERVE or interaction_mode == Mode.REMOTE:
+                        observe(game)
                     break
 
                 if case(EventApi.SETUP_POSITION):
@@ -693,6 +953,7 @@ def main():
                     game = chess.Board(event.fen, event.uci960)
                     legal_fens = compute_legal_fens(game)
                     stop_search_and_clock()
+                    engine.new_game()
                     time_control.reset()
                     interaction_mode = Mode.NORMAL
                     last_computer_fen = None
@@ -767,6 +1028,7 @@ def main():
                     game = chess.Board()
                     if event.pos960 != 518:  # 518 is normal game setup
                         game.set_chess960_pos(event.pos960)
+                    engine.new_game()
                     legal_fens = compute_legal_fens(game)
                     last_legal_fens = []
                     # interaction_mode = Mode.NORMAL @todo
@@ -793,9 +1055,55 @@ def main():
                     break
 
                 if case(EventApi.BEST_MOVE):
+                    if failover and not event.inbook:
+                        failover.record(engine)
                     handle_move(move=event.result.bestmove, ponder=event.result.ponder, inbook=event.inbook)
                     break
 
+                if case(EventApi.SPECULATION_READY):
+                    if speculation:  # still the same user move to wait for, else the request is gone
+                        speculation.resume()
+                    break
+
+                if case(EventApi.FAILOVER):
+                    if failover and engine is failover.remote:
+                        thinking = engine.is_thinking()
+                        analysing = engine.is_pondering() and not engine.is_ponder_search()
+                        elapsed = time.monotonic() - engine.search_start if engine.search_start else 0
+                        engine.abandon()
+                        engine = failover.local
+                        if thinking:  # same position and limits, minus the time the remote engine wasted
+                            engine.position(game)
+                            engine.multipv(1)
+                            uci_dict = time_control.uci()
+                            engine.reduce_time(uci_dict, elapsed)
+                            uci_dict['searchmoves'] = searchmoves.all(game)
+                            engine.go(uci_dict)
+                        elif analysing:
+                            analyse(game)
+                    break
+
+                if case(EventApi.THROTTLE):
+                    if failover and failover.local is not engine:  # it waits, so there is no search to stop
+                        if event.active:
+                            failover.local.throttle(args.throttle_threads)
+                        else:
+                            failover.local.unthrottle()
+                    if not engine.is_local():
+                        logging.debug('remote engine - not throttled')
+                        break
+                    # UCI options only apply while the engine is idle, so stop and restart a running analysis
+                    analysing = engine.is_pondering() and not engine.is_ponder_search()
+                    if engine.is_pondering():
+                        stop_search()  # in normal mode this ends the pondering as well
+                    if event.active:
+                        engine.throttle(args.throttle_threads)
+                    else:
+                        engine.unthrottle()
+                    if analysing:
+                        analyse(game)
+                    break
+
                 if case(EventApi.NEW_PV):
                     # illegal moves can occur if a pv from the engine arrives at the same time as a user move.
                     if game.is_legal(event.pv[0]):
@@ -804,6 +1112,20 @@ def main():
                         logging.info('illegal move can not be displayed. move:%s fen=%s',event.pv[0],game.fen())
                     break
 
+                if case(EventApi.NEW_MULTIPV):
+                    lines = []
+                    for depth, score, mate, pv in event.lines:
+                        # same as for NEW_PV: lines can be outdated by a user move
+                        if not game.is_legal(pv[0]):
+                            break
+                        if score is not None and game.turn == chess.BLACK:
+                            score *= -1
+                        lines.append((depth, score, mate, pv))
+                    if lines:
+                        DisplayMsg.show(Message.NEW_MULTIPV(lines=lines, mode=interaction_mode, fen=game.fen(),
+                                                            turn=game.turn))
+                    break
+
                 if case(EventApi.NEW_SCORE):
                     if event.score == 'book':
                         score = 'book'
@@ -826,9 +1148,15 @@ def main():
                     if interaction_mode in (Mode.NORMAL, Mode.OBSERVE, Mode.REMOTE):
                         stop_clock()  # only stop, if the clock is really running
                     interaction_mode = event.mode
+                    if kibitz and interaction_mode != Mode.KIBITZ:
+                        kibitz.close()  # free the cores again
+                        kibitz = None
+                    if speculation and interaction_mode != Mode.NORMAL:
+                        speculation.close()
+                        speculation = None
                     if engine.is_thinking():
                         stop_search()  # dont need to stop, if pondering
-                    if engine.is_pondering() and interaction_mode == Mode.NORMAL:
+                    if engine.is_pondering() and (interaction_mode == Mode.NORMAL or engine.is_ponder_search()):
                         stop_search()  # if change from ponder modes to normal, also stops the pondering
                     set_wait_state()
                     DisplayMsg.show(Message.INTERACTION_MODE(mode=event.mode, mode_text=event.mode_text, ok_text=event.ok_text))
@@ -865,6 +1193,7 @@ def main():
                     if talker:
                         talker.say_event(event)
                     DisplayMsg.show(Message.GAME_ENDS(result=GameResult.ABORT, play_mode=play_mode, game=game.copy()))
+                    search_cache.close()
                     shutdown(args.dgtpi)
                     break
 
@@ -872,6 +1201,7 @@ def main():
                     if talker:
                         talker.say_event(event)
                     DisplayMsg.show(Message.GAME_ENDS(result=GameResult.ABORT, play_mode=play_mode, game=game.copy()))
+                    search_cache.close()
                     reboot()
                     break
 
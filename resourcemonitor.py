@@ -0,0 +1,161 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import time
+import threading
+from threading import Thread
+from collections import deque
+from utilities import *
+
+# secs between two samples
+MONITOR_INTERVAL = 5
+# how many samples are kept
+MONITOR_SAMPLES = 120
+# samples between two summaries in the log
+MONITOR_LOG_EVERY = 12
+# cpu percent of a thread, which for MONITOR_SPIN_SAMPLES in a row looks like a busy loop
+MONITOR_SPIN_CPU = 90
+MONITOR_SPIN_SAMPLES = 3
+# growth factor of an engine rss (over its first sample) which is worth a warning
+MONITOR_RSS_GROWTH = 1.5
+
+
+def read_proc_stat(path):
+    """(cpu ticks used, number of threads) from a /proc/.../stat file - None if its gone."""
+    try:
+        with open(path) as file:
+            fields = file.read().rsplit(')', 1)[1].split()  # the name in brackets may contain spaces
+    except (OSError, IndexError):
+        return None
+    # fields[0] is the state (field 3 of proc(5)), so utime (14) is at 11
+    return int(fields[11]) + int(fields[12]), int(fields[17])
+
+
+def read_proc_status(path):
+    """VmRSS and VmSize in kB from a /proc/<pid>/status file."""
+    values = {}
+    try:
+        with open(path) as file:
+            for line in file:
+                if line.startswith(('VmRSS:', 'VmSize:')):
+                    name, value = line.split(':', 1)
+                    values[name] = int(value.split()[0])
+    except (OSError, ValueError):
+        pass
+    return values
+
+
+def thread_names():
+    """Native thread id => name of the python threads. Threads with a default name are named by their class."""
+    names = {}
+    for thread in threading.enumerate():
+        tid = getattr(thread, 'native_id', None)  # python 3.8 and later
+        if tid is not None:
+            names[tid] = type(thread).__name__ if thread.name.startswith('Thread-') else thread.name
+    return names
+
+
+class ResourceMonitor(Thread):
+    """
+    Samples cpu and memory of the engine processes and the cpu of each picochess thread from /proc.
+    The samples are kept in a ring buffer. Only the latest goes to the displays, the web client keeps its history.
+    Summaries go to the log now and then, together with warnings about spinning threads and growing engines.
+    """
+
+    def __init__(self, get_pids, interval=MONITOR_INTERVAL, size=MONITOR_SAMPLES):
+        super(ResourceMonitor, self).__init__()
+        self.daemon = True
+        self.get_pids = get_pids  # returns {label: pid} of the engine processes
+        self.interval = interval
+        self.samples = deque(maxlen=size)
+        self.ticks = os.sysconf('SC_CLK_TCK')
+        self.last_ticks = {}  # pid or ('task', tid) => cpu ticks of the last sample
+        self.seen = {}
+        self.first_rss = {}  # engine pid => rss of its first sample
+        self.spinning = {}  # thread name => busy samples in a row
+        self.count = 0
+
+    def cpu(self, key, ticks, secs):
+        """Cpu percent since the last sample (None for the first one)."""
+        last = self.last_ticks.get(key)
+        self.seen[key] = ticks
+        if last is None or secs <= 0:
+            return None
+        return round(100 * (ticks - last) / self.ticks / secs, 1)
+
+    def sample_engines(self, secs):
+        engines = {}
+        for label, pid in self.get_pids().items():
+            stat = read_proc_stat('/proc/{}/stat'.format(pid))
+            if stat is None:
+                continue
+            status = read_proc_status('/proc/{}/status'.format(pid))
+            rss = status.get('VmRSS')
+            engines[label] = {'pid': pid, 'cpu': self.cpu(pid, stat[0], secs), 'threads': stat[1],
+                              'rss': rss, 'vsize': status.get('VmSize')}
+            first = self.first_rss.setdefault(pid, rss)
+            if rss and first and rss > first * MONITOR_RSS_GROWTH:
+                logging.warning('engine %s (pid %i) grew from %i to %i kB', label, pid, first, rss)
+                self.first_rss[pid] = rss  # warn again only after further growth
+        return engines
+
+    def sample_threads(self, secs):
+        threads = {}
+        names = thread_names()
+        try:
+            tids = [int(tid) for tid in os.listdir('/proc/self/task')]
+        except OSError:
+            return threads
+        for tid in tids:
+            stat = read_proc_stat('/proc/self/task/{}/stat'.format(tid))
+            if stat is None:
+                continue
+            name = names.get(tid, 'tid {}'.format(tid))
+            if name in threads:
+                name = '{} {}'.format(name, tid)
+            cpu = self.cpu(('task', tid), stat[0], secs)
+            threads[name] = cpu
+            busy = self.spinning.get(name, 0) + 1 if cpu is not None and cpu >= MONITOR_SPIN_CPU else 0
+            self.spinning[name] = busy
+            if busy == MONITOR_SPIN_SAMPLES:
+                logging.warning('thread %s used %.0f%% cpu for %i samples in a row', name, cpu, busy)
+        return threads
+
+    def sample(self, secs):
+        status = read_proc_status('/proc/self/status')
+        self.seen = {}
+        sample = {'time': round(time.time(), 1), 'engines': self.sample_engines(secs),
+                  'picochess': {'rss': status.get('VmRSS'), 'threads': self.sample_threads(secs)}}
+        self.last_ticks = self.seen  # forget the processes and threads which are gone
+        self.samples.append(sample)
+        self.count += 1
+        if self.count % MONITOR_LOG_EVERY == 0:
+            logging.info('resources: %s', sample)
+        else:
+            logging.debug('resources: %s', sample)
+        return sample
+
+    def run(self):
+        last = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            now = time.monotonic()
+            sample = self.sample(now - last)
+            last = now
+            DisplayMsg.show(Message.RESOURCE_USAGE(sample=sample))
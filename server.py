@@ -37,6 +37,18 @@ _workers = ThreadPool(5)
 client_ips = []
 
 
+def san_line(fen, moves):
+    """Return the moves (played from fen) as a string in short algebraic notation."""
+    board = chess.Board(fen)
+    line = []
+    for move in moves:
+        if not board.is_legal(move):
+            break
+        line.append(board.san(move))
+        board.push(move)
+    return ' '.join(line)
+
+
 class ChannelHandler(tornado.web.RequestHandler):
     def initialize(self, shared=None):
         self.shared = shared
@@ -107,6 +119,12 @@ class InfoHandler(tornado.web.RequestHandler):
         if action == 'get_headers':
             if 'headers' in self.shared:
                 self.write(self.shared['headers'])
+        if action == 'get_telemetry':
+            if 'telemetry' in self.shared:
+                self.write(self.shared['telemetry'].snapshot())
+        if action == 'get_resources':
+            if 'resources' in self.shared:
+                self.write({'sample': self.shared['resources']})
 
 
 class ChessBoardHandler(tornado.web.RequestHandler):
@@ -118,10 +136,10 @@ class ChessBoardHandler(tornado.web.RequestHandler):
 
 
 class WebServer(Observable, threading.Thread):
-    def __init__(self, port=80):
+    def __init__(self, port=80, rate=0.25):
         shared = {}
 
-        WebDisplay(shared).start()
+        WebDisplay(shared, rate).start()
         super(WebServer, self).__init__()
         wsgi_app = tornado.wsgi.WSGIContainer(pw)
 
@@ -142,9 +160,12 @@ class WebServer(Observable, threading.Thread):
 
 
 class WebDisplay(DisplayMsg, threading.Thread):
-    def __init__(self, shared):
+    def __init__(self, shared, rate=0.25):
         super(WebDisplay, self).__init__()
         self.shared = shared
+        self.score_limiter = RateLimiter(rate)
+        self.pv_limiter = RateLimiter(rate)
+        self.multipv_limiter = RateLimiter(rate)
 
     @staticmethod
     def run_background(func, callback, args=(), kwds=None):
@@ -240,6 +261,14 @@ class WebDisplay(DisplayMsg, threading.Thread):
             if case(MessageApi.SEARCH_STARTED):
                 EventHandler.write_to_clients({'event': 'Message', 'msg': 'Thinking..'})
                 break
+            if case(MessageApi.SEARCH_STOPPED):
+                if message.telemetry:  # the telemetry itself, get_telemetry takes the snapshot
+                    self.shared['telemetry'] = message.telemetry
+                break
+            if case(MessageApi.RESOURCE_USAGE):
+                self.shared['resources'] = message.sample
+                EventHandler.write_to_clients({'event': 'Resources', 'sample': message.sample})
+                break
             if case(MessageApi.SYSTEM_INFO):
                 self.shared['system_info'] = message.info
                 self.shared['system_info']['old_engine'] = self.shared['system_info']['engine_name']
@@ -248,6 +277,8 @@ class WebDisplay(DisplayMsg, threading.Thread):
             if case(MessageApi.ENGINE_READY):
                 self.create_system_info()
                 self.shared['system_info']['engine_name'] = message.engine_name
+                bench = message.eng['bench'].get('')
+                self.shared['system_info']['engine_knps'] = bench['nps'] // 1000 if bench else None
                 if not message.has_levels and 'level_text' in self.shared['game_info']:
                     del self.shared['game_info']['level_text']
                 update_headers()
@@ -324,6 +355,17 @@ class WebDisplay(DisplayMsg, threading.Thread):
                 self.shared['last_dgt_move_msg'] = result
                 EventHandler.write_to_clients(result)
                 break
+            if case(MessageApi.NEW_SCORE):
+                EventHandler.write_to_clients({'event': 'Score', 'score': str(message.score), 'mate': message.mate})
+                break
+            if case(MessageApi.NEW_PV):
+                EventHandler.write_to_clients({'event': 'PV', 'pv': san_line(message.fen, message.pv)})
+                break
+            if case(MessageApi.NEW_MULTIPV):
+                lines = [{'depth': depth, 'score': score, 'mate': mate, 'pv': san_line(message.fen, pv)}
+                         for depth, score, mate, pv in message.lines]
+                EventHandler.write_to_clients({'event': 'MultiPV', 'lines': lines})
+                break
             if case(MessageApi.GAME_ENDS):
                 if message.game.move_stack:
                     result = None
@@ -340,12 +382,34 @@ class WebDisplay(DisplayMsg, threading.Thread):
                 # print(message)
                 pass
 
+    def throttle(self, message):
+        """Hold back the score & pv messages, which come faster than the web clients need them."""
+        if message._type == MessageApi.NEW_SCORE:
+            return self.score_limiter.offer(message)
+        if message._type == MessageApi.NEW_PV:
+            return self.pv_limiter.offer(message)
+        if message._type == MessageApi.NEW_MULTIPV:
+            return self.multipv_limiter.offer(message)
+        return message
+
     def create_task(self, msg):
+        if msg is None:
+            return
         IOLoop.instance().add_callback(callback=lambda: self.task(msg))
 
     def run(self):
         logging.info('msg_queue ready')
         while True:
             # Check if we have something to display
-            message = self.msg_queue.get()
-            self.create_task(message)
+            try:
+                message = self.msg_queue.get(timeout=min_timeout(self.score_limiter, self.pv_limiter,
+                                                                 self.multipv_limiter))
+            except queue.Empty:
+                pass
+            else:
+                self.create_task(self.throttle(message))
+            # hand out the coalesced score & pv, which were held back by the rate limiters - other messages
+            # may come in steadily, so dont wait for an empty queue
+            self.create_task(self.score_limiter.poll())
+            self.create_task(self.pv_limiter.poll())
+            self.create_task(self.multipv_limiter.poll())
@@ -0,0 +1,336 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import time
+import threading
+from threading import Thread
+from engine import *
+from engineserver import Client, EngineServer, describe
+from timecontrol import TimeControl
+
+# the board of the picochess host itself
+SIMUL_LOCAL = 'local'
+# moves the remaining clock time of a blitz/fischer board is planned for
+SIMUL_MOVES_TO_GO = 30
+# secs kept back from each budget for the board switch and the move transfer
+SIMUL_MARGIN = 0.2
+# secs a board is searched before the engine turns to the next waiting board
+SIMUL_SLICE = 1.0
+# shortest search (secs) a board gets, even if its deadline is gone already
+SIMUL_MIN_SLICE = 0.1
+# times a failed search (no bestmove in time, engine died) is tried again before the board gets None
+SIMUL_RETRIES = 1
+# secs per move of a remote board searching without a time limit (depth, nodes)
+SIMUL_UNTIMED = 5
+
+
+def move_budget(tc, color):
+    """Secs the computer may take for its move under the time control."""
+    if tc.mode == TimeMode.FIXED:
+        return float(tc.seconds_per_move)
+    white, black = tc.current_clock_time()
+    remaining = white if color == chess.WHITE else black
+    budget = remaining / SIMUL_MOVES_TO_GO
+    if tc.mode == TimeMode.FISCHER:
+        budget += tc.fischer_increment
+    return max(0.0, min(budget, remaining - SIMUL_MARGIN))
+
+
+def uci_time_control(limits):
+    """The time control of a remote board from its go limits - its clock runs over there, only the times count."""
+    if 'wtime' in limits or 'btime' in limits:
+        inc = limits.get('winc', limits.get('binc', 0)) / 1000
+        tc = TimeControl(TimeMode.FISCHER if inc else TimeMode.BLITZ, fischer_increment=inc)
+        tc.set_clock_times(limits.get('wtime', 0) / 1000, limits.get('btime', 0) / 1000)
+        return tc
+    return TimeControl(TimeMode.FIXED, seconds_per_move=limits.get('movetime', SIMUL_UNTIMED * 1000) / 1000)
+
+
+class SimulBoard(object):
+    """One board of the simul: its position and the open think() request (if any)."""
+
+    def __init__(self, board_id, on_move):
+        super(SimulBoard, self).__init__()
+        self.board_id = board_id
+        self.on_move = on_move
+        self.game = None
+        self.requested = None  # monotonic time of the open request
+        self.deadline = None
+        self.budget = 0.0
+        self.searched = 0.0  # secs the engines spent on the open request
+        self.served = None  # monotonic time its last slice ended (or of the request)
+        self.best = None  # result of the last slice with a move
+        self.worker = None  # searching it right now
+        self.failures = 0  # failed searches in a row of the open request
+        self.moves = 0
+        self.slices = 0
+        self.late = 0
+
+
+class SimulWorker(Thread):
+    """Runs the slices of the simul on one engine."""
+
+    def __init__(self, simul, engine):
+        super(SimulWorker, self).__init__()
+        self.daemon = True
+        self.simul = simul
+        self.engine = engine
+        self.board = None  # searched right now
+        self.secs = 0.0  # planned length of the running slice
+        self.command = None
+        self.stop_future = None  # the next search waits for it, python-chess would stop that one too
+
+    def stop(self):
+        """Stop the running search without waiting - search() waits for it before the next one."""
+        try:
+            future = self.engine.get().stop(async_callback=True)
+        except chess.uci.EngineTerminatedException:
+            return
+        with self.simul.condition:
+            self.stop_future = future
+
+    def search(self, board, game, secs):
+        """The result of the search - None if the engine failed, its restarted then."""
+        with self.simul.condition:
+            stop_future, self.stop_future = self.stop_future, None
+        try:
+            if stop_future:
+                stop_future.result(STOP_TIMEOUT)
+            self.engine.position(game)
+            self.command = self.engine.get().go(movetime=int(secs * 1000), async_callback=True)
+            try:
+                return self.command.result(secs + STOP_TIMEOUT)
+            except FutureTimeout:
+                logging.warning('simul board %s: no bestmove in time - stopping the engine', board.board_id)
+                self.engine.get().stop(async_callback=True)
+                return self.command.result(STOP_TIMEOUT)  # late, but still a move
+        except FutureTimeout:
+            logging.error('simul engine hangs - restarting it')
+        except chess.uci.EngineTerminatedException:
+            logging.error('simul engine died - restarting it')
+        self.engine.restart(resume=False)
+        return None
+
+    def run(self):
+        while True:
+            board, game, requested, secs = self.simul.next_slice(self)
+            start = time.monotonic()
+            result = self.search(board, game, secs)
+            self.simul.slice_done(self, board, requested, result, time.monotonic() - start)
+
+
+class Simul(object):
+    """
+    The engines play the computer side of several boards. think() queues a request per board, the engines
+    search the boards in turns of slice_secs - the board waiting longest first, unless one cant wait another
+    slice without missing its deadline - and a board whose budget isnt used up goes back to the queue. So all
+    boards move on at the same time instead of one after the other, the engine hash keeps the work of their
+    earlier slices. A search which has the engine to itself gets the whole budget, but is interrupted once
+    another board waits. A board moves when its budget is used or its deadline comes - with less search, if
+    the engines have more boards than they can serve in time.
+    The clocks belong to the boards, the simul only reads the budget from them. on_move(board_id, result) of the
+    board gets the best move of its last slices - None if the engine failed to answer.
+    """
+
+    def __init__(self, engines, slice_secs=SIMUL_SLICE):
+        super(Simul, self).__init__()
+        self.slice_secs = slice_secs
+        self.boards = {}
+        self.condition = threading.Condition()
+        self.workers = [SimulWorker(self, engine) for engine in engines]
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def add_board(self, board_id, on_move):
+        with self.condition:
+            self.boards[board_id] = SimulBoard(board_id, on_move)
+
+    def remove_board(self, board_id):
+        self.cancel(board_id)
+        with self.condition:
+            self.boards.pop(board_id, None)
+
+    def think(self, board_id, game, tc):
+        """Queue a search for the board - an open request of the same board is replaced."""
+        with self.condition:
+            board = self.boards[board_id]
+            board.game = game.copy()
+            board.requested = time.monotonic()
+            board.budget = move_budget(tc, game.turn)
+            board.deadline = board.requested + board.budget
+            board.searched = 0.0
+            board.served = board.requested
+            board.best = None
+            board.failures = 0
+            worker = board.worker or self.preemptible()
+            self.condition.notify()
+        if worker:  # a takeback while the engine was at it - or a long search to interrupt
+            worker.stop()
+
+    def cancel(self, board_id):
+        """Drop the open request of the board, e.g. on a takeback or a new game."""
+        with self.condition:
+            board = self.boards.get(board_id)
+            if board is None:
+                return
+            board.requested = None
+            worker = board.worker
+        if worker:
+            worker.stop()
+
+    def waiting(self):
+        return [board for board in self.boards.values() if board.requested is not None and board.worker is None]
+
+    def preemptible(self):
+        """The worker to free for a new request: none if one is idle, else the one with the longest slice."""
+        if any(worker.board is None for worker in self.workers):
+            return None
+        worker = max(self.workers, key=lambda wrk: wrk.secs)
+        return worker if worker.secs > self.slice_secs else None
+
+    def next_slice(self, worker):
+        """Wait for the next board - returns it, its request and the secs its slice may take."""
+        with self.condition:
+            while not self.waiting():
+                self.condition.wait()
+            waiting = self.waiting()
+            now = time.monotonic()
+            # a board whose deadline comes before the others had their slices goes first
+            others = self.slice_secs * (len(waiting) - 1)
+            urgent = [brd for brd in waiting if brd.deadline - now - SIMUL_MARGIN < others]
+            if urgent:
+                board = min(urgent, key=lambda brd: brd.deadline)
+            else:
+                board = min(waiting, key=lambda brd: brd.served)
+            secs = min(board.budget - board.searched, board.deadline - now - SIMUL_MARGIN)
+            if len(waiting) > 1:
+                secs = min(secs, self.slice_secs)
+            board.worker = worker
+            worker.board = board
+            worker.secs = max(SIMUL_MIN_SLICE, secs)
+            return board, board.game, board.requested, worker.secs
+
+    def slice_done(self, worker, board, requested, result, secs):
+        """Book the slice - the board moves once its budget is used, else it waits for its next slice."""
+        with self.condition:
+            worker.board = None
+            worker.secs = 0.0
+            board.worker = None
+            board.served = time.monotonic()
+            self.condition.notify()
+            if board.requested != requested:
+                logging.debug('simul board %s: request changed meanwhile - result dropped', board.board_id)
+                return
+            board.slices += 1
+            board.searched += secs
+            if result and result.bestmove:
+                board.best = result
+            done = board.searched >= board.budget - SIMUL_MIN_SLICE or \
+                time.monotonic() >= board.deadline - SIMUL_MARGIN
+            if result is None or (done and board.best is None):
+                board.failures += 1
+                if board.failures <= SIMUL_RETRIES:
+                    logging.warning('simul board %s: search failed - queued again', board.board_id)
+                    return
+            elif not done:
+                return
+            result = board.best
+            board.requested = None
+            board.moves += 1
+            now = time.monotonic()
+            if now > board.deadline:
+                board.late += 1
+                logging.info('simul board %s: reply %.1f secs late', board.board_id, now - board.deadline)
+        if result:
+            logging.debug('simul board %s: %s after %.1f secs', board.board_id, result.bestmove, now - requested)
+        else:
+            logging.error('simul board %s: no move after %i tries', board.board_id, SIMUL_RETRIES + 1)
+        board.on_move(board.board_id, result)
+
+    def get_metrics(self):
+        with self.condition:
+            return {board.board_id: {'moves': board.moves, 'slices': board.slices, 'late': board.late,
+                                     'waiting': board.requested is not None} for board in self.boards.values()}
+
+
+class SimulHost(object):
+    """
+    The scheduler of an EngineServer (see engineserver.py) whose sessions are boards of the simul - other picochess
+    boards connect with engine-server = <host>:<simul port>. Whatever engine they ask for, they play the one of the
+    simul (and their setoptions dont change it). Analysis (go infinite) isnt served, its stop gets bestmove 0000.
+    """
+
+    def __init__(self, simul, description):
+        super(SimulHost, self).__init__()
+        self.simul = simul
+        self.description = description
+        self.engine_path = ''
+        self.lock = threading.Lock()
+        self.held = {}  # session: board, limits of a ponder search - it starts on ponderhit
+
+    def client(self, client_id, priority):
+        return Client(client_id, priority)
+
+    def describe(self, file):
+        return self.description
+
+    def on_move(self, session, result):
+        if result:
+            ponder = ' ponder {}'.format(result.ponder.uci()) if result.ponder else ''
+            session.send('bestmove {}{}'.format(result.bestmove.uci(), ponder))
+        else:
+            session.send('bestmove 0000')
+
+    def submit(self, session, board, limits, newgame):
+        with self.lock:
+            if session not in self.simul.boards:
+                self.simul.add_board(session, lambda board_id, result: self.on_move(session, result))
+            if limits.get('ponder') or limits.get('infinite'):
+                self.held[session] = board, limits
+                return
+        self.simul.think(session, board, uci_time_control(limits))
+
+    def ponderhit(self, session):
+        with self.lock:
+            board, limits = self.held.pop(session, (None, None))
+        if board and not limits.get('infinite'):
+            self.simul.think(session, board, uci_time_control(limits))
+
+    def stop(self, session):
+        """The end of a search - or of the session. A running search is dropped without a move."""
+        with self.lock:
+            held = self.held.pop(session, None)
+            board = self.simul.boards.get(session)
+            searching = board is not None and board.requested is not None
+            self.simul.remove_board(session)  # the next go adds it again
+        if held or searching:
+            session.send('bestmove 0000')
+
+
+def open_simul(engines, local_move, port, bind):
+    """Start the simul on the engines with the local board, and serve it to other boards on the port."""
+    simul = Simul(engines)
+    simul.add_board(SIMUL_LOCAL, local_move)
+    simul.start()
+    if port:
+        server = EngineServer((bind, port), SimulHost(simul, describe(engines[0])))
+        Thread(target=server.serve_forever, daemon=True).start()
+        logging.info('simul served on %s:%i', bind, port)
+    return simul
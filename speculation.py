@@ -0,0 +1,249 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import time
+from threading import Thread, Lock
+from engine import *
+
+# hash (MB) of each speculating engine
+SPECULATION_HASH = 16
+# msecs a speculative search may take at most
+SPECULATION_TIME = 5000
+
+
+class Speculation(object):
+    """
+    While the user thinks, search the computers answer to the likely user replies - each reply single threaded
+    on a spare core, with a small hash and a time limit. If the user plays one of them, take() returns the
+    answer. Its only played as it is if the game engine would have searched with the same options and time,
+    else its a first hint for the real search. The engines are spawned in the background, SPECULATION_READY
+    tells when they are in.
+    """
+
+    def __init__(self, engine_file, hash_mb=SPECULATION_HASH, movetime=SPECULATION_TIME):
+        super(Speculation, self).__init__()
+        self.engine_file = engine_file
+        self.hash_mb = hash_mb
+        self.movetime = movetime
+        self.lock = Lock()  # the spawn thread adds to the engines
+        self.engines = []
+        self.spawner = None
+        self.closed = False
+        self.options = {}  # engine => options last sent
+        self.searches = {}  # fen after the reply => (reply, engine, future, options, limits)
+        self.stopping = {}  # engine => (stop time, futures) of its stopped search - it takes no new one meanwhile
+        self.request = None  # arguments of the last start() - resume() gives the replies left to new engines
+        self.covered = None  # the reply the ponder search of the game engine has
+        self.hits = 0
+        self.ponder_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def candidates(game, moves, bookreader, count):
+        """The likely replies: the given ones (ponder move, other engine lines) first, then the book moves."""
+        replies = []
+        try:
+            book = [entry.move() for entry in sorted(bookreader.find_all(game), key=lambda entry: -entry.weight)]
+        except (IndexError, OSError):
+            book = []
+        for move in list(moves) + book:
+            if move and move not in replies and move in game.legal_moves:
+                replies.append(move)
+        return replies[:count]
+
+    def open(self, count):
+        """Spawn engines till there are count of them - in the background, the event loop doesnt wait."""
+        with self.lock:
+            if self.closed or len(self.engines) >= count or (self.spawner and self.spawner.is_alive()):
+                return
+            self.spawner = Thread(target=self.spawn, args=(count,), daemon=True)
+            self.spawner.start()
+
+    def spawn(self, count):
+        added = 0
+        while len(self.engines) < count and not self.closed:
+            engine = UciEngine(self.engine_file, timeout=PROBE_TIMEOUT, handler=silent_informer())
+            if not EnginePool.is_alive(engine):
+                logging.warning('speculation engine [%s] didnt start', self.engine_file)
+                break
+            with self.lock:
+                closed = self.closed
+                if not closed:
+                    self.engines.append(engine)
+                    added += 1
+            if closed:
+                EnginePool.shutdown(engine)
+                return
+        if added:
+            Observable.fire(Event.SPECULATION_READY(engines=len(self.engines)))
+
+    def is_idle(self, engine):
+        """True if the last search of the engine is over. One which doesnt stop in time is shutdown."""
+        if engine not in self.stopping:
+            return True
+        since, futures = self.stopping[engine]
+        if all(future.done() for future in futures):
+            del self.stopping[engine]
+            return True
+        if time.monotonic() - since > STOP_TIMEOUT:
+            logging.warning('speculation engine [%s] didnt stop', engine.get_file())
+            del self.stopping[engine]
+            with self.lock:
+                self.engines.remove(engine)
+            self.options.pop(engine, None)
+            Thread(target=EnginePool.shutdown, args=(engine,), daemon=True).start()
+        return False
+
+    def speculative_options(self, engine, options):
+        """Same level as the game engine, but single threaded and with the small hash."""
+        options = dict(options)
+        if 'Threads' in engine.get().options:
+            options['Threads'] = '1'
+        if 'Hash' in engine.get().options:
+            options['Hash'] = str(self.hash_mb)
+        return options
+
+    def prepare(self, engine, options, core):
+        if self.options.get(engine) != options:
+            engine.level(options)
+            engine.send()
+            self.options[engine] = options
+        try:
+            os.sched_setaffinity(engine.get_pid(), {core})
+        except (AttributeError, OSError, TypeError):
+            logging.debug('cant pin speculation engine to core %i', core)
+
+    def start(self, game, replies, cores, options, limits, covered=None):
+        """
+        Search the answers to the replies (at most one per core) with the options of the game engine.
+        covered is the reply the ponder search of the game engine has.
+        Searches of a former start() on the same replies and limits go on, the others are stopped.
+        """
+        limits = dict(limits)
+        limits['movetime'] = str(min(int(limits.get('movetime', self.movetime)), self.movetime))
+        replies = replies[:len(cores)]
+        self.request = (game.copy(), replies, cores, options, limits, covered)
+        self.covered = covered
+        self.open(len(replies))
+        fens = {}
+        for reply in replies:
+            game.push(reply)
+            fens[game.fen()] = reply
+            game.pop()
+        kept = {fen: search for fen, search in self.searches.items()
+                if fen in fens and search[3] == self.speculative_options(search[1], options) and search[4] == limits}
+        self.stop(keep=kept)
+        self.searches = kept
+        busy = [search[1] for search in kept.values()]
+        with self.lock:
+            free = [(engine, core) for engine, core in zip(self.engines, cores) if engine not in busy]
+        for fen, reply in fens.items():
+            if fen in self.searches:
+                continue
+            engine = None
+            while free and engine is None:
+                engine, core = free.pop(0)
+                if not self.is_idle(engine):
+                    logging.debug('speculation engine still stopping - no search on %s', reply)
+                    engine = None
+            if engine is None:
+                break  # more come with SPECULATION_READY
+            engine_options = self.speculative_options(engine, options)
+            self.prepare(engine, engine_options, core)
+            game.push(reply)
+            try:
+                engine.position(game)
+                future = engine.get().go(async_callback=True, **limits)
+                self.searches[game.fen()] = (reply, engine, future, engine_options, limits)
+            finally:
+                game.pop()
+        logging.debug('speculating on %s', [search[0].uci() for search in self.searches.values()])
+
+    def resume(self):
+        """New engines are in - give them the replies of the last start() nobody searches yet."""
+        if self.request:
+            self.start(*self.request)
+
+    @staticmethod
+    def same_time(limits, other, color):
+        """True if the limits give the side to move the same time - the other side's clock doesnt matter."""
+        keys = ('movetime', 'wtime', 'winc') if color == chess.WHITE else ('movetime', 'btime', 'binc')
+        return all(limits.get(key) == other.get(key) for key in keys)
+
+    def take(self, game, options, limits):
+        """
+        The answer (a SearchResult) if the user played one of the replies, else None. Its complete only if
+        it was searched with the options and limits the game engine would use now. Ends all speculative searches.
+        """
+        if not self.searches and self.covered is None:
+            return None
+        search = self.searches.get(game.fen())
+        result = None
+        if search and search[2].done():
+            try:
+                result = search[2].result()
+            except chess.uci.EngineTerminatedException:
+                logging.warning('speculation engine died')
+        answer = None
+        if game.move_stack and game.peek() == self.covered:
+            self.ponder_hits += 1  # the ponder search of the game engine has it
+        elif result and result.bestmove:
+            self.hits += 1
+            reply, engine, future, engine_options, engine_limits = search
+            depth, score, mate, pv = engine.handler.multipv_table.best() or (0, None, None, [result.bestmove])
+            if not pv or pv[0] != result.bestmove:  # the engine didnt tell its line
+                depth, score, mate, pv = 0, None, None, [result.bestmove]
+            complete = engine_options == options and self.same_time(engine_limits, limits, game.turn)
+            answer = SearchResult(result.bestmove, result.ponder, score, mate, depth or 0, pv, complete)
+        else:
+            self.misses += 1
+        logging.info('speculation %s - %s', 'hit' if answer else 'miss', self.get_metrics())
+        self.stop()
+        return answer
+
+    def stop(self, keep=None):
+        """Stop the searches (but the ones to keep) without waiting for their bestmoves - see is_idle()."""
+        for fen, (reply, engine, future, _, _) in self.searches.items():
+            if future.done() or (keep and fen in keep):
+                continue
+            try:
+                self.stopping[engine] = (time.monotonic(), (future, engine.get().stop(async_callback=True)))
+            except chess.uci.EngineTerminatedException:
+                logging.warning('speculation engine [%s] died', engine.get_file())
+                self.stopping[engine] = (time.monotonic(), (future,))
+        self.searches = {}
+        if keep is None:
+            self.request = None
+            self.covered = None
+
+    def get_metrics(self):
+        hits = self.hits + self.ponder_hits
+        total = hits + self.misses
+        return {'hits': hits, 'ponder_hits': self.ponder_hits, 'misses': self.misses,
+                'hit_rate': round(hits / total, 3) if total else None}
+
+    def close(self):
+        self.stop()
+        with self.lock:
+            self.closed = True  # engines still coming up are shutdown by spawn()
+            engines, self.engines = self.engines, []
+        for engine in engines:
+            Thread(target=EnginePool.shutdown, args=(engine,), daemon=True).start()
+        self.options = {}
+        self.stopping = {}
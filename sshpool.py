@@ -0,0 +1,131 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import time
+import spur
+import paramiko
+from threading import Thread, Lock
+from collections import deque
+
+# secs between two keepalive/latency probes of a session
+PROBE_INTERVAL = 15
+# how many round trip samples are used for the latency estimate
+RTT_SAMPLES = 8
+
+
+class SshSession(object):
+    """A ssh connection to a host together with the measured round trips of its engine."""
+
+    def __init__(self, shell):
+        super(SshSession, self).__init__()
+        self.shell = shell
+        self.rtts = deque(maxlen=RTT_SAMPLES)
+        self.failures = 0
+        self.ping = None  # returns the secs of one line to the engine and back (None if it cant tell now)
+
+    def add_rtt(self, rtt):
+        self.rtts.append(rtt)
+
+    def probe(self):
+        """Run a no-op on the host to keep the connection alive, then time a line round trip to the engine."""
+        self.shell.run(['true'])  # spawns a remote process - much slower than a line, so it isnt timed
+        rtt = self.ping() if self.ping else None
+        if rtt is not None:
+            self.add_rtt(rtt)
+        return rtt
+
+    def latency(self):
+        """The median round trip - a single slow probe shouldnt eat into the engine time."""
+        if not self.rtts:
+            return 0
+        return sorted(self.rtts)[len(self.rtts) // 2]
+
+
+class SshPool(Thread):
+    """
+    Keeps one ssh session per (host, user) open for engine spawns and file reads.
+    A background thread probes the sessions, so they dont time out and their latency is known.
+    """
+
+    def __init__(self, interval=PROBE_INTERVAL):
+        super(SshPool, self).__init__()
+        self.daemon = True
+        self.interval = interval
+        self.sessions = {}
+        self.lock = Lock()
+
+    @staticmethod
+    def _connect(hostname, username, key_file, password):
+        logging.info("connecting to [%s]", hostname)
+        if key_file:
+            return spur.SshShell(hostname=hostname, username=username, private_key_file=key_file,
+                                 missing_host_key=paramiko.AutoAddPolicy())
+        return spur.SshShell(hostname=hostname, username=username, password=password,
+                             missing_host_key=paramiko.AutoAddPolicy())
+
+    def shell(self, hostname, username=None, key_file=None, password=None):
+        """Return the pooled shell of the host, connecting first if there is none (or it broke)."""
+        with self.lock:
+            session = self.sessions.get((hostname, username))
+            if session is None:
+                session = SshSession(self._connect(hostname, username, key_file, password))
+                self.sessions[(hostname, username)] = session
+                if not self.is_alive():
+                    self.start()
+            else:
+                logging.debug('reusing ssh session to [%s]', hostname)
+            return session.shell
+
+    def latency(self, hostname, username=None):
+        with self.lock:
+            session = self.sessions.get((hostname, username))
+        return session.latency() if session else 0
+
+    def watch(self, hostname, username, ping, rtt=None):
+        """Let the probes of the host time ping() - the engine isready/readyok. rtt is a first sample."""
+        with self.lock:
+            session = self.sessions.get((hostname, username))
+        if session:
+            session.ping = ping
+            if rtt is not None:
+                session.add_rtt(rtt)
+
+    def probe(self, key, session):
+        try:
+            rtt = session.probe()
+            session.failures = 0
+            if rtt is not None:
+                logging.debug('ssh [%s] rtt %.1fms (median %.1fms)', key[0], rtt * 1000, session.latency() * 1000)
+        except (spur.ssh.ConnectionError, paramiko.SSHException, OSError, EOFError):
+            session.failures += 1
+            logging.warning('ssh [%s] probe failed (%i in a row)', key[0], session.failures)
+            if session.failures >= 2:
+                with self.lock:
+                    if self.sessions.get(key) is session:
+                        del self.sessions[key]  # the next shell() call connects again
+
+    def run(self):
+        while True:
+            with self.lock:
+                sessions = list(self.sessions.items())
+            for key, session in sessions:
+                self.probe(key, session)
+            time.sleep(self.interval)
+
+
+ssh_pool = SshPool()
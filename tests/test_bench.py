@@ -0,0 +1,107 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import stat
+import sys
+import bench_epd
+from engine import UciEngine, default_options
+from hostprofile import host_profile
+from utilities import evt_queue
+
+# has a Skill Level, its default is the full strength
+SKILL_ENGINE = """import sys
+for line in sys.stdin:
+    line = line.strip()
+    if line == 'uci':
+        print('id name Skilled\\noption name Skill Level type spin default 20 min 0 max 20\\nuciok', flush=True)
+    elif line == 'isready':
+        print('readyok', flush=True)
+    elif line == 'quit':
+        break
+"""
+
+
+def test_full_strength_is_the_engine_default_not_the_last_uci_level(tmp_path):
+    path = tmp_path / 'skilled'
+    path.write_text('#!{}\n{}'.format(sys.executable, SKILL_ENGINE))
+    os.chmod(str(path), os.stat(str(path)).st_mode | stat.S_IEXEC)
+    (tmp_path / 'skilled.uci').write_text('[Level@00]\nSkill Level = 0\n[Level@05]\nSkill Level = 5\n')
+    engine = UciEngine(str(path), timeout=5)
+    try:
+        levels = {'Level@00': {'Skill Level': '0'}, 'Level@05': {'Skill Level': '5', 'Unknown': '1'}}
+        options = default_options(engine.get(), levels)
+        assert options == {'Skill Level': '20'}
+        engine.startup(options, False)
+        assert engine.options['Skill Level'] == '20' and engine.level_name == ''
+    finally:
+        engine.kill()
+
+# logs what it gets, finds 1.e4 at once
+EPD_ENGINE = """import sys
+log = open({log!r}, 'a')
+for line in sys.stdin:
+    line = line.strip()
+    log.write(line + '\\n')
+    log.flush()
+    if line == 'uci':
+        print('id name Epd\\noption name Hash type spin default 16 min 1 max 1024\\n'
+              'option name Skill Level type spin default 20 min 0 max 20\\nuciok', flush=True)
+    elif line == 'isready':
+        print('readyok', flush=True)
+    elif line.startswith('go'):
+        print('info depth 3 nodes 100 pv e2e4\\nbestmove e2e4', flush=True)
+    elif line == 'quit':
+        break
+"""
+
+
+def test_epd_worker_keeps_one_engine_for_all_levels(tmp_path, monkeypatch):
+    log = tmp_path / 'epd.log'
+    path = tmp_path / 'epd'
+    path.write_text('#!{}\n{}'.format(sys.executable, EPD_ENGINE.format(log=str(log))))
+    os.chmod(str(path), os.stat(str(path)).st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(bench_epd, 'engines', {})
+    for name in ('threads', 'hash_mb', 'reserved_cores', 'engines', 'memory'):  # configure() changes them
+        monkeypatch.setattr(host_profile, name, getattr(host_profile, name))
+    monkeypatch.setattr(host_profile, 'memory', 256)
+    while not evt_queue.empty():
+        evt_queue.get()
+    levels = {'Level@05': {'Skill Level': '5'}}
+    epd = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - bm e4; id "start";'
+    try:
+        first = bench_epd.solve(str(path), 'Level@05', levels, 'a', epd, 100, sharing=4)
+        second = bench_epd.solve(str(path), '', levels, 'b', epd, 100, sharing=4)
+        assert first['solved'] and second['solved'] and first['depth'] == 3
+        assert list(bench_epd.engines) == [str(path)]  # the level changed, the process stayed
+        assert bench_epd.engines[str(path)].level_name == ''
+        lines = log.read_text().splitlines()
+        assert lines.count('uci') == 1
+        assert 'setoption name Hash value 16' in lines  # 256 MB * 0.25 split among 4 engines
+        skill = [line for line in lines if line.startswith('setoption name Skill Level')]
+        assert skill == ['setoption name Skill Level value 5', 'setoption name Skill Level value 20']
+        assert evt_queue.empty()  # the silent informer keeps the info lines out of the event queue
+    finally:
+        for engine in bench_epd.engines.values():
+            engine.kill()
+
+
+def test_bench_scripts_dont_run_on_import():
+    import bench_engines
+    import bench_position
+    assert callable(bench_engines.main) and callable(bench_position.main)
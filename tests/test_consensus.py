@@ -0,0 +1,72 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import chess
+import utilities
+from hostprofile import HostProfile
+from kibitz import Consensus
+
+E4, D4 = chess.Move.from_uci('e2e4'), chess.Move.from_uci('d2d4')
+
+
+def drain():
+    events = []
+    while not utilities.evt_queue.empty():
+        events.append(utilities.evt_queue.get())
+    return events
+
+
+def test_merge_takes_the_deep_vote_and_the_median_score():
+    consensus = Consensus(interval=0)
+    consensus.update('a', 10, (30, None), [E4])
+    consensus.update('b', 12, (10, None), [D4, E4])
+    consensus.update('c', 11, (20, None), [E4, D4])
+    assert consensus.merge() == (20, None, [E4, D4])  # the pv of the deepest engine for the move
+    assert consensus.lines() == [(10, 30, None, [E4]), (12, 10, None, [D4, E4]), (11, 20, None, [E4, D4])]
+
+
+def test_each_engine_line_reaches_the_displays():
+    drain()
+    consensus = Consensus(interval=0)
+    consensus.update('b', 5, (10, None), [D4])
+    consensus.update('a', 6, None, [E4])
+    lines = [event.lines for event in drain() if repr(event) == utilities.EventApi.NEW_MULTIPV]
+    assert lines == [[(5, 10, None, [D4])], [(6, None, None, [E4]), (5, 10, None, [D4])]]
+
+
+def test_flush_delivers_the_held_back_values():
+    drain()
+    consensus = Consensus(interval=60)
+    consensus.update('a', 1, (10, None), [E4])
+    consensus.update('a', 2, (15, None), [D4])
+    assert len(drain()) == 3  # score, pv and lines of the first update
+    consensus.flush()
+    events = drain()
+    assert [event.pv for event in events if repr(event) == utilities.EventApi.NEW_PV] == [[D4]]
+    assert [event.lines for event in events if repr(event) == utilities.EventApi.NEW_MULTIPV] == [[(2, 15, None, [D4])]]
+    consensus.flush()
+    assert drain() == []
+
+
+def test_extra_engines_share_the_hash():
+    profile = HostProfile()
+    profile.memory = 256  # below the hash cap
+    profile.configure(engines=1)
+    assert profile.options({'Hash': ('Hash', 'spin', 16, 1, 65536)}) == {'Hash': '64'}
+    assert profile.options({'Hash': ('Hash', 'spin', 16, 1, 65536), 'Threads': ('Threads', 'spin', 1, 1, 8)},
+                           threads=1, engines=4) == {'Hash': '16', 'Threads': '1'}
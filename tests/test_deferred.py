@@ -0,0 +1,76 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import stat
+import sys
+import time
+import chess
+from engine import UciEngine
+
+# searches till it gets a stop, then takes a while for the bestmove
+SLOW_STOPPING_ENGINE = """import sys, time
+for line in sys.stdin:
+    line = line.strip()
+    if line == 'uci':
+        print('id name Slow\\nuciok', flush=True)
+    elif line == 'isready':
+        print('readyok', flush=True)
+    elif line == 'stop':
+        time.sleep(0.3)
+        print('bestmove e2e4', flush=True)
+    elif line == 'quit':
+        break
+"""
+
+
+def slow_engine(tmp_path):
+    path = tmp_path / 'slow'
+    path.write_text('#!{}\n{}'.format(sys.executable, SLOW_STOPPING_ENGINE))
+    os.chmod(str(path), os.stat(str(path)).st_mode | stat.S_IEXEC)
+    return UciEngine(str(path), timeout=5)
+
+
+def wait_for(condition, secs=5):
+    end = time.monotonic() + secs
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_commands_wait_for_the_stop_and_run_after_it(tmp_path):
+    engine = slow_engine(tmp_path)
+    try:
+        engine.position(chess.Board())
+        engine.go({'wtime': 60000, 'btime': 60000})
+        assert not engine.wait_ready(0)
+        engine.stop()
+        assert engine.is_stopping() and not engine.wait_ready(0)  # the bestmove isnt in yet
+        after = chess.Board()
+        after.push_uci('e2e4')
+        engine.position(after)
+        assert engine.go({'wtime': 60000, 'btime': 60000}) is None
+        assert len(engine.pending) == 2 and engine.mirror.board.fen() == chess.Board().fen()
+        assert wait_for(lambda: not engine.pending and engine.is_thinking())
+        assert engine.mirror.board.fen() == after.fen()
+        engine.stop()
+        assert engine.wait_ready(5) and engine.is_waiting()
+    finally:
+        engine.kill()
@@ -0,0 +1,32 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+from dgttranslate import DgtTranslate
+
+
+def speed(knps):
+    text = DgtTranslate('none', 0, 'en').text('B00_speed', str(knps))
+    return text.l, text.m, text.s
+
+
+def test_speed_fits_the_clock_displays():
+    assert speed(850) == ('  850 knps', ' 850knps', ' 850kn')
+    assert speed(12345) == ('12345 knps', '  12Mnps', '  12Mn')
+    for knps in (1, 99999, 123456, 98765432):
+        large, medium, small = speed(knps)
+        assert len(large) <= 11 and len(medium) <= 8 and len(small) <= 6
@@ -0,0 +1,54 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from engine import EngineCatalog
+
+ENGINES_INI = """[stockfish]
+name = Stockfish
+small = stockf
+medium = Stockfis
+large = Stockfish
+"""
+
+
+def write_catalog(path, levels):
+    (path / 'engines.ini').write_text(ENGINES_INI)
+    (path / 'stockfish.uci').write_text(''.join('[{}]\nSkill Level = {}\n'.format(name, skill)
+                                                for name, skill in levels))
+
+
+def test_catalog_is_parsed_once(tmp_path):
+    write_catalog(tmp_path, [('Level@00', 0)])
+    catalog = EngineCatalog()
+    first = catalog.get(None, str(tmp_path))
+    assert first[0]['name'] == 'Stockfish'
+    assert catalog.get(None, str(tmp_path)) is first
+
+
+def test_changed_level_file_is_read_again(tmp_path):
+    write_catalog(tmp_path, [('Level@00', 0)])
+    catalog = EngineCatalog()
+    first = catalog.get(None, str(tmp_path))
+    write_catalog(tmp_path, [('Level@00', 0), ('Level@01', 1)])
+    uci_file = tmp_path / 'stockfish.uci'
+    mtime = os.stat(str(uci_file)).st_mtime_ns + 10 ** 9  # a filesystem with a coarse clock
+    os.utime(str(uci_file), ns=(mtime, mtime))
+    second = catalog.get(None, str(tmp_path))
+    assert second is not first
+    assert catalog.level(None, str(tmp_path / 'stockfish'), 'Level@01') == {'Skill Level': '1'}
+    assert catalog.level(None, str(tmp_path / 'stockfish'), 'Level@09') == {}
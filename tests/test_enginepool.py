@@ -0,0 +1,113 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import queue
+import threading
+import engine
+from engine import EnginePool
+from utilities import EventApi, Event
+
+
+class FakeProcess(object):
+    def __init__(self, alive=True, name='Fake'):
+        self.alive = alive
+        self.name = name
+
+    def is_alive(self):
+        return self.alive
+
+
+class FakeEngine(object):
+    def __init__(self, file, alive=True, waiting=True, ready=True):
+        self.file = file
+        self.engine = FakeProcess(alive)
+        self.waiting = waiting
+        self.ready = ready
+
+    def get(self):
+        return self.engine
+
+    def get_file(self):
+        return self.file
+
+    def is_waiting(self):
+        return self.waiting
+
+    def wait_ready(self, timeout=None):
+        return self.ready
+
+
+def test_is_alive_checks_the_process():
+    assert EnginePool.is_alive(FakeEngine('a'))
+    assert not EnginePool.is_alive(FakeEngine('a', alive=False))
+    dead = FakeEngine('a')
+    dead.engine = None
+    assert not EnginePool.is_alive(dead)
+
+
+def test_release_keeps_the_recently_used(monkeypatch):
+    pool = EnginePool(size=2)
+    gone = []
+    monkeypatch.setattr(pool, 'teardown', gone.append)
+    first, second, third = FakeEngine('a'), FakeEngine('b'), FakeEngine('c')
+    for eng in (first, second, third):
+        pool.release(eng)
+    assert list(pool.idle) == ['b', 'c']
+    assert gone == [first]
+
+
+def test_release_waits_for_a_stopping_engine(monkeypatch):
+    pool = EnginePool(size=1)
+    kept = []
+    done = threading.Event()
+
+    def keep_when_ready(eng):
+        kept.append(eng)
+        done.set()
+
+    monkeypatch.setattr(pool, 'keep_when_ready', keep_when_ready)
+    stopping = FakeEngine('a', waiting=False)
+    pool.release(stopping)
+    assert not pool.idle  # not before its stopped
+    assert done.wait(1)
+    assert kept == [stopping]
+
+
+def test_engine_which_doesnt_stop_isnt_kept(monkeypatch):
+    pool = EnginePool(size=1)
+    gone = []
+    monkeypatch.setattr(EnginePool, 'shutdown', staticmethod(gone.append))
+    hanging = FakeEngine('a', waiting=False, ready=False)
+    pool.keep_when_ready(hanging)
+    assert gone == [hanging]
+    assert not pool.idle
+
+
+def test_warm_engine_is_handed_over_at_once(monkeypatch):
+    events = queue.Queue()
+    monkeypatch.setattr(engine.Observable, 'fire', staticmethod(events.put))
+    pool = EnginePool(size=1)
+    warm = FakeEngine('a')
+    pool.keep(warm)
+    request = Event.NEW_ENGINE(eng={'file': 'a'}, eng_text=None, options={}, ok_text=False)
+    pool.acquire(request)
+    spawned = events.get_nowait()
+    assert repr(spawned) == EventApi.ENGINE_SPAWNED
+    assert spawned.engine is warm and spawned.request is request
+    pool.switched(spawned.start)
+    metrics = pool.get_metrics()
+    assert metrics['warm'] == 1 and metrics['cold'] == 0 and metrics['switch_last'] is not None
@@ -0,0 +1,113 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import socket
+import stat
+import sys
+import threading
+import chess
+from engine import UciEngine
+from engineserver import parse_go, parse_position, Client, Job, Scheduler, EngineServer
+
+# answers each go at once
+QUICK_ENGINE = """import sys
+for line in sys.stdin:
+    line = line.strip()
+    if line == 'uci':
+        print('id name Quick\\nuciok', flush=True)
+    elif line == 'isready':
+        print('readyok', flush=True)
+    elif line.startswith('go'):
+        print('info depth 1 score cp 12 pv e2e4', flush=True)
+        print('bestmove e2e4', flush=True)
+    elif line == 'quit':
+        break
+"""
+
+
+class FakeSession(object):
+    def __init__(self, client):
+        self.client = client
+        self.file = 'engine'
+        self.options = {}
+
+
+def test_parse_position():
+    assert parse_position('position startpos').fen() == chess.STARTING_FEN
+    board = parse_position('position startpos moves e2e4 e7e5')
+    assert board.fen() == 'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2'
+    fen = '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1'
+    board = parse_position('position fen {} moves b4b1'.format(fen))
+    assert board.fen() == '8/2p5/3p4/KP5r/5p1k/8/4P1P1/1R6 b - - 1 1'
+
+
+def test_parse_go():
+    assert parse_go('go wtime 1000 btime 2000 winc 10 binc 20 movestogo 5') == \
+        {'wtime': 1000, 'btime': 2000, 'winc': 10, 'binc': 20, 'movestogo': 5}
+    assert parse_go('go ponder infinite') == {'ponder': True, 'infinite': True}
+    assert parse_go('go searchmoves e2e4 d2d4 movetime 100') == \
+        {'searchmoves': [chess.Move.from_uci('e2e4'), chess.Move.from_uci('d2d4')], 'movetime': 100}
+
+
+def test_rank_prefers_priority_then_less_usage():
+    scheduler = Scheduler('.', quota=30)
+    busy, idle, vip, hog = Client('busy'), Client('idle'), Client('vip', priority=1), Client('hog')
+    busy.charge(10)
+    vip.charge(20)
+    hog.charge(100)
+    clients = (hog, busy, idle, vip)
+    jobs = [Job(FakeSession(client), chess.Board(), {}, False, seq) for seq, client in enumerate(clients)]
+    ranked = sorted(jobs, key=scheduler.rank)
+    assert [job.client.client_id for job in ranked] == ['vip', 'idle', 'busy', 'hog']
+
+
+def test_searches_through_the_server(tmp_path):
+    path = tmp_path / 'quick'
+    path.write_text('#!{}\n{}'.format(sys.executable, QUICK_ENGINE))
+    os.chmod(str(path), os.stat(str(path)).st_mode | stat.S_IEXEC)
+    scheduler = Scheduler(str(tmp_path), pool_size=1)
+    scheduler.start()
+    server = EngineServer(('127.0.0.1', 0), scheduler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        engine = UciEngine('quick', server='127.0.0.1:{}'.format(server.server_address[1]), timeout=5)
+        assert engine.get().name == 'Quick'
+        for _ in range(3):  # each bestmove frees the slot for the next search
+            engine.position(chess.Board())
+            command = engine.get().go(movetime=10, async_callback=True)
+            assert command.result(5).bestmove == chess.Move.from_uci('e2e4')
+        engine.kill()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_invalid_priority_gets_an_error(tmp_path):
+    scheduler = Scheduler(str(tmp_path), pool_size=1)
+    server = EngineServer(('127.0.0.1', 0), scheduler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with socket.create_connection(server.server_address, timeout=5) as connection:
+            connection.sendall(b'picochess quick board1 high\n')
+            reply = connection.makefile('rb').readline()
+        assert reply.startswith(b'error invalid priority')
+        assert not scheduler.clients  # the session ended without a client
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,105 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import time
+from concurrent.futures import Future
+import engine
+from engine import RemoteFailover
+
+
+class FakeProcess(object):
+    def __init__(self, answer=True):
+        self.answer = answer
+        self.isready_calls = 0
+
+    def is_alive(self):
+        return True
+
+    def isready(self, async_callback=None):
+        self.isready_calls += 1
+        future = Future()
+        if self.answer:
+            future.set_result(None)
+        return future
+
+
+class FakeRemote(object):
+    def __init__(self, answer):
+        self.engine = FakeProcess(answer)
+        self.restarts = 0
+        self.options = None
+
+    def get(self):
+        return self.engine
+
+    def restart(self, resume=True):
+        self.restarts += 1
+        self.engine = FakeProcess()
+        return True
+
+    def startup(self, options, show=True, level_name=''):
+        if self.engine is None:
+            raise AttributeError('no engine')
+        self.options = options
+        self.level_name = level_name
+
+    def level(self, options, level_name=''):
+        self.options = options
+        self.level_name = level_name
+
+
+def test_recover_waits_for_one_isready_at_a_time():
+    remote = FakeRemote(answer=False)
+    failover = RemoteFailover(remote, FakeRemote(answer=True), lambda: None, interval=0.01)
+    assert not failover.recover()
+    assert not failover.recover()
+    assert remote.engine.isready_calls == 1
+    assert remote.restarts == 0
+
+
+def test_recover_restarts_a_stalled_remote(monkeypatch):
+    remote = FakeRemote(answer=False)
+    failover = RemoteFailover(remote, FakeRemote(answer=True), lambda: None, interval=0.01)
+    monkeypatch.setattr(engine, 'PROBE_TIMEOUT', 0)
+    assert not failover.recover()
+    assert remote.restarts == 1
+    assert failover.recover()
+
+
+def test_level_goes_to_both_engines():
+    remote, local = FakeRemote(answer=True), FakeRemote(answer=True)
+    failover = RemoteFailover(remote, local, lambda: local)
+    failover.level({'Skill Level': '5'}, 'Level@05')
+    assert remote.options == local.options == {'Skill Level': '5'}
+    assert remote.level_name == local.level_name == 'Level@05'
+    remote.engine = None  # down: the options wait for its restart
+    failover.level({'Skill Level': '7'}, 'Level@07')
+    assert remote.options == {'Skill Level': '7'} and remote.level_name == 'Level@07'
+
+
+def test_close_stops_recovering_the_old_remote():
+    remote = FakeRemote(answer=True)
+    failover = RemoteFailover(remote, FakeRemote(answer=True), lambda: None, interval=0.01)
+    failover.start()
+    time.sleep(0.05)
+    failover.close()
+    failover.join(1)
+    assert not failover.is_alive()
+    calls = remote.engine.isready_calls
+    time.sleep(0.05)
+    assert remote.engine.isready_calls == calls
@@ -0,0 +1,47 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+from governor import ThermalGovernor, HYSTERESIS
+
+
+def fake_thermal(path, *temps):
+    for number, temp in enumerate(temps):
+        zone = path / 'thermal_zone{}'.format(number)
+        zone.mkdir()
+        (zone / 'temp').write_text('{}\n'.format(int(temp * 1000)))
+    return str(path)
+
+
+def test_governor_samples_the_hottest_zone(tmp_path):
+    governor = ThermalGovernor(fake_thermal(tmp_path, 48.5, 71), temp_limit=70, load_limit=float('inf'))
+    governor.sample()
+    assert governor.temperature == 71
+    assert governor.decide() == (True, 'temperature 71.0C')
+    metrics = governor.get_metrics()
+    assert metrics['temperature'] == 71 and len(metrics['samples']) == 1
+    assert metrics['samples'][0][1] == 71
+
+
+def test_governor_waits_for_the_hysteresis():
+    governor = ThermalGovernor('/nonexistent', temp_limit=70, load_limit=float('inf'))
+    governor.throttled = True
+    governor.load = 0.0
+    governor.temperature = 70 - HYSTERESIS + 1
+    assert governor.decide() == (True, None)
+    governor.temperature = 70 - HYSTERESIS - 1
+    assert governor.decide()[0] is False
@@ -0,0 +1,77 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import hostprofile
+from hostprofile import HostProfile, available_memory
+
+MEMINFO = """MemTotal:         505856 kB
+MemFree:           81920 kB
+MemAvailable:     {} kB
+"""
+
+# python-chess Option tuples: name, type, default, min, max, var
+OPTIONS = {'Threads': ('Threads', 'spin', 1, 1, 2, []), 'Hash': ('Hash', 'spin', 16, 1, 1024, [])}
+
+
+def profile(monkeypatch, cores, memory_mb):
+    monkeypatch.setattr(os, 'cpu_count', lambda: cores)
+    monkeypatch.setattr(hostprofile, 'available_memory', lambda: memory_mb)
+    return HostProfile()
+
+
+def test_available_memory_from_meminfo(tmp_path):
+    meminfo = tmp_path / 'meminfo'
+    meminfo.write_text(MEMINFO.format(307200))
+    assert available_memory(str(meminfo)) == 300
+    meminfo.write_text('MemTotal: 505856 kB\n')  # an old kernel
+    assert available_memory(str(meminfo)) == 0
+    assert available_memory(str(tmp_path / 'missing')) == 0
+
+
+def test_cores_keep_the_reserved_ones_for_picochess(monkeypatch):
+    host = profile(monkeypatch, 4, 1000)
+    host.configure(reserved_cores=1)
+    assert host.picochess_cores() == {0} and host.engine_cores() == {1, 2, 3}
+    host.configure(reserved_cores=2)
+    assert host.picochess_cores() == {0, 1} and host.engine_cores() == {2, 3}
+    host = profile(monkeypatch, 1, 1000)
+    host.configure(reserved_cores=1)
+    assert host.picochess_cores() == host.engine_cores() == {0}  # one core has to do it all
+
+
+def test_threads_are_the_engine_cores_within_the_engine_max(monkeypatch):
+    host = profile(monkeypatch, 4, 1000)
+    host.configure()
+    assert host.options(OPTIONS)['Threads'] == '2'  # 3 engine cores, the engine takes 2
+    assert host.options(OPTIONS, threads=1)['Threads'] == '1'
+    assert host.options({}) == {}
+
+
+def test_hash_is_a_capped_power_of_two_share(monkeypatch):
+    host = profile(monkeypatch, 4, 300)  # a small board
+    host.configure(engines=2)
+    assert host.options(OPTIONS)['Hash'] == '32'  # 300 * 0.25 / 2 = 37
+    host = profile(monkeypatch, 4, 8000)
+    host.configure(engines=2)
+    assert host.options(OPTIONS)['Hash'] == str(hostprofile.HASH_MAX_MB)
+    host.configure(hash_mb=2048)
+    assert host.options(OPTIONS)['Hash'] == '1024'  # the engine max
+    host = profile(monkeypatch, 4, 0)  # unknown memory - the engine default
+    host.configure()
+    assert 'Hash' not in host.options(OPTIONS)
@@ -0,0 +1,122 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import signal
+import stat
+import sys
+import time
+import chess
+from engine import UciEngine, IdleManager
+from utilities import Event
+
+WAITING_ENGINE = """import sys
+for line in sys.stdin:
+    line = line.strip()
+    if line == 'uci':
+        print('id name Sleeper\\nuciok', flush=True)
+    elif line == 'isready':
+        print('readyok', flush=True)
+    elif line == 'quit':
+        break
+"""
+
+
+def sleeper(tmp_path):
+    path = tmp_path / 'sleeper'
+    path.write_text('#!{}\n{}'.format(sys.executable, WAITING_ENGINE))
+    os.chmod(str(path), os.stat(str(path)).st_mode | stat.S_IEXEC)
+    return UciEngine(str(path), timeout=5)
+
+
+def after_e4():
+    game = chess.Board()
+    game.push_uci('e2e4')
+    return game
+
+
+def test_suspended_engine_defers_till_its_woken(tmp_path):
+    engine = sleeper(tmp_path)
+    try:
+        assert engine.suspend() and engine.suspended == 'stop'
+        engine.position(after_e4())
+        assert len(engine.pending) == 1 and engine.mirror.board is None  # a frozen engine wouldnt take it
+        assert engine.wake() is not None
+        assert engine.suspended is None and not engine.pending
+        assert engine.mirror.board.fen() == after_e4().fen()
+        assert engine.restarts == 0
+    finally:
+        engine.kill()
+
+
+def test_quit_engine_is_restarted_on_wake(tmp_path):
+    engine = sleeper(tmp_path)
+    engine.is_local = lambda: False  # like a remote one: no SIGSTOP, it quits
+    try:
+        old = engine.get()
+        assert engine.suspend() and engine.suspended == 'quit'
+        assert engine.get().name == 'Sleeper'  # still there to be asked
+        engine.position(after_e4())
+        assert engine.wake() is not None
+        assert engine.get() is not old and engine.get().is_alive() and engine.restarts == 1
+        assert engine.suspended is None and engine.mirror.board.fen() == after_e4().fen()
+    finally:
+        engine.kill()
+
+
+def test_engine_dead_while_suspended_is_restarted(tmp_path):
+    engine = sleeper(tmp_path)
+    try:
+        assert engine.suspend()
+        os.kill(engine.get_pid(), signal.SIGKILL)
+        engine.get().process.process.wait()
+        assert engine.wake() is not None
+        assert engine.restarts == 1 and engine.get().is_alive() and engine.suspended is None
+    finally:
+        engine.kill()
+
+
+class SlowWaking(object):
+    def __init__(self):
+        self.woken = False
+
+    def suspend(self):
+        return True
+
+    def wake(self):
+        time.sleep(0.3)
+        self.woken = True
+        return 0.3
+
+
+def test_activity_doesnt_wait_for_the_wake():
+    engine = SlowWaking()
+    manager = IdleManager(lambda: engine, idle_time=0, interval=0.01)
+    manager.start()
+    end = time.monotonic() + 2
+    while manager.suspended is None and time.monotonic() < end:
+        time.sleep(0.01)
+    assert manager.suspended is engine
+    manager.idle_time = 60  # dont suspend it again
+    start = time.monotonic()
+    manager.activity(Event.NEW_GAME(pos960=518))
+    assert time.monotonic() - start < 0.1
+    end = time.monotonic() + 2
+    while not engine.woken and time.monotonic() < end:
+        time.sleep(0.01)
+    assert engine.woken and manager.get_metrics()['wake_latency'] == 0.3
@@ -0,0 +1,55 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import chess
+import utilities
+from engine import Informer
+
+
+def drain():
+    events = []
+    while not utilities.evt_queue.empty():
+        events.append(repr(utilities.evt_queue.get()))
+    return events
+
+
+def info_line(informer, depth, cp, moves):
+    informer.pre_info('')
+    informer.depth(depth)
+    informer.score(cp, None, False, False)
+    informer.pv(moves)
+    informer.post_info()
+
+
+def test_informer_fires_score_and_pv():
+    drain()
+    informer = Informer(interval=0)
+    informer.on_go()
+    info_line(informer, 1, 20, [chess.Move.from_uci('e2e4')])
+    assert drain() == ['EVT_NEW_SCORE', 'EVT_NEW_PV']
+
+
+def test_quiet_informer_keeps_the_lines_to_itself():
+    drain()
+    informer = Informer(interval=0)
+    informer.quiet = True
+    informer.on_go()
+    info_line(informer, 1, -20, [chess.Move.from_uci('e7e5')])
+    informer.on_bestmove(chess.Move.from_uci('e7e5'), None)
+    assert drain() == []
+    assert informer.multipv_table.best()[3] == [chess.Move.from_uci('e7e5')]
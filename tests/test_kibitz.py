@@ -0,0 +1,117 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import stat
+import sys
+import time
+from concurrent.futures import Future
+import chess
+from hostprofile import host_profile
+from kibitz import ConsensusKibitz, when_done
+
+# analyses till its stopped, then takes a while for the bestmove - the move depends on the position
+SLOW_ENGINE = """import sys, threading, time
+stop = threading.Event()
+black = False
+def search():
+    move = 'e7e5' if black else 'e2e4'
+    depth = 0
+    while not stop.wait(0.02):
+        depth += 1
+        print('info depth {} score cp 10 pv {}'.format(depth, move), flush=True)
+    time.sleep(0.3)
+    print('bestmove ' + move, flush=True)
+for line in sys.stdin:
+    line = line.strip()
+    if line == 'uci':
+        print('id name Slow\\nuciok', flush=True)
+    elif line == 'isready':
+        print('readyok', flush=True)
+    elif line.startswith('position'):
+        black = ' b ' in line  # after 1.e4 (which picochess sends as fen)
+    elif line.startswith('go'):
+        stop.clear()
+        threading.Thread(target=search).start()
+    elif line == 'stop':
+        stop.set()
+    elif line == 'quit':
+        break
+"""
+
+
+def test_when_done_waits_for_all_futures():
+    first, second, ran = Future(), Future(), []
+    when_done([first, second], lambda: ran.append(True))
+    second.set_result(None)
+    assert not ran
+    first.set_result(None)
+    assert ran
+    when_done([], lambda: ran.append(True))
+    assert ran == [True, True]
+
+
+def slow_engine(tmp_path, name='slow'):
+    path = tmp_path / name
+    path.write_text('#!{}\n{}'.format(sys.executable, SLOW_ENGINE))
+    os.chmod(str(path), os.stat(str(path)).st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def wait_for(condition, secs=5):
+    end = time.monotonic() + secs
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_analyse_doesnt_wait_for_the_stopped_search(tmp_path):
+    kibitz = ConsensusKibitz([slow_engine(tmp_path)], interval=0)
+    try:
+        game = chess.Board()
+        kibitz.analyse(game)
+        assert wait_for(lambda: 'slow' in kibitz.get_results())
+        assert kibitz.get_results()['slow'][3] == [chess.Move.from_uci('e2e4')]
+        game.push_uci('e2e4')
+        start = time.monotonic()
+        kibitz.analyse(game)
+        assert time.monotonic() - start < 0.2  # the engine needs 0.3 secs for its bestmove
+        time.sleep(0.6)
+        assert kibitz.get_results()['slow'][3] == [chess.Move.from_uci('e7e5')]
+    finally:
+        kibitz.close()
+
+
+def test_engines_open_in_the_background_on_the_engine_cores_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(host_profile, 'engine_cores', lambda: {1, 2})
+    pinned = []
+    monkeypatch.setattr(os, 'sched_setaffinity', lambda pid, cores: pinned.append(cores), raising=False)
+    files = [slow_engine(tmp_path, name) for name in ('one', 'two', 'three')]
+    kibitz = ConsensusKibitz(files, interval=0)
+    try:
+        start = time.monotonic()
+        kibitz.analyse(chess.Board())
+        assert time.monotonic() - start < 0.1 and not kibitz.engines  # the event loop doesnt wait for the spawn
+        kibitz.opener.join(10)
+        assert [engine.get_file() for engine in kibitz.engines] == files[:2]  # no third core for the third one
+        assert {1} in pinned and {2} in pinned and all(0 not in cores for cores in pinned)
+        assert wait_for(lambda: set(kibitz.get_results()) == {'one', 'two'})  # joined the running analysis
+    finally:
+        kibitz.close()
@@ -0,0 +1,68 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import chess
+from movestore import MoveStore, encode_move, decode_move
+from engine import SearchCache, SearchResult
+from utilities import TimeMode
+
+E4 = chess.Move.from_uci('e2e4')
+PROMOTION = chess.Move.from_uci('a7a8q')
+
+
+def test_move_codes():
+    assert decode_move(encode_move(E4)) == E4
+    assert decode_move(encode_move(PROMOTION)) == PROMOTION
+    assert encode_move(None) == 0 and decode_move(0) is None
+
+
+def test_records_and_generation_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'moves.store')
+    store = MoveStore(path, 16)
+    store.put(123, 7, E4, None, 25, None, 18)
+    assert store.get(123, 7) == (E4, None, 25, None, 18)
+    generation = store.generation
+    store.close()
+    store = MoveStore(path, 16)
+    assert store.generation == generation
+    assert store.get(123, 7) == (E4, None, 25, None, 18)
+    assert store.get(123, 8) is None
+    store.close()
+
+
+def test_deeper_record_is_kept(tmp_path):
+    store = MoveStore(str(tmp_path / 'moves.store'), 16)
+    store.put(1, 1, E4, None, 10, None, 20)
+    store.put(1, 1, PROMOTION, None, 10, None, 12)
+    assert store.get(1, 1)[0] == E4
+    store.close()
+
+
+def test_shallow_stored_search_isnt_replayed(tmp_path):
+    cache = SearchCache(store=MoveStore(str(tmp_path / 'moves.store'), 16))
+    limits = (TimeMode.FIXED, 5, 0, 0)
+    game = chess.Board()
+    key = SearchCache.key(game, 'sf', {}, limits)
+    cache.put(key, SearchResult(E4, None, 20, None, 10, [E4], True))
+    cache.clear()  # the memory part is gone, like after a restart
+    assert cache.get(key).bestmove == E4
+    game.push(E4)
+    for depth in (20, 22, 24):  # the engine reaches more now
+        cache.put(SearchCache.key(game, 'sf', {}, limits), SearchResult(E4, None, 0, None, depth, [E4], True))
+    cache.clear()
+    assert cache.get(key) is None
+    cache.close()
@@ -0,0 +1,56 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from engine import MultiPvTable
+
+
+def test_lines_of_one_depth_only():
+    table = MultiPvTable(3)
+    for index in (1, 2, 3):
+        table.update(index, 12, (10 * index, None), ['m12_{}'.format(index)])
+    assert [line[0] for line in table.lines()] == [12, 12, 12]
+    table.update(1, 20, (50, None), ['m20_1'])  # depth 20 is still in the making
+    assert not table.changed
+    assert [line[3] for line in table.current()] == [['m12_1'], ['m12_2'], ['m12_3']]
+    table.update(2, 20, (40, None), ['m20_2'])
+    table.update(3, 20, (30, None), ['m20_3'])
+    assert table.changed
+    assert [line[:2] for line in table.lines()] == [(20, 50), (20, 40), (20, 30)]
+    assert 12 not in table.depths
+
+
+def test_depth_with_less_lines_than_slots():
+    table = MultiPvTable(3)
+    table.update(1, 5, (0, None), ['a'])
+    table.update(2, 5, (-10, None), ['b'])  # only two legal moves
+    assert [line[3] for line in table.current()] == [['a'], ['b']]
+    table.update(1, 6, (5, None), ['b'])
+    assert [line[3] for line in table.current()] == [['a'], ['b']]
+    table.update(2, 6, (-5, None), ['a'])
+    table.update(1, 7, (3, None), ['b'])
+    assert [line[0] for line in table.current()] == [6, 6]
+
+
+def test_best_line_is_the_deepest():
+    table = MultiPvTable(2)
+    assert table.best() is None
+    table.update(1, 8, (10, None), ['a'])
+    table.update(2, 8, (0, None), ['b'])
+    table.update(1, 9, None, ['c'])
+    assert table.best() == (9, None, None, ['c'])
+    table.resize(1)
+    assert table.current() == [] and table.best() is None
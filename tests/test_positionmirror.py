@@ -0,0 +1,63 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import chess
+from engine import PositionMirror
+
+
+def play(game, *moves):
+    for move in moves:
+        game.push_uci(move)
+    return game
+
+
+def test_root_is_the_last_irreversible_move():
+    game = play(chess.Board(), 'e2e4', 'e7e5', 'g1f3', 'b8c6')
+    board = PositionMirror().update(game)
+    assert board.fen() == game.fen()
+    assert len(board.move_stack) == 2  # after the pawn moves only the knight moves count
+    assert len(game.move_stack) == 4  # the game is left as it was
+
+
+def test_unchanged_and_appended_moves():
+    mirror = PositionMirror()
+    game = play(chess.Board(), 'e2e4', 'e7e5', 'g1f3')
+    first = mirror.update(game)
+    assert mirror.update(game) is None
+    play(game, 'b8c6')
+    second = mirror.update(game)
+    assert second is first  # only the new move was pushed
+    assert second.fen() == game.fen()
+
+
+def test_takeback_rebuilds_the_board():
+    mirror = PositionMirror()
+    game = play(chess.Board(), 'e2e4', 'e7e5', 'g1f3', 'b8c6')
+    mirror.update(game)
+    game.pop()
+    play(game, 'g8f6')
+    board = mirror.update(game)
+    assert board.fen() == game.fen()
+    assert [move.uci() for move in board.move_stack] == ['g1f3', 'g8f6']
+
+
+def test_reset_sends_again():
+    mirror = PositionMirror()
+    game = play(chess.Board(), 'd2d4')
+    mirror.update(game)
+    mirror.reset()
+    assert mirror.update(game) is not None
@@ -0,0 +1,52 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import stat
+import sys
+import time
+from engine import probe_engine
+
+# answers the handshake, but neither searches nor quits
+STUBBORN_ENGINE = """import sys
+for line in sys.stdin:
+    if line.strip() == 'uci':
+        print('id name Stubborn\\nuciok', flush=True)
+    elif line.strip() == 'isready':
+        print('readyok', flush=True)
+"""
+
+
+def write_engine(path, source):
+    path.write_text('#!{}\n{}'.format(sys.executable, source))
+    os.chmod(str(path), os.stat(str(path)).st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def test_silent_engine_fails_in_time(tmp_path):
+    engine_file = write_engine(tmp_path / 'silent', 'import time\ntime.sleep(60)\n')
+    start = time.monotonic()
+    assert probe_engine(engine_file, timeout=1) is None
+    assert time.monotonic() - start < 5
+
+
+def test_engine_which_doesnt_quit_is_killed(tmp_path):
+    engine_file = write_engine(tmp_path / 'stubborn', STUBBORN_ENGINE)
+    start = time.monotonic()
+    probe = probe_engine(engine_file, timeout=1)
+    assert probe == {'name': 'Stubborn', 'elo': None, 'skill': None}
+    assert time.monotonic() - start < 5
@@ -0,0 +1,73 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+import utilities
+from utilities import RateLimiter, min_timeout
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(utilities.time, 'monotonic', clock)
+    return clock
+
+
+def test_first_value_passes(clock):
+    limiter = RateLimiter(0.5)
+    assert limiter.offer(1) == 1
+    assert limiter.timeout() is None
+
+
+def test_values_inside_the_interval_are_coalesced(clock):
+    limiter = RateLimiter(0.5)
+    limiter.offer(1)
+    clock.now += 0.1
+    assert limiter.offer(2) is None
+    assert limiter.offer(3) is None
+    assert limiter.poll() is None
+    assert limiter.timeout() == pytest.approx(0.4)
+    clock.now += 0.4
+    assert limiter.poll() == 3
+    assert limiter.poll() is None
+
+
+def test_flush_and_reset(clock):
+    limiter = RateLimiter(0.5)
+    limiter.offer(1)
+    limiter.offer(2)
+    assert limiter.flush() == 2
+    assert limiter.flush() is None
+    limiter.offer(3)
+    limiter.reset()
+    assert limiter.offer(4) == 4
+
+
+def test_min_timeout(clock):
+    idle, busy = RateLimiter(0.5), RateLimiter(1.0)
+    assert min_timeout(idle, busy) is None
+    busy.offer(1)
+    busy.offer(2)
+    assert min_timeout(idle, busy) == pytest.approx(1.0)
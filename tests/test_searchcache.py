@@ -0,0 +1,61 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import chess
+from engine import SearchCache, SearchResult
+from utilities import TimeMode
+
+LIMITS = (TimeMode.FIXED, 5, 0, 0)
+
+
+def result(move, depth, complete=True):
+    move = chess.Move.from_uci(move)
+    return SearchResult(move, None, 20, None, depth, [move], complete)
+
+
+def test_key_from_a_board():
+    game = chess.Board()
+    key = SearchCache.key(game, 'engines/stockfish', {'Skill Level': '5'}, LIMITS)
+    game.push_uci('g1f3')
+    game.push_uci('g8f6')
+    game.push_uci('f3g1')
+    game.push_uci('f6g8')  # same position again
+    assert SearchCache.key(game, 'engines/stockfish', {'Skill Level': '5'}, LIMITS) == key
+    assert SearchCache.key(game, 'engines/stockfish', {'Skill Level': '6'}, LIMITS) != key
+    excluded = SearchCache.key(game, 'engines/stockfish', {'Skill Level': '5'}, LIMITS, [chess.Move.from_uci('e2e4')])
+    assert excluded != key
+
+
+def test_persistent_only_for_plain_timed_searches():
+    game = chess.Board()
+    assert SearchCache.persistent(SearchCache.key(game, 'sf', {}, LIMITS)) is not None
+    assert SearchCache.persistent(SearchCache.key(game, 'sf', {}, None)) is None
+    assert SearchCache.persistent(SearchCache.key(game, 'sf', {}, LIMITS, [chess.Move.from_uci('e2e4')])) is None
+
+
+def test_better_result_is_kept_and_lru_evicts():
+    cache = SearchCache(size=2)
+    keys = [SearchCache.key(chess.Board(fen), 'sf', {}, None) for fen in
+            (chess.STARTING_FEN, '8/8/8/8/8/8/k7/K7 w - - 0 1', '8/8/8/8/8/8/k7/1K6 w - - 0 1')]
+    cache.put(keys[0], result('e2e4', 20))
+    cache.put(keys[0], result('d2d4', 12, complete=False))
+    assert cache.get(keys[0]).bestmove == chess.Move.from_uci('e2e4')
+    cache.put(keys[1], result('a1b1', 5))
+    cache.get(keys[0])
+    cache.put(keys[2], result('b1c1', 5))
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
@@ -0,0 +1,201 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+from concurrent.futures import Future
+import chess
+import chess.uci
+from timecontrol import TimeControl
+from utilities import TimeMode
+import simul as simul_module
+from simul import Simul, SimulHost, move_budget, uci_time_control
+
+
+class StubUci(object):
+    """Answers each go with the first legal move after movetime - or never, for the positions listed in hang."""
+
+    def __init__(self, hang=()):
+        self.board = None
+        self.hang = set(hang)
+        self.searches = []  # fen, movetime
+        self.stops = []
+        self.command = None
+        self.lock = threading.Lock()
+
+    def answer(self, command, move):
+        with self.lock:
+            if not command.done():
+                command.set_result(chess.uci.BestMove(move, None))
+
+    def go(self, movetime=None, async_callback=None):
+        self.searches.append((self.board.fen(), movetime))
+        self.command = Future()
+        if self.board.fen() in self.hang:
+            self.hang.discard(self.board.fen())  # hangs once, the retry gets its move
+        else:
+            move = next(iter(self.board.legal_moves))
+            threading.Timer(movetime / 1000, self.answer, (self.command, move)).start()
+        return self.command
+
+    def stop(self, async_callback=None):
+        self.stops.append(async_callback)
+        if self.command:
+            self.answer(self.command, None)
+        future = Future()
+        future.set_result(None)
+        return future
+
+
+class StubEngine(object):
+    def __init__(self, uci):
+        self.uci = uci
+        self.restarts = 0
+
+    def position(self, game):
+        self.uci.board = game.copy()
+
+    def get(self):
+        return self.uci
+
+    def restart(self, resume=True):
+        self.restarts += 1
+
+
+def fixed(secs):
+    return TimeControl(TimeMode.FIXED, seconds_per_move=secs)
+
+
+def open_simul(uci, board_ids, slice_secs=0.2):
+    moves = {}
+    done = threading.Event()
+
+    def on_move(board_id, result):
+        moves[board_id] = result, time.monotonic()
+        if len(moves) == len(board_ids):
+            done.set()
+
+    simul = Simul([StubEngine(uci)], slice_secs)
+    for board_id in board_ids:
+        simul.add_board(board_id, on_move)
+    simul.start()
+    return simul, moves, done
+
+
+def test_boards_are_searched_in_turns():
+    uci = StubUci()
+    simul, moves, done = open_simul(uci, [1, 2])
+    black = chess.Board()
+    black.push_uci('e2e4')
+    start = time.monotonic()
+    simul.think(1, chess.Board(), fixed(1))
+    simul.think(2, black, fixed(1))
+    assert done.wait(10)
+    assert moves[1][0].bestmove in chess.Board().legal_moves
+    assert moves[2][0].bestmove in black.legal_moves
+    assert all(reply - start < 1.5 for _, reply in moves.values())  # both in time, not one after the other
+    fens = [fen for fen, _ in uci.searches]
+    assert fens.index(black.fen()) < len(fens) - 1 - fens[::-1].index(chess.Board().fen())  # interleaved
+    assert all(isinstance(movetime, int) and movetime <= 1000 for _, movetime in uci.searches)
+    metrics = simul.get_metrics()
+    assert metrics[1]['moves'] == metrics[2]['moves'] == 1
+    assert metrics[1]['slices'] > 1 and metrics[2]['slices'] > 1
+
+
+def test_new_board_interrupts_a_long_search():
+    uci = StubUci()
+    simul, moves, done = open_simul(uci, [1, 2])
+    black = chess.Board()
+    black.push_uci('d2d4')
+    start = time.monotonic()
+    simul.think(1, chess.Board(), fixed(3))
+    time.sleep(0.1)
+    simul.think(2, black, fixed(1))
+    assert done.wait(10)
+    assert uci.stops  # the search of board 1 planned for 3 secs made room
+    assert moves[2][1] - start < 1.5
+    assert moves[1][0].bestmove in chess.Board().legal_moves
+
+
+def test_failed_search_is_queued_again(monkeypatch):
+    monkeypatch.setattr(simul_module, 'STOP_TIMEOUT', 0.2)
+    uci = StubUci(hang=[chess.Board().fen()])
+    simul, moves, done = open_simul(uci, [1])
+    simul.think(1, chess.Board(), fixed(0.5))
+    assert done.wait(10)
+    assert moves[1][0].bestmove in chess.Board().legal_moves
+    assert uci.stops[0] is True  # the stop after the missed deadline doesnt block
+    assert simul.get_metrics()[1]['moves'] == 1
+
+
+def test_cancel_stops_without_waiting():
+    uci = StubUci()
+    uci.command = Future()
+    simul = Simul([StubEngine(uci)])
+    simul.add_board(1, None)
+    worker = simul.workers[0]
+    simul.boards[1].worker = worker
+    simul.cancel(1)
+    assert uci.stops == [True]
+    assert worker.stop_future.done()
+
+
+def test_budget_from_the_clock():
+    assert move_budget(fixed(7), chess.WHITE) == 7
+    tc = uci_time_control({'wtime': 60000, 'btime': 30000, 'winc': 2000, 'binc': 2000})
+    assert tc.mode == TimeMode.FISCHER
+    assert move_budget(tc, chess.WHITE) == 60 / 30 + 2
+    assert move_budget(tc, chess.BLACK) == 30 / 30 + 2
+    assert move_budget(uci_time_control({'movetime': 500}), chess.WHITE) == 0.5
+    assert uci_time_control({'depth': 10}).seconds_per_move == simul_module.SIMUL_UNTIMED
+
+
+class StubSession(object):
+    def __init__(self):
+        self.lines = []
+        self.sent = threading.Event()
+
+    def send(self, line):
+        self.lines.append(line)
+        self.sent.set()
+
+
+def test_remote_boards_play_through_the_simul():
+    uci = StubUci()
+    simul = Simul([StubEngine(uci)], 0.2)
+    simul.start()
+    host = SimulHost(simul, ['id name Stub', 'uciok'])
+    assert host.describe('whatever') == ['id name Stub', 'uciok']
+    session = StubSession()
+    host.submit(session, chess.Board(), {'movetime': 300}, True)
+    assert session.sent.wait(5)
+    assert session.lines[0].startswith('bestmove ')
+    assert chess.Move.from_uci(session.lines[0].split()[1]) in chess.Board().legal_moves
+
+    session.sent.clear()
+    host.submit(session, chess.Board(), {'wtime': 9000, 'btime': 9000, 'ponder': True}, False)
+    time.sleep(0.2)
+    assert not session.sent.is_set()  # a ponder search waits for the ponderhit
+    host.ponderhit(session)
+    assert session.sent.wait(5)
+    assert session.lines[1].startswith('bestmove ') and session.lines[1] != 'bestmove 0000'
+
+    host.submit(session, chess.Board(), {'infinite': True}, False)
+    host.stop(session)
+    assert session.lines[2] == 'bestmove 0000'
+    host.stop(session)  # nothing running - no answer
+    assert len(session.lines) == 3
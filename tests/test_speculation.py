@@ -0,0 +1,123 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import stat
+import sys
+import time
+import chess
+from speculation import Speculation
+
+# answers 1.e4 with e5, 1.d4 with d5 and anything else with a6
+ANSWERING_ENGINE = """import sys
+answer = 'a7a6'
+for line in sys.stdin:
+    line = line.strip()
+    if line == 'uci':
+        print('id name Answering', flush=True)
+        print('option name Threads type spin default 1 min 1 max 8', flush=True)
+        print('option name Hash type spin default 16 min 1 max 1024\\nuciok', flush=True)
+    elif line == 'isready':
+        print('readyok', flush=True)
+    elif line.startswith('position'):
+        answer = 'e7e5' if '/4P3/' in line else 'd7d5' if '/3P4/' in line else 'a7a6'
+    elif line.startswith('go'):
+        print('info depth 5 score cp 20 pv ' + answer, flush=True)
+        print('bestmove ' + answer, flush=True)
+    elif line == 'quit':
+        break
+"""
+
+E4, D4, C4 = chess.Move.from_uci('e2e4'), chess.Move.from_uci('d2d4'), chess.Move.from_uci('c2c4')
+LIMITS = {'movetime': '1000'}
+SPECULATIVE = {'Threads': '1', 'Hash': '16'}  # what the speculating engines search with
+
+
+def speculating(tmp_path, replies, options, covered=None):
+    path = tmp_path / 'answering'
+    path.write_text('#!{}\n{}'.format(sys.executable, ANSWERING_ENGINE))
+    os.chmod(str(path), os.stat(str(path)).st_mode | stat.S_IEXEC)
+    speculation = Speculation(str(path))
+    speculation.start(chess.Board(), replies, [1, 2], options, LIMITS, covered)
+    assert not speculation.searches  # the engines come up in the background
+    speculation.spawner.join(10)
+    speculation.resume()  # what SPECULATION_READY does
+    assert len(speculation.searches) == len(replies)
+    end = time.monotonic() + 5
+    while not all(search[2].done() for search in speculation.searches.values()) and time.monotonic() < end:
+        time.sleep(0.01)
+    return speculation
+
+
+def after(*moves):
+    game = chess.Board()
+    for move in moves:
+        game.push(move)
+    return game
+
+
+def test_hit_with_the_same_options_and_time_is_complete(tmp_path):
+    speculation = speculating(tmp_path, [E4, D4], SPECULATIVE)
+    try:
+        answer = speculation.take(after(E4), SPECULATIVE, LIMITS)
+        assert answer.bestmove == chess.Move.from_uci('e7e5') and answer.complete
+        assert answer.score == 20 and answer.depth == 5
+        assert speculation.get_metrics()['hits'] == 1 and not speculation.searches
+    finally:
+        speculation.close()
+
+
+def test_hit_of_a_weaker_search_is_only_a_hint(tmp_path):
+    speculation = speculating(tmp_path, [E4, D4], SPECULATIVE)
+    try:
+        answer = speculation.take(after(D4), {'Threads': '4', 'Hash': '256'}, LIMITS)
+        assert answer.bestmove == chess.Move.from_uci('d7d5') and not answer.complete
+    finally:
+        speculation.close()
+    speculation = speculating(tmp_path, [E4], SPECULATIVE)
+    try:
+        answer = speculation.take(after(E4), SPECULATIVE, {'movetime': '10000'})  # capped to 5 secs
+        assert not answer.complete
+    finally:
+        speculation.close()
+
+
+def test_miss_and_ponder_hit(tmp_path):
+    speculation = speculating(tmp_path, [D4], SPECULATIVE, covered=E4)
+    try:
+        assert speculation.take(after(C4), SPECULATIVE, LIMITS) is None
+        assert speculation.get_metrics() == {'hits': 0, 'ponder_hits': 0, 'misses': 1, 'hit_rate': 0.0}
+        speculation.resume()  # the request is gone with the user move
+        assert not speculation.searches
+        speculation.start(chess.Board(), [D4], [1, 2], SPECULATIVE, LIMITS, E4)
+        assert speculation.take(after(E4), SPECULATIVE, LIMITS) is None  # the ponder search has it
+        assert speculation.get_metrics() == {'hits': 1, 'ponder_hits': 1, 'misses': 1, 'hit_rate': 0.5}
+    finally:
+        speculation.close()
+
+
+def test_stale_position_isnt_taken(tmp_path):
+    speculation = speculating(tmp_path, [E4], SPECULATIVE)
+    try:
+        stale = after(D4, chess.Move.from_uci('d7d5'), E4)  # another position, e4 played as well
+        assert speculation.take(stale, SPECULATIVE, LIMITS) is None
+        assert speculation.misses == 1
+        assert speculation.take(after(E4), SPECULATIVE, LIMITS) is None  # all ended by the first take()
+        assert speculation.misses == 1
+    finally:
+        speculation.close()
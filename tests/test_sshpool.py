@@ -0,0 +1,60 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from sshpool import SshSession, SshPool
+
+
+class FakeShell(object):
+    def __init__(self):
+        self.commands = []
+
+    def run(self, command):
+        self.commands.append(command)
+
+
+def test_probe_times_the_engine_not_the_shell():
+    session = SshSession(FakeShell())
+    assert session.probe() is None  # no engine yet, only the keepalive
+    assert session.shell.commands == [['true']]
+    assert session.latency() == 0
+    rtts = iter([0.004, 0.050, 0.006])
+    session.ping = lambda: next(rtts)
+    for _ in range(3):
+        session.probe()
+    assert session.latency() == 0.006  # the median - the slow probe doesnt count
+
+
+def test_busy_engine_gives_no_sample():
+    session = SshSession(FakeShell())
+    session.add_rtt(0.01)
+    session.ping = lambda: None
+    assert session.probe() is None
+    assert list(session.rtts) == [0.01]
+
+
+def test_watch_adds_the_handshake_sample():
+    pool = SshPool()
+    session = SshSession(FakeShell())
+    pool.sessions[('host', 'pi')] = session
+
+    def ping():
+        return 0.002
+
+    pool.watch('host', 'pi', ping, 0.003)
+    assert session.ping is ping
+    assert pool.latency('host', 'pi') == 0.003
+    assert pool.latency('other') == 0
@@ -0,0 +1,57 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+from engine import Histogram, SearchRecord, SearchTelemetry
+
+
+def record(depth, nps, bestmove, stopped=False, level='Level@05'):
+    return SearchRecord('Engine', level, 'think', 0.0, 0.01, 0.02, depth, 1000, nps, bestmove, stopped)
+
+
+def test_histogram_buckets():
+    histogram = Histogram([1, 10])
+    for value in (0.5, 1, 5, 10, 11, None):
+        histogram.add(value)
+    assert histogram.get() == {'<=1': 2, '<=10': 2, '>10': 1}
+
+
+def test_telemetry_per_engine_and_level():
+    telemetry = SearchTelemetry(size=2, log_every=0)
+    telemetry.add(record(10, 200000, 2.0))
+    telemetry.add(record(30, None, 50.0, stopped=True))
+    telemetry.add(record(5, 50000, 0.2, level=''))
+    snapshot = json.loads(json.dumps(telemetry.snapshot()))
+    assert len(snapshot['records']) == 2  # a ring buffer
+    summary = snapshot['histograms']['Engine Level@05']
+    assert summary['searches'] == 2 and summary['stopped'] == 1
+    assert summary['depth']['<=12'] == 1 and summary['depth']['>28'] == 1
+    assert summary['knps']['<=300'] == 1
+    assert sum(summary['bestmove'].values()) == 1  # the stopped search doesnt count
+    assert snapshot['histograms']['Engine']['searches'] == 1
+
+
+def test_add_only_counts(monkeypatch):
+    telemetry = SearchTelemetry(size=2, log_every=3)
+    snapshots = []
+    original = telemetry.snapshot
+    monkeypatch.setattr(telemetry, 'snapshot', lambda: snapshots.append(True) or original())
+    for _ in range(5):
+        telemetry.add(record(10, 200000, 2.0))
+    assert snapshots == [True]  # just for the log after the third search
+    assert original()['histograms']['Engine Level@05']['searches'] == 5
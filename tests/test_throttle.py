@@ -0,0 +1,83 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import stat
+import sys
+from engine import UciEngine
+
+# offers a Threads option
+THREADED_ENGINE = """import sys
+for line in sys.stdin:
+    line = line.strip()
+    if line == 'uci':
+        print('id name Threaded\\noption name Threads type spin default 2 min 1 max 8\\nuciok', flush=True)
+    elif line == 'isready':
+        print('readyok', flush=True)
+    elif line == 'quit':
+        break
+"""
+
+
+def threaded_engine(tmp_path):
+    path = tmp_path / 'threaded'
+    path.write_text('#!{}\n{}'.format(sys.executable, THREADED_ENGINE))
+    os.chmod(str(path), os.stat(str(path)).st_mode | stat.S_IEXEC)
+    return UciEngine(str(path), timeout=5)
+
+
+def test_throttle_survives_a_restart_and_a_new_level(tmp_path):
+    engine = threaded_engine(tmp_path)
+    try:
+        engine.level({'Threads': '4'})
+        engine.throttle(1)
+        assert engine.is_throttled() and engine.options['Threads'] == '1'
+        assert engine.restart()
+        assert engine.options['Threads'] == '1'
+        engine.level({'Threads': '3', 'Hash': '16'})
+        assert engine.options == {'Threads': '1', 'Hash': '16'}
+        engine.unthrottle()
+        assert not engine.is_throttled() and engine.options == {'Threads': '3', 'Hash': '16'}
+        engine.level({})
+        engine.throttle(1)
+        engine.unthrottle()
+        assert engine.options == {}
+    finally:
+        engine.kill()
+
+
+def test_remote_engine_isnt_throttled(tmp_path):
+    engine = threaded_engine(tmp_path)
+    try:
+        engine.server = 'elsewhere:9999'
+        engine.throttle(1)
+        assert not engine.is_throttled() and 'Threads' not in engine.options
+    finally:
+        engine.kill()
+
+
+def test_startup_names_the_level(tmp_path):
+    engine = threaded_engine(tmp_path)
+    try:
+        engine.startup({'Threads': '2'}, False, level_name='Level@02')
+        assert engine.level_name == 'Level@02'
+        (tmp_path / 'threaded.uci').write_text('[Level@01]\nThreads = 1\n')
+        engine.startup({}, False)  # the level of the .uci file
+        assert engine.level_name == 'Level@01' and engine.options['Threads'] == '1'
+    finally:
+        engine.kill()
@@ -0,0 +1,116 @@
+# Copyright (C) 2013-2016 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import stat
+import sys
+import time
+import chess
+from engine import UciEngine, SEARCH_GRACE
+from utilities import EngineStatus
+
+# searches till it gets a stop
+THINKING_ENGINE = """import sys
+for line in sys.stdin:
+    line = line.strip()
+    if line == 'uci':
+        print('id name Thinker\\nuciok', flush=True)
+    elif line == 'isready':
+        print('readyok', flush=True)
+    elif line == 'stop':
+        print('bestmove e2e4', flush=True)
+    elif line == 'quit':
+        break
+"""
+
+
+def write_engine(path, source):
+    path.write_text('#!{}\n{}'.format(sys.executable, source))
+    os.chmod(str(path), os.stat(str(path)).st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def thinking(engine, time_dict):
+    engine.status = EngineStatus.THINK
+    engine.time_dict = time_dict
+    engine.search_start = 100.0
+    return engine
+
+
+def test_deadline_is_the_move_budget_not_the_clock(tmp_path):
+    engine = UciEngine(write_engine(tmp_path / 'thinker', THINKING_ENGINE), timeout=5)
+    try:
+        engine.mirror.board = chess.Board()
+        thinking(engine, {'wtime': 300000, 'btime': 300000})
+        assert engine.deadline() == 100.0 + 3 * 300 / 30 + SEARCH_GRACE
+        thinking(engine, {'wtime': 60000, 'btime': 60000, 'winc': 2000, 'binc': 0, 'movestogo': 10})
+        assert engine.deadline() == 100.0 + 3 * (60 / 10 + 2) + SEARCH_GRACE
+        thinking(engine, {'wtime': 1000, 'btime': 1000, 'movestogo': 1})
+        assert engine.deadline() == 100.0 + 1 + SEARCH_GRACE  # never more than the clock
+        thinking(engine, {'movetime': 4000})
+        assert engine.deadline() == 100.0 + 4 + SEARCH_GRACE
+        engine.status = EngineStatus.WAIT
+        assert engine.deadline() is None
+    finally:
+        engine.kill()
+
+
+def test_restart_resumes_the_search_on_a_new_process(tmp_path):
+    engine = UciEngine(write_engine(tmp_path / 'thinker', THINKING_ENGINE), timeout=5)
+    try:
+        old = engine.get()
+        engine.position(chess.Board())
+        engine.go({'wtime': 60000, 'btime': 60000})
+        assert engine.restart()
+        assert engine.get() is not old and engine.get().is_alive()
+        assert engine.is_thinking()
+        assert engine.get_metrics()['restarts'] == 1
+    finally:
+        engine.kill()
+
+
+def test_actions_during_a_restart_wait_for_the_new_process(tmp_path):
+    engine = UciEngine(write_engine(tmp_path / 'thinker', THINKING_ENGINE), timeout=5)
+    try:
+        engine.restarting = True
+        board = chess.Board()
+        board.push_san('e4')
+        engine.position(board)
+        engine.stop()
+        assert [action for action, args in engine.pending] == [engine.position]
+        engine.restarting = False
+        assert engine.restart()
+        assert engine.pending == [] and engine.mirror.board.fen() == board.fen()
+        assert engine.is_waiting()
+    finally:
+        engine.kill()
+
+
+def test_search_after_a_stop_starts_once_the_stop_is_done(tmp_path):
+    engine = UciEngine(write_engine(tmp_path / 'thinker', THINKING_ENGINE), timeout=5)
+    try:
+        engine.position(chess.Board())
+        engine.go({'wtime': 60000, 'btime': 60000})
+        engine.stop()
+        engine.go({'wtime': 50000, 'btime': 50000})  # deferred till the stopped search is over
+        deadline = time.monotonic() + 5
+        while not (engine.is_thinking() and not engine.pending) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert engine.is_thinking() and engine.time_dict['wtime'] == 50000
+    finally:
+        engine.kill()
@@ -41,6 +41,10 @@ class TimeControl(object):
         return self.mode == other.mode and self.seconds_per_move == other.seconds_per_move and \
                self.minutes_per_game == other.minutes_per_game and self.fischer_increment == other.fischer_increment
 
+    def limits(self):
+        """Returns the settings (not the running times) of the time control - same settings, same kind of search."""
+        return self.mode, self.seconds_per_move, self.minutes_per_game, self.fischer_increment
+
     def reset(self):
         """Resets the clock's times for both players"""
         if self.mode == TimeMode.BLITZ:
@@ -54,6 +58,10 @@ class TimeControl(object):
                                chess.BLACK: float(self.seconds_per_move)}
         self.active_color = None
 
+    def set_clock_times(self, white_time, black_time):
+        """Sets the remaining times (secs) of both players, e.g. from the clock of another board."""
+        self.clock_time = {chess.WHITE: float(white_time), chess.BLACK: float(black_time)}
+
     def current_clock_time(self, flip_board=False):
         """Returns the startup time for setting the clock at beginning."""
         ct = copy.copy(self.clock_time)
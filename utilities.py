@@ -77,8 +77,13 @@ class EventApi():
     # Engine events
     BEST_MOVE = 'EVT_BEST_MOVE'  # Engine has found a move
     NEW_PV = 'EVT_NEW_PV'  # Engine sends a new principal variation
+    NEW_MULTIPV = 'EVT_NEW_MULTIPV'  # Engine sends the top lines of a MultiPV search
     NEW_SCORE = 'EVT_NEW_SCORE'  # Engine sends a new score
     OUT_OF_TIME = 'EVT_OUT_OF_TIME'  # Clock flag fallen
+    FAILOVER = 'EVT_FAILOVER'  # Remote engine failed, the local engine has to take over
+    THROTTLE = 'EVT_THROTTLE'  # System is too hot or busy (or fine again) - engine should slow down (or not)
+    ENGINE_SPAWNED = 'EVT_ENGINE_SPAWNED'  # Engine of a NEW_ENGINE event is ready (or failed to start)
+    SPECULATION_READY = 'EVT_SPECULATION_READY'  # More engines for the speculative searches are started
 
 
 class MessageApi():
@@ -86,6 +91,7 @@ class MessageApi():
     COMPUTER_MOVE = 'MSG_COMPUTER_MOVE'  # Show computer move
     BOOK_MOVE = 'MSG_BOOK_MOVE'  # Show book move
     NEW_PV = 'MSG_NEW_PV'  # Show the new Principal Variation
+    NEW_MULTIPV = 'MSG_NEW_MULTIPV'  # Show the top lines of a MultiPV search
     REVIEW_MOVE = 'MSG_REVIEW_MOVE'  # Player is reviewing a game (analysis, kibitz or observe modes)
     ENGINE_READY = 'MSG_ENGINE_READY'
     ENGINE_STARTUP = 'MSG_ENGINE_STARTUP'  # first time a new engine is ready
@@ -111,6 +117,7 @@ class MessageApi():
     GAME_ENDS = 'MSG_GAME_ENDS'  # The current game has ended, contains a 'result' (GameResult) and list of 'moves'
 
     SYSTEM_INFO = 'MSG_SYSTEM_INFO'  # Information about picochess such as version etc
+    RESOURCE_USAGE = 'MSG_RESOURCE_USAGE'  # Latest cpu & memory sample of the engines and picochess threads
     STARTUP_INFO = 'MSG_STARTUP_INFO'  # Information about the startup options
     NEW_SCORE = 'MSG_NEW_SCORE'  # Score
     ALTERNATIVE_MOVE = 'MSG_ALTERNATIVE_MOVE'  # User wants another move to be calculated
@@ -389,6 +396,7 @@ class EngineStatus(AutoNumber):
     THINK = ()
     PONDER = ()
     WAIT = ()
+    STOP = ()  # stop sent, bestmove not yet back
 
 
 @enum.unique
@@ -630,6 +638,61 @@ class RepeatedTimer(object):
             logging.info('repeated timer already stopped - strange!')
 
 
+class RateLimiter(object):
+    """Lets at most one value pass per interval (in secs) - without any timer thread.
+
+    Values offered inside the interval are coalesced, only the latest one is kept and handed out by the first
+    offer() or poll() after the interval ended. A consumer can use timeout() to know how long it may sleep.
+    """
+
+    def __init__(self, interval):
+        super(RateLimiter, self).__init__()
+        self.interval = interval
+        self.last_time = None
+        self.pending = None
+
+    def reset(self):
+        self.last_time = None
+        self.pending = None
+
+    def _release(self, value, now):
+        self.last_time = now
+        self.pending = None
+        return value
+
+    def offer(self, value):
+        """Return the value if it can be delivered now, otherwise keep it as pending and return None."""
+        now = time.monotonic()
+        if self.last_time is None or now - self.last_time >= self.interval:
+            return self._release(value, now)
+        self.pending = value
+        return None
+
+    def poll(self):
+        """Return the pending value if its interval ended, otherwise None."""
+        if self.pending is not None and time.monotonic() - self.last_time >= self.interval:
+            return self._release(self.pending, time.monotonic())
+        return None
+
+    def flush(self):
+        """Return the pending value at once (or None)."""
+        if self.pending is None:
+            return None
+        return self._release(self.pending, time.monotonic())
+
+    def timeout(self):
+        """Return the secs until the pending value is due, None if there is nothing pending."""
+        if self.pending is None:
+            return None
+        return max(0.0, self.interval - (time.monotonic() - self.last_time))
+
+
+def min_timeout(*limiters):
+    """Return the shortest timeout of the given rate limiters (None if nothing is pending)."""
+    timeouts = [t for t in (limiter.timeout() for limiter in limiters) if t is not None]
+    return min(timeouts) if timeouts else None
+
+
 class Dgt():
     DISPLAY_MOVE = ClassFactory(DgtApi.DISPLAY_MOVE, ['move', 'fen', 'beep', 'maxtime', 'side', 'wait', 'ld', 'rd'])
     DISPLAY_TEXT = ClassFactory(DgtApi.DISPLAY_TEXT, ['l', 'm', 's', 'beep', 'maxtime', 'wait', 'ld', 'rd'])
@@ -647,6 +710,7 @@ class Message():
     COMPUTER_MOVE = ClassFactory(MessageApi.COMPUTER_MOVE, ['move', 'ponder', 'fen', 'turn', 'game', 'time_control', 'wait'])
     BOOK_MOVE = ClassFactory(MessageApi.BOOK_MOVE, [])
     NEW_PV = ClassFactory(MessageApi.NEW_PV, ['pv', 'mode', 'fen', 'turn'])
+    NEW_MULTIPV = ClassFactory(MessageApi.NEW_MULTIPV, ['lines', 'mode', 'fen', 'turn'])
     REVIEW_MOVE = ClassFactory(MessageApi.REVIEW_MOVE, ['move', 'fen', 'turn', 'game', 'mode'])
     ENGINE_READY = ClassFactory(MessageApi.ENGINE_READY, ['eng', 'eng_text', 'engine_name', 'has_levels', 'has_960', 'ok_text'])
     ENGINE_STARTUP = ClassFactory(MessageApi.ENGINE_STARTUP, ['shell', 'file', 'has_levels', 'has_960'])
@@ -664,7 +728,7 @@ class Message():
     START_NEW_GAME = ClassFactory(MessageApi.START_NEW_GAME, ['time_control', 'game'])
     COMPUTER_MOVE_DONE_ON_BOARD = ClassFactory(MessageApi.COMPUTER_MOVE_DONE_ON_BOARD, [])
     SEARCH_STARTED = ClassFactory(MessageApi.SEARCH_STARTED, ['engine_status'])
-    SEARCH_STOPPED = ClassFactory(MessageApi.SEARCH_STOPPED, ['engine_status'])
+    SEARCH_STOPPED = ClassFactory(MessageApi.SEARCH_STOPPED, ['engine_status', 'telemetry'])
     USER_TAKE_BACK = ClassFactory(MessageApi.USER_TAKE_BACK, [])
     CLOCK_START = ClassFactory(MessageApi.CLOCK_START, ['turn', 'time_control'])
     CLOCK_STOP = ClassFactory(MessageApi.CLOCK_STOP, [])
@@ -672,6 +736,7 @@ class Message():
     GAME_ENDS = ClassFactory(MessageApi.GAME_ENDS, ['result', 'play_mode', 'game'])
 
     SYSTEM_INFO = ClassFactory(MessageApi.SYSTEM_INFO, ['info'])
+    RESOURCE_USAGE = ClassFactory(MessageApi.RESOURCE_USAGE, ['sample'])
     STARTUP_INFO = ClassFactory(MessageApi.STARTUP_INFO, ['info'])
     NEW_SCORE = ClassFactory(MessageApi.NEW_SCORE, ['score', 'mate', 'mode'])
     ALTERNATIVE_MOVE = ClassFactory(MessageApi.ALTERNATIVE_MOVE, [])
@@ -686,13 +751,13 @@ class Message():
 class Event():
     # User events
     FEN = ClassFactory(EventApi.FEN, ['fen'])
-    LEVEL = ClassFactory(EventApi.LEVEL, ['options', 'level_text'])
+    LEVEL = ClassFactory(EventApi.LEVEL, ['options', 'level_text', 'level_name'])
     NEW_GAME = ClassFactory(EventApi.NEW_GAME, ['pos960'])
     DRAWRESIGN = ClassFactory(EventApi.DRAWRESIGN, ['result'])
     KEYBOARD_MOVE = ClassFactory(EventApi.KEYBOARD_MOVE, ['move', 'flip_board'])
     REMOTE_MOVE = ClassFactory(EventApi.REMOTE_MOVE, ['move', 'fen'])
     SET_OPENING_BOOK = ClassFactory(EventApi.SET_OPENING_BOOK, ['book', 'book_text', 'ok_text'])
-    NEW_ENGINE = ClassFactory(EventApi.NEW_ENGINE, ['eng', 'eng_text', 'options', 'ok_text'])
+    NEW_ENGINE = ClassFactory(EventApi.NEW_ENGINE, ['eng', 'eng_text', 'options', 'ok_text', 'level_name'])
     SET_INTERACTION_MODE = ClassFactory(EventApi.SET_INTERACTION_MODE, ['mode', 'mode_text', 'ok_text'])
     SETUP_POSITION = ClassFactory(EventApi.SETUP_POSITION, ['fen', 'uci960'])
     PAUSE_RESUME = ClassFactory(EventApi.PAUSE_RESUME, [])
@@ -707,8 +772,13 @@ class Event():
     # Engine events
     BEST_MOVE = ClassFactory(EventApi.BEST_MOVE, ['result', 'inbook'])
     NEW_PV = ClassFactory(EventApi.NEW_PV, ['pv'])
+    NEW_MULTIPV = ClassFactory(EventApi.NEW_MULTIPV, ['lines'])
     NEW_SCORE = ClassFactory(EventApi.NEW_SCORE, ['score', 'mate'])
     OUT_OF_TIME = ClassFactory(EventApi.OUT_OF_TIME, ['color'])
+    FAILOVER = ClassFactory(EventApi.FAILOVER, ['reason'])
+    THROTTLE = ClassFactory(EventApi.THROTTLE, ['active', 'reason'])
+    ENGINE_SPAWNED = ClassFactory(EventApi.ENGINE_SPAWNED, ['engine', 'request', 'start'])
+    SPECULATION_READY = ClassFactory(EventApi.SPECULATION_READY, ['engines'])
 
 
 def get_opening_books():
@@ -81,6 +81,9 @@ function getSystemInfo() {
             ip = ' - IP: ' + window.system_info.ip;
         }
         document.title = 'Webserver Picochess ' + window.system_info.version + ip;
+        if (window.system_info.engine_knps) {
+            $('#picoSpeed').html('(' + window.system_info.engine_knps + ' knps)');
+        }
     }).fail(function(jqXHR, textStatus) {
         dgtClockStatusEl.html(textStatus);
     });
@@ -124,6 +127,7 @@ $(function() {
     window.engine_lines = {};
     window.activedb = "#ref";
     window.multipv = 1;
+    window.resource_samples = [];  // the server only sends the latest one
     window.BookStatsTable = $('#BookStatsTable').dynatable({
         dataset: {
             ajax: true,
@@ -257,6 +261,32 @@ $(function() {
                 case 'header':
                     setHeaders(data['headers']);
                     break;
+                case 'Score':
+                    $('#picoScore').html(data.mate ? '#' + data.mate : data.score);
+                    break;
+                case 'PV':
+                    $('#picoPV').html(data.pv);
+                    break;
+                case 'Resources':
+                    window.resource_samples.push(data.sample);
+                    if (window.resource_samples.length > 120) {
+                        window.resource_samples.shift();
+                    }
+                    break;
+                case 'MultiPV':
+                    var lines = '';
+                    for (var i = 0; i < data.lines.length; i++) {
+                        var line = data.lines[i];
+                        var score = '';  // no score yet (e.g. a bound only) - dont pretend its 0.00
+                        if (line.mate) {
+                            score = '#' + line.mate;
+                        } else if (line.score !== null && line.score !== undefined) {
+                            score = (line.score / 100).toFixed(2);
+                        }
+                        lines += '<div>' + (i + 1) + '. [' + score + '/' + line.depth + '] ' + line.pv + '</div>';
+                    }
+                    $('#picoPV').html(lines);
+                    break;
                 default:
                     console.warn(data);
             }